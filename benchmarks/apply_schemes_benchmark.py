@@ -0,0 +1,75 @@
+"""Benchmark evaluating the schemes once per timestep on the examples.
+
+The schemes are evaluated in :py:meth:`~rtctools_simulation.model._SimulationProblem.pre_update`.
+For comparison, the benchmark also runs each example with the schemes evaluated twice per
+timestep, once at the current time and once at the next time.
+"""
+import importlib
+import logging
+import sys
+import time
+from pathlib import Path
+
+EXAMPLES_DIR = Path(__file__).parent.parent.resolve() / "examples"
+EXAMPLES = [
+    "passflow_example",
+    "poolq_example",
+    "rainevap_example",
+    "set_q_example",
+    "single_reservoir",
+    "spillway_example",
+]
+
+logger = logging.getLogger("rtctools")
+
+
+def create_model_class(model_class, double: bool):
+    """Create a model class that counts the number of times the schemes are applied."""
+
+    class CountingModel(model_class):
+        def __init__(self, *args, **kwargs):
+            self.n_apply_schemes = 0
+            super().__init__(*args, **kwargs)
+
+        def apply_schemes(self):
+            self.n_apply_schemes += 1
+            super().apply_schemes()
+
+        def pre_update(self, t_new):
+            if double:
+                self.set_input_variables()
+            super().pre_update(t_new)
+
+    return CountingModel
+
+
+def run(example: str, double: bool, repeat: int = 3):
+    """Run an example and return the number of calls per timestep and the best runtime."""
+    sys.path.append(str(EXAMPLES_DIR / example))
+    module = importlib.import_module(example)
+    model_class = create_model_class(module.SingleReservoir, double)
+    runtimes = []
+    for _ in range(repeat):
+        model = model_class(module.CONFIG)
+        start = time.perf_counter()
+        model.simulate()
+        runtimes.append(time.perf_counter() - start)
+    return model.n_apply_schemes / len(model.times()), min(runtimes)
+
+
+def main():
+    """Compare the runtimes of evaluating the schemes once or twice per timestep."""
+    logger.setLevel(logging.WARNING)
+    print(f"{'example':<20} {'calls/step':>10} {'once (s)':>9} {'twice (s)':>10} {'saving':>7}")
+    for example in EXAMPLES:
+        calls, runtime_once = run(example, double=False)
+        _, runtime_twice = run(example, double=True)
+        saving = 1 - runtime_once / runtime_twice
+        print(
+            f"{example:<20} {calls:>10.2f} {runtime_once:>9.3f} {runtime_twice:>10.3f}"
+            f" {saving:>7.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
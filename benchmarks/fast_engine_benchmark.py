@@ -0,0 +1,42 @@
+"""Benchmark the fast engine against the DAE solver on the single reservoir example."""
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+EXAMPLE_DIR = Path(__file__).parent.parent.resolve() / "examples" / "single_reservoir"
+sys.path.append(str(EXAMPLE_DIR))
+
+from single_reservoir import CONFIG, SingleReservoir  # noqa: E402
+
+logger = logging.getLogger("rtctools")
+
+
+def run(engine: str, repeat: int = 3):
+    """Run the example with a given engine and return the results and the best runtime."""
+    runtimes = []
+    for _ in range(repeat):
+        model = SingleReservoir(CONFIG, engine=engine)
+        start = time.perf_counter()
+        model.simulate()
+        runtimes.append(time.perf_counter() - start)
+    return model.extract_results(), min(runtimes)
+
+
+def main():
+    """Compare the runtimes and results of both engines."""
+    logger.setLevel(logging.WARNING)
+    results_casadi, runtime_casadi = run("casadi")
+    results_numpy, runtime_numpy = run("numpy")
+    print(f"casadi engine: {runtime_casadi:.3f} s")
+    print(f"numpy engine:  {runtime_numpy:.3f} s")
+    print(f"speedup:       {runtime_casadi / runtime_numpy:.1f}x")
+    for var, values in results_casadi.items():
+        difference = np.max(np.abs(np.array(results_numpy[var]) - np.array(values)))
+        print(f"max abs difference {var}: {difference:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Benchmark the import time of the reservoir model with python -X importtime."""
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict
+
+MODULE = "rtctools_simulation.reservoir.model"
+
+
+def import_times(module: str) -> Dict[str, float]:
+    """Import a module in a new Python process and return the self time (s) of each module."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(self_time) * 1e-6
+    return times
+
+
+def main(repeat: int = 5, top: int = 15):
+    """Print the total import time and the packages that take the most time to import."""
+    runs = [import_times(MODULE) for _ in range(repeat)]
+    totals = [sum(times.values()) for times in runs]
+    best = runs[totals.index(min(totals))]
+    print(f"import {MODULE}: {min(totals):.3f} s (best of {repeat})")
+    packages = defaultdict(float)
+    for name, self_time in best.items():
+        packages[name.split(".")[0]] += self_time
+    print("slowest packages:")
+    for package, self_time in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package}: {self_time:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
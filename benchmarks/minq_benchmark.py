@@ -0,0 +1,68 @@
+"""Benchmark the qmin backends on the minq example."""
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+EXAMPLE_DIR = Path(__file__).parent.parent.resolve() / "examples" / "minq_example"
+sys.path.append(str(EXAMPLE_DIR))
+
+from minq_example import CONFIG, Reservoir  # noqa: E402
+
+logger = logging.getLogger("rtctools")
+
+
+def create_model_class(backend: str, receding_horizon: bool, look_ahead: Optional[int] = None):
+    """Create a model class of the minq example with a given backend."""
+
+    class BenchmarkReservoir(Reservoir):
+        def apply_schemes(self):
+            self.apply_minq(
+                h_min=0,
+                h_max=40.0,
+                h_target="rule_curve",
+                recalculate=receding_horizon,
+                receding_horizon=receding_horizon,
+                look_ahead=look_ahead,
+                backend=backend,
+            )
+
+    return BenchmarkReservoir
+
+
+def run(backend: str, receding_horizon: bool, look_ahead: Optional[int] = None, repeat: int = 3):
+    """Run the example with a given backend and return the results and the best runtime."""
+    model_class = create_model_class(backend, receding_horizon, look_ahead)
+    runtimes = []
+    for _ in range(repeat):
+        model = model_class(CONFIG)
+        start = time.perf_counter()
+        model.simulate()
+        runtimes.append(time.perf_counter() - start)
+    if model._qmin_nlp is not None:
+        timings = ", ".join(f"{p}: {t:.4f} s" for p, t in model._qmin_nlp.timings.items())
+        print(f"  last nlp solve per priority: {timings}")
+        print(f"  number of nlps: {len(model._qmin_nlps)}")
+    return model.extract_results(), min(runtimes)
+
+
+def main():
+    """Compare the runtimes and results of the backends with goal programming."""
+    logger.setLevel(logging.WARNING)
+    for receding_horizon, look_ahead in [(False, None), (True, None), (True, 5)]:
+        print(f"receding horizon: {receding_horizon}, look ahead: {look_ahead}")
+        results_gp, runtime_gp = run("goal_programming", receding_horizon, look_ahead)
+        print(f"  goal_programming: {runtime_gp:.3f} s")
+        for backend in ["nlp", "bisection"]:
+            results, runtime = run(backend, receding_horizon, look_ahead)
+            print(f"  {backend}: {runtime:.3f} s, speedup {runtime_gp / runtime:.1f}x")
+            for var in ["Q_out", "H"]:
+                difference = np.max(np.abs(np.array(results[var]) - np.array(results_gp[var])))
+                print(f"    max abs difference {var}: {difference:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark reading a large PI-XML timeseries file with and without streaming."""
+import datetime
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from rtctools.data import pi, rtc
+
+from rtctools_simulation.pi_stream import StreamingTimeseries, StreamingTimeseriesWriter
+
+DATA_CONFIG_DIR = Path(__file__).parent.parent.resolve() / "tests" / "basic_model" / "input"
+
+#: Number of unmapped series in the generated file, next to the mapped inflow series.
+N_UNMAPPED_SERIES = 20
+
+#: Number of hourly values of each series.
+N_TIMES = 10 * 365 * 24
+
+
+def write_file(folder: Path) -> rtc.DataConfig:
+    """Write a large timeseries import file and return its data config."""
+    shutil.copy(DATA_CONFIG_DIR / "rtcDataConfig.xml", folder)
+    data_config = rtc.DataConfig(folder)
+    start = datetime.datetime(2000, 1, 1)
+    dt = datetime.timedelta(hours=1)
+    times = [start + i * dt for i in range(N_TIMES)]
+    rng = np.random.default_rng(0)
+    with StreamingTimeseriesWriter(folder / "timeseries_import.xml", times, dt) as writer:
+        writer.write_series(data_config.pi_variable_ids("Q_in"), rng.random(N_TIMES), "m3/s")
+        for i in range(N_UNMAPPED_SERIES):
+            location_parameter_id = rtc.ts_ids(
+                location_id=f"location_{i}", parameter_id="Q", qualifier_id=[]
+            )
+            writer.write_series(location_parameter_id, rng.random(N_TIMES), "m3/s")
+    return data_config
+
+
+def measure(read):
+    """Return the result, the runtime and the peak memory of a read function."""
+    start = time.perf_counter()
+    result = read()
+    runtime = time.perf_counter() - start
+    # Tracing memory slows down parsing, so the peak memory is measured in a second run.
+    tracemalloc.start()
+    read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, runtime, peak
+
+
+def main():
+    """Compare the runtime and peak memory of the rtc-tools and streaming readers."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        folder = Path(tmp_dir)
+        start = time.perf_counter()
+        data_config = write_file(folder)
+        runtime = time.perf_counter() - start
+        size = (folder / "timeseries_import.xml").stat().st_size
+        print(f"write: {size / 1e6:.0f} MB in {runtime:.1f} s")
+        reference, runtime_pi, peak_pi = measure(
+            lambda: pi.Timeseries(data_config, folder, "timeseries_import", binary=False)
+        )
+        print(f"  rtc-tools: {runtime_pi:.1f} s, peak memory {peak_pi / 1e6:.0f} MB")
+        timeseries, runtime, peak = measure(
+            lambda: StreamingTimeseries(data_config, folder, "timeseries_import")
+        )
+        print(f"  streaming: {runtime:.1f} s, peak memory {peak / 1e6:.0f} MB")
+        print(f"  speedup {runtime_pi / runtime:.1f}x, memory reduction {peak_pi / peak:.0f}x")
+        assert np.array_equal(timeseries.get("Q_in"), reference.get("Q_in"))
+
+
+if __name__ == "__main__":
+    main()
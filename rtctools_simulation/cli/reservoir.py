@@ -1,9 +1,18 @@
-"""Command line interface for generating a reservoir model template."""
+"""Command line interface for reservoir models."""
 import argparse
+import glob
+import json
+import logging
 import os
+import sys
+import time
 from pathlib import Path
+from typing import List, Optional
 
-from rtctools_simulation.reservoir.template import create_reservoir_dir
+from rtctools_simulation.columnar_io import TimeseriesFormat
+from rtctools_simulation.model_config import ModelConfig
+
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
 
 parser = argparse.ArgumentParser(description="Build a reservoir model template.")
 parser.add_argument(
@@ -22,11 +31,262 @@ parser.add_argument(
 parser.add_argument("-n", "--name", type=str, help="Name of the reservoir.", required=True)
 
 
-def create_reservoir_template():
-    """Build a reservoir model template file from the command line."""
-    args = parser.parse_args()
+run_parser = argparse.ArgumentParser(
+    description="Run reservoir models for multiple base directories."
+)
+run_parser.add_argument(
+    "base_dirs",
+    nargs="+",
+    help=(
+        "Base directories of the models, each with the layout of a ModelConfig."
+        " Glob patterns such as 'reservoirs/*' are expanded."
+    ),
+)
+run_parser.add_argument(
+    "-m",
+    "--model",
+    type=str,
+    required=True,
+    help="Model class as <module>:<class> or <file.py>:<class>.",
+)
+run_parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=0,
+    help="Number of worker processes. Default is 0: run all models in the current process.",
+)
+run_parser.add_argument(
+    "-s",
+    "--summary",
+    type=str,
+    help="File to write the JSON summary to. Default is standard output.",
+)
+run_parser.add_argument(
+    "--timeseries-format",
+    type=str,
+    default=TimeseriesFormat.PI_XML.value,
+    choices=[timeseries_format.value for timeseries_format in TimeseriesFormat],
+    help="Format of the timeseries files.",
+)
+run_parser.add_argument(
+    "--plot", action="store_true", help="Plot the results of each model after simulating."
+)
+run_parser.add_argument(
+    "--cache-dir",
+    type=str,
+    help="Directory for caching compiled models and lookup tables, shared by all models.",
+)
+run_parser.add_argument(
+    "--log-level", type=str.upper, default="WARNING", choices=LOG_LEVELS, help="Log level."
+)
+
+serve_parser = argparse.ArgumentParser(
+    description="Run a daemon that keeps reservoir models warm between runs."
+)
+serve_parser.add_argument(
+    "-m",
+    "--model",
+    type=str,
+    required=True,
+    help="Model class as <module>:<class> or <file.py>:<class>.",
+)
+serve_parser.add_argument(
+    "--host",
+    type=str,
+    default="127.0.0.1",
+    help="Host name. Requests are not authenticated, so other hosts than localhost are unsafe.",
+)
+serve_parser.add_argument("-p", "--port", type=int, default=8765, help="Port number.")
+serve_parser.add_argument(
+    "--max-models", type=int, default=16, help="Maximum number of warm models."
+)
+serve_parser.add_argument(
+    "--idle-timeout",
+    type=float,
+    default=None,
+    help="Time (s) after which an unused model is evicted. Default is no timeout.",
+)
+serve_parser.add_argument(
+    "--timeseries-format",
+    type=str,
+    default=TimeseriesFormat.PI_XML.value,
+    choices=[timeseries_format.value for timeseries_format in TimeseriesFormat],
+    help="Format of the timeseries files.",
+)
+serve_parser.add_argument(
+    "--cache-dir",
+    type=str,
+    help="Directory for caching compiled models and lookup tables, shared by all models.",
+)
+serve_parser.add_argument(
+    "--log-level", type=str.upper, default="WARNING", choices=LOG_LEVELS, help="Log level."
+)
+
+clean_cache_parser = argparse.ArgumentParser(
+    description="Remove compiled models of outdated versions from a cache directory."
+)
+clean_cache_parser.add_argument(
+    "cache_dir", type=str, help="Cache directory, as given to --cache-dir of run and serve."
+)
+
+reservoir_parser = argparse.ArgumentParser(description="Reservoir model tools.")
+subparsers = reservoir_parser.add_subparsers(dest="command", required=True)
+subparsers.add_parser("template", parents=[parser], add_help=False, help=parser.description)
+subparsers.add_parser("run", parents=[run_parser], add_help=False, help=run_parser.description)
+subparsers.add_parser(
+    "serve", parents=[serve_parser], add_help=False, help=serve_parser.description
+)
+subparsers.add_parser(
+    "clean-cache",
+    parents=[clean_cache_parser],
+    add_help=False,
+    help=clean_cache_parser.description,
+)
+
+
+def expand_base_dirs(patterns: List[str]) -> List[Path]:
+    """Expand glob patterns to a sorted list of directories, without duplicates."""
+    base_dirs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for match in matches:
+            base_dir = Path(match).resolve()
+            if base_dir.is_dir() and base_dir not in base_dirs:
+                base_dirs.append(base_dir)
+    return base_dirs
+
+
+def _get_cache_dirs(args: argparse.Namespace) -> dict:
+    """Get the cache directory of the model configs from parsed arguments."""
+    if args.cache_dir is None:
+        return {}
+    cache_dir = Path(args.cache_dir).resolve()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return {"cache": cache_dir}
+
+
+def run_models(args: argparse.Namespace) -> int:
+    """
+    Run a model for each base directory and write a summary.
+
+    :returns: the exit code, 0 if all models ran successfully and 1 otherwise.
+    """
+    # Import the scenarios module here, since it imports the model classes.
+    from rtctools_simulation.scenarios import run_scenarios
+
+    log_level = logging.getLevelName(args.log_level)
+    logging.getLogger("rtctools").setLevel(log_level)
+    base_dirs = expand_base_dirs(args.base_dirs)
+    configs = [
+        ModelConfig(
+            base_dir=base_dir,
+            dirs=_get_cache_dirs(args),
+            timeseries_format=args.timeseries_format,
+            plotting=args.plot,
+        )
+        for base_dir in base_dirs
+    ]
+    start = time.perf_counter()
+    scenario_results = run_scenarios(
+        args.model, configs, workers=args.workers, log_level=log_level, return_results=False
+    )
+    results = sorted(scenario_results, key=lambda result: result.index)
+    summary = {
+        "model": args.model,
+        "workers": args.workers,
+        "total_time": time.perf_counter() - start,
+        "n_succeeded": sum(result.success for result in results),
+        "n_failed": sum(not result.success for result in results),
+        "runs": [
+            {
+                "base_dir": str(base_dirs[result.index]),
+                "success": result.success,
+                "error": result.error,
+                "worker": result.worker,
+                "times": {
+                    "build": result.build_time,
+                    **result.phase_times,
+                    "simulate": result.simulate_time,
+                },
+            }
+            for result in results
+        ],
+    }
+    summary_json = json.dumps(summary, indent=2)
+    if args.summary is None:
+        print(summary_json)
+    else:
+        Path(args.summary).write_text(summary_json + "\n")
+    return 0 if summary["n_failed"] == 0 else 1
+
+
+def serve(args: argparse.Namespace):
+    """Run the simulation daemon until it is interrupted."""
+    # Import the daemon module here, since it imports the model classes.
+    from rtctools_simulation.daemon import ModelPool, SimulationDaemon
+
+    logging.getLogger("rtctools").setLevel(logging.getLevelName(args.log_level))
+    pool = ModelPool(
+        args.model,
+        max_models=args.max_models,
+        idle_timeout=args.idle_timeout,
+        config_kwargs={"dirs": _get_cache_dirs(args), "timeseries_format": args.timeseries_format},
+    )
+    with SimulationDaemon(pool, host=args.host, port=args.port) as daemon:
+        host, port = daemon.server_address[:2]
+        print(f"Serving reservoir models on http://{host}:{port}", flush=True)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def clean_cache(args: argparse.Namespace):
+    """Remove outdated compiled models from a cache directory and print the removed folders."""
+    # Import the model module here, since it imports the model classes.
+    from rtctools_simulation.reservoir.model import clean_model_cache
+
+    for removed_dir in clean_model_cache(Path(args.cache_dir).resolve()):
+        print(f"Removed {removed_dir}")
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Run the reservoir command line interface.
+
+    The subcommands are:
+
+    - template: build a reservoir model template, see :py:func:`create_reservoir_template`.
+    - run: run a model for multiple base directories in one process or a worker pool
+      and write a JSON summary with the runtime of each phase and the success of each run.
+    - serve: run a daemon that keeps models warm between runs,
+      see :py:mod:`rtctools_simulation.daemon`.
+    - clean-cache: remove outdated compiled models from a cache directory,
+      see :py:func:`~rtctools_simulation.reservoir.model.clean_model_cache`.
+    """
+    args = reservoir_parser.parse_args(argv)
+    if args.command == "template":
+        _create_reservoir_template(args)
+    elif args.command == "serve":
+        serve(args)
+    elif args.command == "clean-cache":
+        clean_cache(args)
+    else:
+        sys.exit(run_models(args))
+
+
+def _create_reservoir_template(args: argparse.Namespace):
+    """Build a reservoir model template from parsed arguments."""
+    from rtctools_simulation.reservoir.template import create_reservoir_dir
+
     reservoir_name = args.name
     dir_name: str = args.dir_name
     dir = Path(os.getcwd()).resolve() / dir_name
     allow_overwrite = args.force
     create_reservoir_dir(dir, reservoir_name=reservoir_name, allow_overwrite=allow_overwrite)
+
+
+def create_reservoir_template():
+    """Build a reservoir model template file from the command line."""
+    _create_reservoir_template(parser.parse_args())
@@ -0,0 +1,520 @@
+"""
+Module for columnar timeseries files.
+
+Batch studies do not need the Delft-FEWS interchange format,
+and parsing and writing PI-XML can take a large part of a short simulation.
+This module reads and writes timeseries in columnar binary formats instead:
+
+* ``npz``: uncompressed NumPy archive with one array per variable.
+  This format does not need any additional packages.
+* ``arrow``: Arrow IPC file. :py:func:`read_timeseries` memory-maps the file
+  and returns read-only values without copying them. Requires ``pyarrow``.
+* ``parquet``: Parquet file. Requires ``pyarrow``.
+* ``netcdf``: NetCDF4 file. Requires ``netCDF4``.
+
+Each file has a time column and one column of floats per variable.
+All ensemble members are stored in one file with a member dimension.
+For the table formats (Arrow and Parquet), the members are stored one after another,
+with a ``member`` column next to the ``time`` column.
+
+Times are stored as in PI-XML: as local times, together with the time zone offset
+and the forecast datetime, which is the reference time of the simulation.
+"""
+
+import datetime
+import importlib
+import json
+import logging
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from rtctools.simulation.io_mixin import IOMixin
+
+from rtctools_simulation.pi_stream import PIStreamingMixin, StreamingTimeseriesWriter
+
+logger = logging.getLogger("rtctools")
+
+_TIME = "time"
+_MEMBER = "member"
+_METADATA = "__metadata__"
+_RESERVED_NAMES = {_TIME, _MEMBER, _METADATA}
+
+#: Key of the metadata in the schema of Arrow and Parquet files.
+ARROW_METADATA_KEY = b"rtctools_simulation"
+
+
+class TimeseriesFormat(str, Enum):
+    """Formats of timeseries files."""
+
+    PI_XML = "pi_xml"
+    NPZ = "npz"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+    NETCDF = "netcdf"
+
+
+_EXTENSIONS = {
+    TimeseriesFormat.PI_XML: ".xml",
+    TimeseriesFormat.NPZ: ".npz",
+    TimeseriesFormat.ARROW: ".arrow",
+    TimeseriesFormat.PARQUET: ".parquet",
+    TimeseriesFormat.NETCDF: ".nc",
+}
+
+
+def timeseries_file(folder: Union[str, Path], basename: str, timeseries_format) -> Path:
+    """Get the path of a timeseries file with the extension of a given format."""
+    return Path(folder) / (basename + _EXTENSIONS[TimeseriesFormat(timeseries_format)])
+
+
+def _get_format(path: Path, timeseries_format=None) -> TimeseriesFormat:
+    """Get the format of a file, given or from its extension."""
+    if timeseries_format is not None:
+        return TimeseriesFormat(timeseries_format)
+    for timeseries_format, extension in _EXTENSIONS.items():
+        if path.suffix == extension:
+            return timeseries_format
+    raise ValueError(f"Unknown timeseries format of {path}.")
+
+
+def _import_optional(module: str, timeseries_format: TimeseriesFormat):
+    """Import an optional dependency of a timeseries format."""
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(
+            f"The {timeseries_format.value} timeseries format requires {module}, "
+            f"install it with 'pip install {module}'."
+        ) from None
+
+
+class ColumnarTimeseries:
+    """
+    Timeseries of multiple variables and ensemble members with common times.
+
+    The values of each variable are stored in an array with shape (ensemble_size, n_times).
+    """
+
+    def __init__(
+        self,
+        times: List[datetime.datetime],
+        values: Dict[str, np.ndarray],
+        forecast_datetime: Optional[datetime.datetime] = None,
+        timezone: Optional[float] = None,
+        units: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Create the timeseries.
+
+        :param times: times of the timeseries.
+        :param values: dict of variables and their values,
+            either with shape (n_times,) or (ensemble_size, n_times).
+        :param forecast_datetime: forecast datetime, the first time if None.
+        :param timezone: time zone offset in hours.
+        :param units: dict of variables and their units.
+        """
+        self.times = list(times)
+        self.forecast_datetime = forecast_datetime if forecast_datetime else self.times[0]
+        self.timezone = timezone
+        self.units = dict(units) if units else {}
+        self.values: Dict[str, np.ndarray] = {}
+        for variable, variable_values in values.items():
+            self.set(variable, variable_values)
+
+    @property
+    def ensemble_size(self) -> int:
+        """Number of ensemble members, 1 if there are no variables."""
+        return next((values.shape[0] for values in self.values.values()), 1)
+
+    def set(self, variable: str, values: np.ndarray):
+        """Set the values of a variable, with shape (n_times,) or (ensemble_size, n_times)."""
+        if variable in _RESERVED_NAMES:
+            raise ValueError(f"Variable name {variable} is reserved.")
+        values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        if values.ndim != 2 or values.shape[1] != len(self.times):  # noqa: PLR2004
+            raise ValueError(
+                f"Values of {variable} have shape {values.shape},"
+                f" expected (ensemble_size, {len(self.times)})."
+            )
+        if self.values and values.shape[0] != self.ensemble_size:
+            raise ValueError(
+                f"Values of {variable} have {values.shape[0]} members,"
+                f" expected {self.ensemble_size}."
+            )
+        self.values[variable] = values
+
+    def get(self, variable: str, ensemble_member: int = 0) -> np.ndarray:
+        """Get the values of a variable for a given ensemble member."""
+        return self.values[variable][ensemble_member]
+
+    def items(self, ensemble_member: int = 0) -> Iterator[Tuple[str, np.ndarray]]:
+        """Iterate over the variables and their values for a given ensemble member."""
+        for variable, values in self.values.items():
+            yield variable, values[ensemble_member]
+
+    def _metadata(self) -> dict:
+        return {
+            "forecast_datetime": self.forecast_datetime.isoformat(),
+            "timezone": self.timezone,
+            "units": self.units,
+            "ensemble_size": self.ensemble_size,
+        }
+
+    def _datetime64(self) -> np.ndarray:
+        return np.array(self.times, dtype="datetime64[us]")
+
+
+def read_timeseries(
+    path: Union[str, Path], timeseries_format=None, ensemble_member: Optional[int] = None
+) -> ColumnarTimeseries:
+    """
+    Read a columnar timeseries file.
+
+    :param path: path of the file.
+    :param timeseries_format: format of the file, derived from the extension if None.
+    :param ensemble_member: ensemble member to read, all members are read if None.
+
+    :returns: the timeseries, with only the selected ensemble member if one is given.
+    """
+    path = Path(path)
+    timeseries_format = _get_format(path, timeseries_format)
+    if timeseries_format == TimeseriesFormat.NPZ:
+        timeseries = _read_npz(path)
+    elif timeseries_format in (TimeseriesFormat.ARROW, TimeseriesFormat.PARQUET):
+        timeseries = _read_table(path, timeseries_format)
+    elif timeseries_format == TimeseriesFormat.NETCDF:
+        timeseries = _read_netcdf(path)
+    else:
+        raise ValueError(f"Format {timeseries_format.value} is not a columnar format.")
+    if ensemble_member is not None:
+        if not 0 <= ensemble_member < timeseries.ensemble_size:
+            raise ValueError(
+                f"Ensemble member {ensemble_member} not found in {path},"
+                f" which has {timeseries.ensemble_size} members."
+            )
+        timeseries.values = {
+            variable: values[ensemble_member : ensemble_member + 1]
+            for variable, values in timeseries.values.items()
+        }
+    return timeseries
+
+
+def write_timeseries(
+    path: Union[str, Path], timeseries: ColumnarTimeseries, timeseries_format=None
+):
+    """
+    Write a columnar timeseries file.
+
+    :param path: path of the file.
+    :param timeseries: timeseries to write.
+    :param timeseries_format: format of the file, derived from the extension if None.
+    """
+    path = Path(path)
+    timeseries_format = _get_format(path, timeseries_format)
+    if timeseries_format == TimeseriesFormat.NPZ:
+        _write_npz(path, timeseries)
+    elif timeseries_format in (TimeseriesFormat.ARROW, TimeseriesFormat.PARQUET):
+        _write_table(path, timeseries, timeseries_format)
+    elif timeseries_format == TimeseriesFormat.NETCDF:
+        _write_netcdf(path, timeseries)
+    else:
+        raise ValueError(f"Format {timeseries_format.value} is not a columnar format.")
+
+
+def _from_metadata(
+    metadata: dict, times: List[datetime.datetime], values: Dict[str, np.ndarray]
+) -> ColumnarTimeseries:
+    return ColumnarTimeseries(
+        times,
+        values,
+        forecast_datetime=datetime.datetime.fromisoformat(metadata["forecast_datetime"]),
+        timezone=metadata["timezone"],
+        units=metadata["units"],
+    )
+
+
+def _read_npz(path: Path) -> ColumnarTimeseries:
+    with np.load(path, allow_pickle=False) as data:
+        metadata = json.loads(data[_METADATA].item())
+        times = data[_TIME].astype("datetime64[us]").tolist()
+        values = {key: data[key] for key in data.files if key not in _RESERVED_NAMES}
+    return _from_metadata(metadata, times, values)
+
+
+def _write_npz(path: Path, timeseries: ColumnarTimeseries):
+    arrays = {
+        _TIME: timeseries._datetime64(),
+        _METADATA: np.array(json.dumps(timeseries._metadata())),
+        **timeseries.values,
+    }
+    # Write to a file object, such that np.savez does not change the extension.
+    with open(path, "wb") as file:
+        np.savez(file, **arrays)
+
+
+def _read_table(path: Path, timeseries_format: TimeseriesFormat) -> ColumnarTimeseries:
+    pa = _import_optional("pyarrow", timeseries_format)
+    if timeseries_format == TimeseriesFormat.ARROW:
+        # The buffers of the table refer to the memory map, so the values are not copied.
+        table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+    else:
+        parquet = _import_optional("pyarrow.parquet", timeseries_format)
+        table = parquet.read_table(path)
+    metadata = json.loads(table.schema.metadata[ARROW_METADATA_KEY])
+    n_times = table.num_rows // metadata["ensemble_size"]
+    times = table.column(_TIME).slice(0, n_times).to_numpy().astype("datetime64[us]").tolist()
+    values = {
+        name: table.column(name).to_numpy().reshape(-1, n_times)
+        for name in table.column_names
+        if name not in _RESERVED_NAMES
+    }
+    return _from_metadata(metadata, times, values)
+
+
+def _write_table(path: Path, timeseries: ColumnarTimeseries, timeseries_format: TimeseriesFormat):
+    pa = _import_optional("pyarrow", timeseries_format)
+    n_members, n_times = timeseries.ensemble_size, len(timeseries.times)
+    columns = {
+        _MEMBER: np.repeat(np.arange(n_members, dtype=np.int32), n_times),
+        _TIME: np.tile(timeseries._datetime64(), n_members),
+    }
+    # The members are stored one after another, which is a view of the value arrays.
+    columns.update({variable: values.reshape(-1) for variable, values in timeseries.values.items()})
+    table = pa.table(columns).replace_schema_metadata(
+        {ARROW_METADATA_KEY: json.dumps(timeseries._metadata())}
+    )
+    if timeseries_format == TimeseriesFormat.ARROW:
+        with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        parquet = _import_optional("pyarrow.parquet", timeseries_format)
+        parquet.write_table(table, path)
+
+
+def _read_netcdf(path: Path) -> ColumnarTimeseries:
+    netcdf4 = _import_optional("netCDF4", TimeseriesFormat.NETCDF)
+    with netcdf4.Dataset(path) as dataset:
+        dataset.set_auto_mask(False)
+        time = dataset.variables[_TIME]
+        forecast_datetime = datetime.datetime.fromisoformat(time.units[len("seconds since ") :])
+        times = [forecast_datetime + datetime.timedelta(seconds=float(t)) for t in time[:]]
+        values, units = {}, {}
+        for name, variable in dataset.variables.items():
+            if name in _RESERVED_NAMES:
+                continue
+            values[name] = np.asarray(variable[:], dtype=np.float64)
+            if "units" in variable.ncattrs():
+                units[name] = variable.units
+        timezone = float(dataset.timezone) if "timezone" in dataset.ncattrs() else None
+    return ColumnarTimeseries(
+        times, values, forecast_datetime=forecast_datetime, timezone=timezone, units=units
+    )
+
+
+def _write_netcdf(path: Path, timeseries: ColumnarTimeseries):
+    netcdf4 = _import_optional("netCDF4", TimeseriesFormat.NETCDF)
+    with netcdf4.Dataset(path, "w") as dataset:
+        dataset.createDimension(_MEMBER, timeseries.ensemble_size)
+        dataset.createDimension(_TIME, len(timeseries.times))
+        if timeseries.timezone is not None:
+            dataset.timezone = timeseries.timezone
+        time = dataset.createVariable(_TIME, "f8", (_TIME,))
+        time.standard_name = "time"
+        time.units = f"seconds since {timeseries.forecast_datetime.isoformat(sep=' ')}"
+        time[:] = [(t - timeseries.forecast_datetime).total_seconds() for t in timeseries.times]
+        for name, values in timeseries.values.items():
+            variable = dataset.createVariable(name, "f8", (_MEMBER, _TIME))
+            if name in timeseries.units:
+                variable.units = timeseries.units[name]
+            variable[:] = values
+
+
+class ColumnarIOMixin(PIStreamingMixin):
+    """
+    IO mixin that reads and writes either PI-XML or columnar timeseries files.
+
+    The format is given by :py:attr:`timeseries_format`.
+    For PI-XML, the PI mixin is used (see :py:class:`.PIStreamingMixin`).
+    For a columnar format, timeseries_import.<ext> is read from the input folder
+    and timeseries_export.<ext> is written to the output folder, for example
+    timeseries_import.parquet. Variables are identified by their names,
+    so rtcDataConfig.xml is not needed, and all output variables are written.
+    Parameters are read from rtcParameterConfig.xml if the file exists.
+    The input values are copied into the model, also for memory-mapped Arrow files,
+    since schemes can modify input timeseries in place.
+
+    :cvar timeseries_format: Format of the timeseries files. Default is PI-XML.
+    """
+
+    #: Format of the timeseries files.
+    timeseries_format = TimeseriesFormat.PI_XML
+
+    def __init__(self, **kwargs):
+        if not self._is_columnar():
+            super().__init__(**kwargs)
+            return
+        # The PI mixin requires rtcDataConfig.xml, which is optional for columnar formats.
+        # All methods of the PI mixin are overridden for columnar formats, so it is skipped.
+        IOMixin.__init__(self, **kwargs)
+        self.__timeseries_import: Optional[ColumnarTimeseries] = None
+        self.__timeseries_export: Dict[str, np.ndarray] = {}
+        self.__units: Dict[str, str] = {}
+
+    def _is_columnar(self) -> bool:
+        return TimeseriesFormat(self.timeseries_format) != TimeseriesFormat.PI_XML
+
+    def read(self):
+        if not self._is_columnar():
+            super().read()
+            return
+        IOMixin.read(self)
+        self._read_parameter_config(self._get_data_config(required=False), required=False)
+        path = timeseries_file(
+            self._input_folder, self.timeseries_import_basename, self.timeseries_format
+        )
+        if not path.is_file():
+            raise FileNotFoundError(f"ColumnarIOMixin: {path.name} not found in {path.parent}.")
+        timeseries_import = read_timeseries(
+            path, self.timeseries_format, ensemble_member=self.pi_ensemble_member
+        )
+        times = timeseries_import.times
+        if self.pi_validate_timeseries:
+            dts = np.diff(times)
+            if any(dt <= datetime.timedelta(0) for dt in dts):
+                raise ValueError("ColumnarIOMixin: Time stamps must be strictly increasing.")
+            if len(set(dts)) > 1:
+                raise ValueError("ColumnarIOMixin: Expecting equidistant timeseries.")
+        self.__timeseries_import = timeseries_import
+        self.__timeseries_export = {}
+        self.__units = dict(timeseries_import.units)
+        self.io.reference_datetime = timeseries_import.forecast_datetime
+        for variable, values in timeseries_import.items():
+            # Schemes can modify input timeseries in place, so memory-mapped values are copied.
+            writeable_values = values if values.flags.writeable else values.copy()
+            self.io.set_timeseries(variable, times, writeable_values)
+
+    def _simulation_times_differ(self) -> bool:
+        """Check if the simulated times differ from the times of the model."""
+        return len(self._simulation_times) != len(self.times())
+
+    def _simulated_values(self, values) -> np.ndarray:
+        """Select the values at the simulated times from values at the times of the model."""
+        values = np.asarray(values)
+        if not self._simulation_times_differ() or len(values) != len(self.times()):
+            return values
+        return values[np.searchsorted(np.asarray(self.times()), self._simulation_times)]
+
+    def _pad_simulation_output(self):
+        """Extend the output at the simulated times to all times of the model with NaN."""
+        times = np.asarray(self.times())
+        indices = np.searchsorted(times, self._simulation_times)
+        for variable, values in self._io_output.items():
+            padded = np.full(len(times), np.nan)
+            padded[indices] = values
+            self._io_output[variable] = padded
+        self._simulation_times = list(times)
+
+    def write(self):
+        if not self._is_columnar():
+            if self._simulation_times_differ():
+                # The forecast datetime of a PI-XML file should be one of its times,
+                # so the output is written for all times, with NaN where it is not simulated.
+                self._pad_simulation_output()
+            super().write()
+            return
+        IOMixin.write(self)
+        times = self.io.sec_to_datetime(self._simulation_times, self.io.reference_datetime)
+        timeseries_export = ColumnarTimeseries(
+            times,
+            {
+                variable: self._simulated_values(values)
+                for variable, values in self.__timeseries_export.items()
+            },
+            forecast_datetime=self.io.reference_datetime,
+            timezone=self.__timeseries_import.timezone,
+        )
+        for variable in self._io_output_variables:
+            timeseries_export.set(variable, np.array(self._io_output[variable]))
+        timeseries_export.units = {
+            variable: unit
+            for variable, unit in self.__units.items()
+            if variable in timeseries_export.values
+        }
+        path = timeseries_file(
+            self._output_folder, self.timeseries_export_basename, self.timeseries_format
+        )
+        write_timeseries(path, timeseries_export, self.timeseries_format)
+
+    def set_timeseries(self, variable, values, output=True, check_consistency=True, unit=None):
+        if not self._is_columnar():
+            super().set_timeseries(variable, values, output, check_consistency, unit)
+            return
+        if check_consistency and len(self.times()) != len(values):
+            raise ValueError(
+                f"ColumnarIOMixin: Trying to set/append values {variable} with a different "
+                "length than the forecast length."
+            )
+        if unit is not None:
+            self.__units[variable] = unit
+        if output:
+            self.__timeseries_export[variable] = np.array(values, dtype=np.float64)
+        self.io.set_timeseries(variable, self.io.datetimes, values)
+
+    def set_unit(self, variable: str, unit: str):
+        if not self._is_columnar():
+            super().set_unit(variable, unit)
+            return
+        self.__units[variable] = unit
+
+    def write_ensemble(self, results: Dict[str, np.ndarray]):
+        """
+        Write the results of an ensemble to timeseries_export in the output folder.
+
+        All members are written to one file.
+        For PI-XML, only variables with a mapping in rtcDataConfig.xml are written.
+
+        :param results: dict of variables and their values as arrays
+            with shape (n_members, n_times), see :py:func:`.simulate_ensemble`.
+        """
+        times = self.io.sec_to_datetime(self.times(), self.io.reference_datetime)
+        if self._is_columnar():
+            timeseries = ColumnarTimeseries(
+                times,
+                results,
+                forecast_datetime=self.io.reference_datetime,
+                timezone=self.__timeseries_import.timezone,
+                units={var: unit for var, unit in self.__units.items() if var in results},
+            )
+            path = timeseries_file(
+                self._output_folder, self.timeseries_export_basename, self.timeseries_format
+            )
+            write_timeseries(path, timeseries, self.timeseries_format)
+            return
+        self._write_pi_ensemble(times, results)
+
+    def _write_pi_ensemble(self, times: List[datetime.datetime], results: Dict[str, np.ndarray]):
+        """Write the results of an ensemble to a PI-XML file."""
+        data_config = self._get_data_config()
+        timeseries_import = self.timeseries_import
+        dts = set(np.diff(times))
+        path = timeseries_file(
+            self._output_folder, self.timeseries_export_basename, TimeseriesFormat.PI_XML
+        )
+        with StreamingTimeseriesWriter(
+            path,
+            times,
+            dt=dts.pop() if len(dts) == 1 else None,
+            forecast_datetime=self.io.reference_datetime,
+            timezone=timeseries_import.timezone,
+        ) as writer:
+            for variable, values in results.items():
+                try:
+                    location_parameter_id = data_config.pi_variable_ids(variable)
+                except KeyError:
+                    logger.debug(f"PIMixin: variable {variable} has no mapping in rtcDataConfig.")
+                    continue
+                unit = timeseries_import.get_unit(variable)
+                for member, member_values in enumerate(np.atleast_2d(values)):
+                    writer.write_series(location_parameter_id, member_values, unit, member)
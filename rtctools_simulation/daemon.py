@@ -0,0 +1,361 @@
+"""
+Module for a simulation daemon that keeps models warm between runs.
+
+For frequent forecast cycles, the same models are run many times with new input timeseries.
+The daemon is a long-running process that keeps a model for each base directory,
+so the model does not have to be built when a run is requested.
+Since an rtc-tools simulation problem can only be simulated once,
+each model is built ahead of the next run in a background thread,
+after the response of the previous run has been sent.
+The input timeseries are read when the model is simulated, so each run uses the latest input.
+The lookup tables and the plot table are read when the model is built,
+so a prepared model is built again if these files have changed.
+
+The daemon is an HTTP server on localhost without authentication,
+with the following endpoints:
+
+- POST /run with a JSON body ``{"base_dir": "<base directory>"}``:
+  simulate the model of a base directory.
+  The response contains the success, the error and the runtime of each phase.
+- GET /stats: latency percentiles, the number of runs and the base directories of the warm models.
+
+Models that have not been used for some time, or the least recently used models
+if there are too many, are evicted.
+"""
+import collections
+import ipaddress
+import json
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Type, Union
+
+import numpy as np
+
+from rtctools_simulation.model import HeadlessModel
+from rtctools_simulation.model_config import ModelConfig
+from rtctools_simulation.scenarios import load_model_class, simulate_with_phase_times
+
+logger = logging.getLogger("rtctools")
+
+#: Percentiles of the latency that are reported.
+PERCENTILES = [50, 90, 95, 99]
+
+
+@dataclass
+class RunResult:
+    """
+    Result of a run of the daemon.
+
+    :param base_dir: base directory of the model.
+    :param success: True if the model was simulated without errors.
+    :param error: traceback of the error if the run failed, None otherwise.
+    :param warm: True if the model was built before the run was requested.
+    :param latency: time (s) between the request and the result.
+    :param build_time: time (s) to create the model during the run, 0 if the model was warm.
+    :param phase_times: time (s) of each phase of the simulation.
+    """
+
+    base_dir: str
+    success: bool
+    error: Optional[str] = None
+    warm: bool = False
+    latency: float = 0.0
+    build_time: float = 0.0
+    phase_times: Dict[str, float] = field(default_factory=dict)
+
+
+class LatencyStats:
+    """Latencies of the most recent runs."""
+
+    def __init__(self, max_size: int = 1000):
+        """
+        :param max_size: maximum number of latencies that are kept.
+        """
+        self._latencies: Deque[float] = collections.deque(maxlen=max_size)
+        self.count = 0
+
+    def add(self, latency: float):
+        """Add the latency (s) of a run."""
+        self._latencies.append(latency)
+        self.count += 1
+
+    def percentiles(self) -> Dict[str, Optional[float]]:
+        """Get the latency percentiles (s), for example {'p50': 0.1, ...}."""
+        if not self._latencies:
+            return {f"p{percentile}": None for percentile in PERCENTILES}
+        values = np.percentile(np.array(self._latencies), PERCENTILES)
+        return {f"p{percentile}": float(value) for percentile, value in zip(PERCENTILES, values)}
+
+
+def _get_build_files(config: ModelConfig) -> List[Path]:
+    """Get the files that are read when a model is built: lookup tables and the plot table."""
+    files = [
+        config.get_file("lookup_tables.csv", dirs=["lookup_tables"]),
+        config.get_file("plot_table.csv", dirs=["input"]),
+    ]
+    lookup_tables_dir = config.get_dir("lookup_tables")
+    if lookup_tables_dir is not None:
+        files.extend(sorted(lookup_tables_dir.rglob("*")))
+    return [file for file in files if file is not None and file.is_file()]
+
+
+def _get_signature(files: List[Path]) -> Tuple[Tuple[str, int, int], ...]:
+    """Get the modification times and sizes of files."""
+    signature = []
+    for file in files:
+        stat = file.stat()
+        signature.append((str(file), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+@dataclass
+class _PreparedModel:
+    """Model that is built for the next run, with the signature of its build files."""
+
+    model: HeadlessModel
+    files: List[Path]
+    signature: Tuple[Tuple[str, int, int], ...]
+
+    def is_current(self) -> bool:
+        """Check that the build files have not changed since the model was built."""
+        try:
+            return _get_signature(self.files) == self.signature
+        except OSError:
+            return False
+
+
+class ModelPool:
+    """
+    Pool of warm models, one for each base directory.
+
+    Models are prepared for the next run in a background thread.
+    Models are evicted when they have not been used for idle_timeout seconds,
+    or when there are more than max_models models, in least recently used order.
+    """
+
+    def __init__(
+        self,
+        model_class: Union[Type[HeadlessModel], str],
+        max_models: int = 16,
+        idle_timeout: Optional[float] = None,
+        config_kwargs: Optional[dict] = None,
+        model_kwargs: Optional[dict] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param model_class: model class or class path,
+            see :py:func:`~rtctools_simulation.scenarios.load_model_class`.
+        :param max_models: maximum number of warm models.
+        :param idle_timeout: time (s) after which an unused model is evicted.
+            If None, models are only evicted when there are too many.
+        :param config_kwargs: additional keyword arguments to create each model config.
+            By default, plotting is disabled.
+        :param model_kwargs: additional keyword arguments to create each model.
+        :param clock: function that returns the current time (s).
+        """
+        if isinstance(model_class, str):
+            model_class = load_model_class(model_class)
+        self.model_class = model_class
+        self.max_models = max_models
+        self.idle_timeout = idle_timeout
+        self.config_kwargs = {"plotting": False, **(config_kwargs or {})}
+        self.model_kwargs = model_kwargs or {}
+        self.stats = LatencyStats()
+        self._clock = clock
+        # Models that are prepared for the next run, in least recently used order.
+        self._models: "collections.OrderedDict[Path, Optional[Future]]" = collections.OrderedDict()
+        self._last_used: Dict[Path, float] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prepare")
+
+    def base_dirs(self) -> List[str]:
+        """Get the base directories of the models in the pool, least recently used first."""
+        return [str(base_dir) for base_dir in self._models]
+
+    def _build(self, base_dir: Path) -> _PreparedModel:
+        config = ModelConfig(base_dir=base_dir, **self.config_kwargs)
+        files = _get_build_files(config)
+        # The signature is taken first, so changes during the build are detected.
+        signature = _get_signature(files)
+        model = self.model_class(config=config, **self.model_kwargs)
+        return _PreparedModel(model=model, files=files, signature=signature)
+
+    @staticmethod
+    def _get_prepared_model(base_dir: Path, future: Optional[Future]) -> Optional[HeadlessModel]:
+        """Wait for a prepared model and return it if its build files have not changed."""
+        if future is None:
+            return None
+        try:
+            prepared = future.result()
+        except Exception:
+            logger.warning(f"Could not prepare the model of {base_dir}.", exc_info=True)
+            return None
+        if not prepared.is_current():
+            logger.info(f"Lookup tables of {base_dir} have changed, building the model again.")
+            return None
+        return prepared.model
+
+    def _evict(self):
+        """Evict idle models and the least recently used models if there are too many."""
+        now = self._clock()
+        if self.idle_timeout is not None:
+            for base_dir, last_used in list(self._last_used.items()):
+                if now - last_used > self.idle_timeout:
+                    logger.info(f"Evicting idle model {base_dir}.")
+                    self._remove(base_dir)
+        while len(self._models) > self.max_models:
+            base_dir = next(iter(self._models))
+            logger.info(f"Evicting least recently used model {base_dir}.")
+            self._remove(base_dir)
+
+    def _remove(self, base_dir: Path):
+        self._models.pop(base_dir, None)
+        self._last_used.pop(base_dir, None)
+
+    def run(self, base_dir: Union[str, Path]) -> RunResult:
+        """
+        Simulate the model of a base directory.
+
+        The prepared model is used if there is one and its lookup tables have not changed,
+        otherwise the model is built first.
+        """
+        start = time.perf_counter()
+        base_dir = Path(base_dir).resolve()
+        with self._lock:
+            self._evict()
+            model = self._get_prepared_model(base_dir, self._models.pop(base_dir, None))
+            # The model is marked as used, such that it is not evicted while running.
+            self._models[base_dir] = None
+            self._last_used[base_dir] = self._clock()
+            result = RunResult(base_dir=str(base_dir), success=False, warm=model is not None)
+            try:
+                if model is None:
+                    model = self._build(base_dir).model
+                    result.build_time = time.perf_counter() - start
+                result.phase_times = simulate_with_phase_times(model)
+                result.success = True
+            except Exception:
+                result.error = traceback.format_exc()
+                logger.warning(f"Run of {base_dir} failed.")
+            result.latency = time.perf_counter() - start
+            self.stats.add(result.latency)
+            self._evict()
+        return result
+
+    def prepare(self, base_dir: Union[str, Path]) -> Optional[Future]:
+        """
+        Start building the model of a base directory for the next run in a background thread.
+
+        Models are only built for base directories in the pool, that is,
+        base directories that have been run and that have not been evicted.
+        If the model cannot be built, it is built again during the next run.
+
+        :returns: future of the build, None if no model is built.
+        """
+        base_dir = Path(base_dir).resolve()
+        with self._lock:
+            if base_dir not in self._models or self._models[base_dir] is not None:
+                return None
+            future = self._executor.submit(self._build, base_dir)
+            self._models[base_dir] = future
+            return future
+
+    def close(self):
+        """Wait for the models that are being prepared and stop the background thread."""
+        self._executor.shutdown(wait=True)
+
+    def stats_summary(self) -> dict:
+        """Get the number of runs, the latency percentiles (s) and the warm base directories."""
+        with self._lock:
+            self._evict()
+            return {
+                "runs": self.stats.count,
+                "latency": self.stats.percentiles(),
+                "models": self.base_dirs(),
+            }
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Handler of HTTP requests to the daemon."""
+
+    server: "SimulationDaemon"
+
+    def _send_json(self, status: int, content: dict):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def do_GET(self):  # noqa: N802
+        if self.path == "/stats":
+            self._send_json(200, self.server.pool.stats_summary())
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}."})
+
+    def do_POST(self):  # noqa: N802
+        if self.path != "/run":
+            self._send_json(404, {"error": f"Unknown path {self.path}."})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            base_dir = Path(json.loads(self.rfile.read(length))["base_dir"])
+        except (ValueError, KeyError, TypeError) as error:
+            self._send_json(400, {"error": f"Invalid request: {error}."})
+            return
+        if not base_dir.is_dir():
+            self._send_json(400, {"error": f"Base directory {base_dir} not found."})
+            return
+        result = self.server.pool.run(base_dir)
+        self._send_json(200, result.__dict__)
+        # Build the model for the next run after the response has been sent.
+        self.server.pool.prepare(base_dir)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class SimulationDaemon(HTTPServer):
+    """
+    HTTP server that runs models of a :py:class:`ModelPool`.
+
+    Requests are handled one at a time.
+    Requests are not authenticated, so the server should only listen on a loopback address.
+    """
+
+    def __init__(self, pool: ModelPool, host: str = "127.0.0.1", port: int = 0):
+        """
+        :param pool: pool of models.
+        :param host: host name. By default, the server only accepts local connections.
+            A warning is logged for other hosts.
+        :param port: port number. If 0, a free port is chosen, see :py:attr:`server_address`.
+        """
+        if not _is_loopback(host):
+            logger.warning(
+                f"The simulation daemon listens on {host}, which is not a loopback address. "
+                "Requests are not authenticated, so other hosts can run models."
+            )
+        self.pool = pool
+        super().__init__((host, port), _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.close()
+
+
+def _is_loopback(host: str) -> bool:
+    """Check if a host is a loopback address."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
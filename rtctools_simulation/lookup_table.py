@@ -1,10 +1,29 @@
 """Module for creating lookup tables and lookup table equations."""
+import collections
+import csv
+import hashlib
+import itertools
+import logging
+import os
+import tempfile
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import Dict, List, Tuple, Union
 
 import casadi as ca
 import numpy as np
-import pandas as pd
+
+logger = logging.getLogger("rtctools")
+
+#: Maximum number of entries of each lookup table cache.
+LOOKUP_TABLE_CACHE_SIZE = 256
+
+#: Lookup table data that has been read in this process, see :func:`get_lookup_table_data_from_csv`.
+#: The least recently used entries are removed first.
+_LOOKUP_TABLE_DATA_CACHE: "collections.OrderedDict[tuple, tuple]" = collections.OrderedDict()
+
+#: Lookup tables that have been created in this process, see :func:`get_lookup_table_from_csv`.
+#: The least recently used entries are removed first.
+_LOOKUP_TABLE_CACHE: "collections.OrderedDict[tuple, ca.Function]" = collections.OrderedDict()
 
 
 class GridCoordinatesNotFoundError(Exception):
@@ -13,6 +32,104 @@ class GridCoordinatesNotFoundError(Exception):
     pass
 
 
+class NumpyLookupTable:
+    """
+    Lookup table that interpolates arrays of input values with NumPy.
+
+    The lookup table uses the same (multi)linear interpolation and extrapolation
+    as the lookup tables created with ``casadi.interpolant``,
+    but evaluates whole arrays of input values in a single call.
+    Like the CasADi lookup tables, it takes all input variables as arguments,
+    including input variables that have a constant value in the data.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        coordinates: List[List[float]],
+        values: np.ndarray,
+        vars_in: List[str],
+        reduced_vars_in: List[str],
+    ):
+        """
+        Initialize the lookup table.
+
+        :param name: name of the lookup table.
+        :param coordinates: coordinate vector of each (reduced) input variable.
+        :param values: flattened values in Fortran order,
+            see :func:`get_lookup_table_data_from_csv`.
+        :param vars_in: input variables of the lookup table.
+        :param reduced_vars_in: input variables that are not constant in the data.
+        """
+        self.name = name
+        self.vars_in = list(vars_in)
+        self._coordinates = [np.asarray(co, dtype=float) for co in coordinates]
+        shape = [len(co) for co in self._coordinates]
+        self._values = np.reshape(np.asarray(values, dtype=float), shape, order="F")
+        self._indices = [self.vars_in.index(var) for var in reduced_vars_in]
+        if len(self._coordinates) == 1:
+            self._slopes = np.diff(self._values) / np.diff(self._coordinates[0])
+
+    def n_in(self) -> int:
+        """Get the number of input variables."""
+        return len(self.vars_in)
+
+    @property
+    def coordinates(self) -> List[np.ndarray]:
+        """Coordinate vectors of the (reduced) input variables."""
+        return list(self._coordinates)
+
+    def __call__(self, *args) -> np.ndarray:
+        """
+        Evaluate the lookup table.
+
+        :param args: values of the input variables.
+            Values can be scalars or arrays that can be broadcast to a common shape.
+
+        :return: array of interpolated values with the broadcast shape of the inputs.
+        """
+        if len(args) != self.n_in():
+            raise ValueError(
+                f"Lookup table {self.name} has {self.n_in()} inputs {self.vars_in},"
+                f" but {len(args)} arguments were given."
+            )
+        args = [np.asarray(arg, dtype=float) for arg in args]
+        shape = np.broadcast_shapes(*[arg.shape for arg in args])
+        if len(self._coordinates) == 1:
+            result = self._interpolate_1d(args[self._indices[0]])
+            return result if result.shape == shape else np.broadcast_to(result, shape)
+        lower_indices = []
+        weights = []
+        for index, coordinates in zip(self._indices, self._coordinates):
+            lower = self._get_lower_indices(coordinates, args[index])
+            x_lower = coordinates[lower]
+            weights.append((args[index] - x_lower) / (coordinates[lower + 1] - x_lower))
+            lower_indices.append(lower)
+        result = np.zeros(shape)
+        # Sum over the corners of the grid cell that contains the input values.
+        for corner in itertools.product([0, 1], repeat=len(self._coordinates)):
+            corner_weight = 1.0
+            corner_indices = []
+            for is_upper, lower, weight in zip(corner, lower_indices, weights):
+                corner_weight = corner_weight * (weight if is_upper else 1 - weight)
+                corner_indices.append(lower + is_upper)
+            result = result + corner_weight * self._values[tuple(corner_indices)]
+        return result
+
+    @staticmethod
+    def _get_lower_indices(coordinates: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """Get the index of the lower bound of the interval that contains x."""
+        # Use the first and last interval for extrapolation.
+        lower = np.searchsorted(coordinates, x, side="right") - 1
+        return np.clip(lower, 0, len(coordinates) - 2)
+
+    def _interpolate_1d(self, x: np.ndarray) -> np.ndarray:
+        """Interpolate a lookup table with a single (reduced) input variable."""
+        coordinates = self._coordinates[0]
+        lower = self._get_lower_indices(coordinates, x)
+        return self._values[lower] + self._slopes[lower] * (x - coordinates[lower])
+
+
 def _remove_duplicates_from_list(x: list) -> list:
     """
     Remove duplicate values from a list while retaining the original order.
@@ -60,25 +177,128 @@ def _reshape_flattened_array(
     return flat_array
 
 
+def _get_file_key(file: Path) -> tuple:
+    """Get a key that changes when a file changes."""
+    stat = file.stat()
+    return (str(file.resolve()), stat.st_mtime_ns, stat.st_size)
+
+
+def _get_cached(cache: collections.OrderedDict, key: tuple):
+    """Get an entry of a lookup table cache and mark it as most recently used."""
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _set_cached(cache: collections.OrderedDict, key: tuple, value):
+    """Add an entry to a lookup table cache and remove the least recently used entries."""
+    cache[key] = value
+    while len(cache) > LOOKUP_TABLE_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def _freeze_lookup_table_data(data: tuple) -> tuple:
+    """Convert lookup table data to read-only arrays and tuples, such that it can be shared."""
+    var_in_coordinates, var_out_values, vars_in, reduced_vars_in = data
+    arrays = [np.array(coordinates, dtype=float) for coordinates in var_in_coordinates]
+    values = np.array(var_out_values, dtype=float)
+    for array in arrays + [values]:
+        array.setflags(write=False)
+    return tuple(arrays), values, tuple(vars_in), tuple(reduced_vars_in)
+
+
 def get_lookup_table_data_from_csv(
     file: Path,
     var_in: Union[str, list[str]],
     var_out: str,
+    cache_dir: Path = None,
 ):
     """
     Get lookup table data from a csv file. The lookup table is reduced if inputs are constant.
 
+    The data is read only once per process, as long as the file does not change.
+    The data is shared, so the coordinates and values are read-only arrays.
+    If a cache directory is given, the data is also stored in a .npz file,
+    such that other processes do not need to parse the csv file again.
+
     :param file: CSV file containing data points for different variables.
     :param var_in: Input variable(s) of the lookup table. Should be one of the CSV file columns.
     :param var_out: Output variable of the lookup table. Should be one of the CSV file columns.
+    :param cache_dir: Directory for storing the data in .npz files.
+        The .npz files are identified by a hash of the csv file content.
 
-    :return: The coordinates and values from the reduced lookup table
+    :return: The coordinates and values from the reduced lookup table,
+        the input variables and the reduced input variables.
     """
     data_csv = Path(file)
     if not data_csv.is_file():
         raise FileNotFoundError(f"File {data_csv} not found.")
-    df = pd.read_csv(data_csv, sep=",")
     vars_in: list[str] = var_in if isinstance(var_in, list) else [var_in]
+    key = (_get_file_key(data_csv), tuple(vars_in), var_out)
+    data = _get_cached(_LOOKUP_TABLE_DATA_CACHE, key)
+    if data is not None:
+        return data
+    if cache_dir is None:
+        data = _read_lookup_table_data_from_csv(data_csv, vars_in, var_out)
+    else:
+        data = _read_lookup_table_data_from_cache(data_csv, vars_in, var_out, Path(cache_dir))
+    data = _freeze_lookup_table_data(data)
+    _set_cached(_LOOKUP_TABLE_DATA_CACHE, key, data)
+    return data
+
+
+def _read_lookup_table_data_from_cache(
+    data_csv: Path, vars_in: list[str], var_out: str, cache_dir: Path
+):
+    """Read lookup table data from a .npz cache file, or parse the csv file and create it."""
+    data_hash = hashlib.sha256(data_csv.read_bytes())
+    data_hash.update(" ".join(vars_in + [var_out]).encode())
+    npz_file = cache_dir / f"{data_csv.stem}_{data_hash.hexdigest()[:16]}.npz"
+    if npz_file.is_file():
+        try:
+            with np.load(npz_file) as npz:
+                n_coordinates = int(npz["n_coordinates"])
+                var_in_coordinates = [
+                    npz[f"coordinates_{i}"].tolist() for i in range(n_coordinates)
+                ]
+                var_out_values = npz["values"]
+                reduced_vars_in = npz["reduced_vars_in"].tolist()
+            return var_in_coordinates, var_out_values, vars_in, reduced_vars_in
+        except (OSError, KeyError, ValueError) as error:
+            logger.warning(f"Could not read lookup table cache {npz_file}: {error}.")
+    data = _read_lookup_table_data_from_csv(data_csv, vars_in, var_out)
+    var_in_coordinates, var_out_values, _, reduced_vars_in = data
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, such that other processes never read an incomplete file.
+    fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix=".npz")
+    with os.fdopen(fd, "wb") as f:
+        np.savez(
+            f,
+            n_coordinates=len(var_in_coordinates),
+            values=np.asarray(var_out_values, dtype=float),
+            reduced_vars_in=np.array(reduced_vars_in, dtype=str),
+            **{
+                f"coordinates_{i}": np.asarray(coordinates, dtype=float)
+                for i, coordinates in enumerate(var_in_coordinates)
+            },
+        )
+    os.replace(tmp_file, npz_file)
+    return data
+
+
+def _read_csv_rows(file: Path) -> List[Dict[str, str]]:
+    """Read the rows of a small csv file with a header, such as lookup_tables.csv."""
+    with open(file, newline="") as csv_file:
+        return list(csv.DictReader(csv_file, delimiter=","))
+
+
+def _read_lookup_table_data_from_csv(data_csv: Path, vars_in: list[str], var_out: str):
+    """Parse lookup table data from a csv file."""
+    # Pandas is only needed when the lookup table data is not cached.
+    import pandas as pd
+
+    df = pd.read_csv(data_csv, sep=",")
     var_in_grid = [df[var] for var in vars_in]
     try:
         var_in_coordinates = _get_coordinates_from_grid(var_in_grid)
@@ -103,7 +323,7 @@ def get_lookup_table_data_from_csv(
 
 
 def get_lookup_table_bounds_from_csv(
-    file: Path, var_in: Union[str, list[str]], var_out: str
+    file: Path, var_in: Union[str, list[str]], var_out: str, cache_dir: Path = None
 ) -> Dict:
     """
     Get the bounds from a lookup table csv.
@@ -111,20 +331,22 @@ def get_lookup_table_bounds_from_csv(
     :param file: CSV file containing data points for different variables.
     :param var_in: Input variable(s) of the lookup table. Should be one of the CSV file columns.
     :param var_out: Output variable of the lookup table. Should be one of the CSV file columns.
+    :param cache_dir: Directory for caching the lookup table data,
+        see :func:`get_lookup_table_data_from_csv`.
 
     :return: a dictionary containing the min and max values for each input and output variable
         in the lookup table.
     """
     var_in_coordinates, var_out_values, _, reduced_vars_in = get_lookup_table_data_from_csv(
-        file, var_in, var_out
+        file, var_in, var_out, cache_dir=cache_dir
     )
     bounds = {}
     for idx, var in enumerate(reduced_vars_in):
-        lb = min(var_in_coordinates[idx])
-        ub = max(var_in_coordinates[idx])
+        lb = float(min(var_in_coordinates[idx]))
+        ub = float(max(var_in_coordinates[idx]))
         bounds[var] = [lb, ub]
-    lb = min(var_out_values)
-    ub = max(var_out_values)
+    lb = float(min(var_out_values))
+    ub = float(max(var_out_values))
     bounds[var_out] = [lb, ub]
     return bounds
 
@@ -132,6 +354,7 @@ def get_lookup_table_bounds_from_csv(
 def get_lookup_tables_bounds_from_csv(
     file: Path,
     data_dir: Path = None,
+    cache_dir: Path = None,
 ) -> Dict:
     """
     Get a dict of lookup tables bounds described in a csv file.
@@ -141,6 +364,8 @@ def get_lookup_tables_bounds_from_csv(
         In case of multiple input variables, they should be separated by a whitespace.
     :param data_dir: Directory that contains the interpolation data for the lookup tables.
         By default, the directory of the csv file is used.
+    :param cache_dir: Directory for caching the lookup table data,
+        see :func:`get_lookup_table_data_from_csv`.
 
     :return: dict of lookup table bounds.
     """
@@ -148,6 +373,7 @@ def get_lookup_tables_bounds_from_csv(
         file=file,
         data_dir=data_dir,
         extraction_type="lookup_tables_bounds",
+        cache_dir=cache_dir,
     )
     return bounds
 
@@ -157,19 +383,40 @@ def get_lookup_table_from_csv(
     file: Path,
     var_in: Union[str, list[str]],
     var_out: str,
+    cache_dir: Path = None,
 ) -> ca.Function:
     """
     Get a lookup table from a csv file.
 
+    Lookup tables are created only once per process, as long as the csv file does not change.
+
     :param name: name of the lookup table
     :param file: CSV file containing data points for different variables.
     :param var_in: Input variable(s) of the lookup table. Should be one of the CSV file columns.
     :param var_out: Output variable of the lookup table. Should be one of the CSV file columns.
+    :param cache_dir: Directory for caching the lookup table data,
+        see :func:`get_lookup_table_data_from_csv`.
 
     :return: lookup table in the form of a Casadi function.
     """
+    data_csv = Path(file)
+    if not data_csv.is_file():
+        raise FileNotFoundError(f"File {data_csv} not found.")
+    vars_in: list[str] = var_in if isinstance(var_in, list) else [var_in]
+    key = (name, _get_file_key(data_csv), tuple(vars_in), var_out)
+    lookup_table = _get_cached(_LOOKUP_TABLE_CACHE, key)
+    if lookup_table is None:
+        lookup_table = _create_lookup_table(name, data_csv, vars_in, var_out, cache_dir)
+        _set_cached(_LOOKUP_TABLE_CACHE, key, lookup_table)
+    return lookup_table
+
+
+def _create_lookup_table(
+    name: str, file: Path, var_in: list[str], var_out: str, cache_dir: Path = None
+) -> ca.Function:
+    """Create a lookup table from a csv file."""
     var_in_coordinates, var_out_values, vars_in, reduced_vars_in = get_lookup_table_data_from_csv(
-        file, var_in, var_out
+        file, var_in, var_out, cache_dir=cache_dir
     )
     interpolant = ca.interpolant(name, "linear", var_in_coordinates, var_out_values)
     var_in_symbols: list[ca.MX] = [ca.MX.sym(var) for var in vars_in]
@@ -179,9 +426,30 @@ def get_lookup_table_from_csv(
     return lookup_table
 
 
+def get_numpy_lookup_table_from_csv(
+    name: str,
+    file: Path,
+    var_in: Union[str, list[str]],
+    var_out: str,
+    cache_dir: Path = None,
+) -> NumpyLookupTable:
+    """
+    Get a lookup table from a csv file that interpolates arrays with NumPy.
+
+    The parameters are the same as for :func:`get_lookup_table_from_csv`.
+
+    :return: lookup table in the form of a :class:`NumpyLookupTable`.
+    """
+    var_in_coordinates, var_out_values, vars_in, reduced_vars_in = get_lookup_table_data_from_csv(
+        file, var_in, var_out, cache_dir=cache_dir
+    )
+    return NumpyLookupTable(name, var_in_coordinates, var_out_values, vars_in, reduced_vars_in)
+
+
 def get_lookup_tables_from_csv(
     file: Path,
     data_dir: Path = None,
+    cache_dir: Path = None,
 ) -> Dict[str, ca.Function]:
     """
     Get a dict of lookup tables described by a csv file.
@@ -191,6 +459,8 @@ def get_lookup_tables_from_csv(
         In case of multiple input variables, they should be separated by a whitespace.
     :param data_dir: Directory that contains the interpolation data for the lookup tables.
         By default, the directory of the csv file is used.
+    :param cache_dir: Directory for caching the lookup table data,
+        see :func:`get_lookup_table_data_from_csv`.
 
     :return: dict of lookup tables.
     """
@@ -198,6 +468,28 @@ def get_lookup_tables_from_csv(
         file=file,
         data_dir=data_dir,
         extraction_type="lookup_tables",
+        cache_dir=cache_dir,
+    )
+    return lookup_tables
+
+
+def get_numpy_lookup_tables_from_csv(
+    file: Path,
+    data_dir: Path = None,
+    cache_dir: Path = None,
+) -> Dict[str, NumpyLookupTable]:
+    """
+    Get a dict of lookup tables described by a csv file that interpolate arrays with NumPy.
+
+    The parameters are the same as for :func:`get_lookup_tables_from_csv`.
+
+    :return: dict of lookup tables.
+    """
+    lookup_tables = extract_from_multiple_csv(
+        file=file,
+        data_dir=data_dir,
+        extraction_type="numpy_lookup_tables",
+        cache_dir=cache_dir,
     )
     return lookup_tables
 
@@ -206,6 +498,7 @@ def extract_from_multiple_csv(
     file: Path,
     data_dir: Path = None,
     extraction_type="lookup_tables",
+    cache_dir: Path = None,
 ) -> Dict:
     """
     Extract a dictionary of information from lookup tables.
@@ -216,8 +509,10 @@ def extract_from_multiple_csv(
     :param data_dir: Directory that contains the interpolation data for the lookup tables.
         By default, the directory of the csv file is used.
     :param extraction_type: str (default: "lookup_tables")
-        Data to be extracted from lookup tables. Options are "lookup_tables" or
-        "lookup_tables_bounds"
+        Data to be extracted from lookup tables. Options are "lookup_tables",
+        "numpy_lookup_tables" or "lookup_tables_bounds"
+    :param cache_dir: Directory for caching the lookup table data,
+        see :func:`get_lookup_table_data_from_csv`.
 
     :return: dict of lookup tables.
 
@@ -232,8 +527,7 @@ def extract_from_multiple_csv(
         data_dir = Path(data_dir)
         if not data_dir.is_dir():
             raise FileNotFoundError(f"Directory {data_dir} not found.")
-    lookup_tables_df = pd.read_csv(lookup_tables_csv, sep=",")
-    for _, lookup_table_df in lookup_tables_df.iterrows():
+    for lookup_table_df in _read_csv_rows(lookup_tables_csv):
         name = lookup_table_df["name"]
         data_csv = Path(data_dir / lookup_table_df["data"])
         var_in: str = lookup_table_df["var_in"]
@@ -245,17 +539,27 @@ def extract_from_multiple_csv(
                 file=data_csv,
                 var_in=var_in,
                 var_out=lookup_table_df["var_out"],
+                cache_dir=cache_dir,
+            )
+        elif extraction_type == "numpy_lookup_tables":
+            extraction_dict[name] = get_numpy_lookup_table_from_csv(
+                name=name,
+                file=data_csv,
+                var_in=var_in,
+                var_out=lookup_table_df["var_out"],
+                cache_dir=cache_dir,
             )
         elif extraction_type == "lookup_tables_bounds":
             extraction_dict[name] = get_lookup_table_bounds_from_csv(
                 file=data_csv,
                 var_in=var_in,
                 var_out=lookup_table_df["var_out"],
+                cache_dir=cache_dir,
             )
         else:
             raise ValueError(
                 f"extraction_type {extraction_type} not supported "
-                'choose from ["lookup_tables", "lookup_tables_bounds"].'
+                'choose from ["lookup_tables", "numpy_lookup_tables", "lookup_tables_bounds"].'
             )
 
     return extraction_dict
@@ -278,6 +582,29 @@ def get_empty_lookup_table(name: str, var_in: Union[str, list[str]], var_out: st
     return lookup_table
 
 
+def get_lookup_table_relations_from_csv(file: Path) -> List[Tuple[str, List[str], str]]:
+    """
+    Get a list of lookup-table relations described by a csv file.
+
+    :param file: CSV File that describes equations involving lookup tables.
+        See :func:`get_lookup_table_equations_from_csv` for a description of the columns.
+
+    :return: list of tuples (lookup_table, var_in, var_out),
+        where var_in is a list of input variable names.
+    """
+    relations = []
+    equations_csv = Path(file)
+    assert equations_csv.is_file()
+    for equation_df in _read_csv_rows(equations_csv):
+        name = equation_df["lookup_table"]
+        var_in: str = equation_df["var_in"]
+        var_in = var_in.split(" ")
+        var_in = [var for var in var_in if var != ""]
+        var_out = equation_df["var_out"]
+        relations.append((name, var_in, var_out))
+    return relations
+
+
 def get_lookup_table_equations_from_csv(
     file: Path,
     lookup_tables: Dict[str, ca.Function],
@@ -306,15 +633,7 @@ def get_lookup_table_equations_from_csv(
     :return: list of equations.
     """
     equations = []
-    equations_csv = Path(file)
-    assert equations_csv.is_file()
-    equations_df = pd.read_csv(equations_csv, sep=",")
-    for _, equation_df in equations_df.iterrows():
-        name = equation_df["lookup_table"]
-        var_in: str = equation_df["var_in"]
-        var_in = var_in.split(" ")
-        var_in = [var for var in var_in if var != ""]
-        var_out = equation_df["var_out"]
+    for name, var_in, var_out in get_lookup_table_relations_from_csv(file):
         if name not in lookup_tables:
             if allow_missing_lookup_tables:
                 lookup_table = get_empty_lookup_table(name, var_in, var_out)
@@ -1,18 +1,31 @@
 """Module for a basic model."""
 import logging
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, List, Mapping, Tuple
 
 import casadi as ca
-from rtctools.simulation.pi_mixin import PIMixin
+import numpy as np
+import rtctools
 from rtctools.simulation.simulation_problem import SimulationProblem
-from rtctools_interface.simulation.plot_mixin import PlotMixin
 
 import rtctools_simulation.lookup_table as lut
+from rtctools_simulation.columnar_io import ColumnarIOMixin
 from rtctools_simulation.model_config import ModelConfig
+from rtctools_simulation.plotting import PlotMixin
 
 logger = logging.getLogger("rtctools")
 
+# Private attributes of the rtc-tools SimulationProblem that are used for fast access
+# to the state vector, see _SimulationProblem._has_private_attributes.
+_STATE_VECTOR_ATTRIBUTES = (
+    "indices",
+    "n_states",
+    "parameter_names_including_aliases",
+    "state_vector",
+    "mx",
+)
+_DAE_ATTRIBUTES = ("sym_list", "dae_residual", "mx")
+
 
 class _SimulationProblem(SimulationProblem):
     """
@@ -23,32 +36,191 @@ class _SimulationProblem(SimulationProblem):
         """Set input variables."""
         pass
 
+    # Resolved state-vector indices and scale factors of tuples of variable names.
+    # This cache is only available after initialize(), when the nominals are numeric.
+    _var_indices: Dict[Tuple[str, ...], Tuple[np.ndarray, np.ndarray, bool]] = None
+
     def initialize(self, config_file=None):
+        self._var_indices = None
         self.set_input_variables()
         super().initialize(config_file)
+        if self._has_private_attributes(_STATE_VECTOR_ATTRIBUTES):
+            self._var_indices = {}
+        else:
+            logger.warning(
+                f"rtc-tools {rtctools.__version__} is not supported for fast access"
+                " to the state vector, get_vars and set_vars use get_var and set_var."
+            )
+
+    def _has_private_attributes(self, names: Iterable[str]) -> bool:
+        """
+        Check if the rtc-tools SimulationProblem has the given private attributes.
+
+        These attributes are not part of the rtc-tools API,
+        so the methods that use them check that they exist.
+        The supported rtc-tools versions are pinned in pyproject.toml.
+        """
+        return all(hasattr(self, f"_SimulationProblem__{name}") for name in names)
+
+    def _resolve_vars(self, names: Tuple[str, ...]) -> Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        Get the state-vector indices and scale factors of given variables.
+
+        The state vector stores value * sign / nominal for states
+        and value * sign for other variables. The scale factor is sign * nominal.
+
+        :returns: indices, scale factors, and whether any of the variables is a parameter.
+        """
+        resolved = self._var_indices.get(names)
+        if resolved is not None:
+            return resolved
+        # The indices are private attributes of the rtc-tools SimulationProblem.
+        indices = self._SimulationProblem__indices
+        n_states = self._SimulationProblem__n_states
+        parameters = self._SimulationProblem__parameter_names_including_aliases
+        var_indices = np.empty(len(names), dtype=int)
+        scales = np.empty(len(names))
+        for i, name in enumerate(names):
+            index, sign = indices[name]
+            nominal = self.get_variable_nominal(name) if index <= n_states else 1.0
+            var_indices[i] = index
+            scales[i] = sign * nominal
+        has_parameters = any(name in parameters for name in names)
+        resolved = (var_indices, scales, has_parameters)
+        self._var_indices[names] = resolved
+        return resolved
+
+    def get_vars(self, names: Iterable[str]) -> np.ndarray:
+        """
+        Get the values of given variables at the current time.
+
+        The state-vector indices of the variables are resolved once after initialization,
+        so this is faster than calling get_var for each variable.
+
+        :param names: variable names.
+        :returns: array of values of the given variables.
+        """
+        names = tuple(names)
+        if self._var_indices is None:
+            return np.array([self.get_var(name) for name in names], dtype=float)
+        var_indices, scales, _ = self._resolve_vars(names)
+        return self._SimulationProblem__state_vector[var_indices] * scales
+
+    def set_vars(self, values: Mapping[str, float]):
+        """
+        Set the values of given variables at the current time.
+
+        The state-vector indices of the variables are resolved once after initialization,
+        so this is faster than calling set_var for each variable.
+
+        :param values: dict of variable names and values.
+        """
+        if self._var_indices is None:
+            for name, value in values.items():
+                self.set_var(name, value)
+            return
+        var_indices, scales, has_parameters = self._resolve_vars(tuple(values))
+        if has_parameters:
+            raise Exception("Cannot set parameters after initialize() has been called.")
+        values = np.fromiter(values.values(), dtype=float, count=len(var_indices))
+        self._SimulationProblem__state_vector[var_indices] = values / scales
+
+    def get_state_vector_names(self) -> List[str]:
+        """
+        Get a name of each non-parameter entry of the state vector.
+
+        Aliases share an entry of the state vector, so each entry is named
+        by the first of its names in alphabetical order.
+        The parameters are stored at the end of the state vector and are not included.
+        If the state vector of rtc-tools is not accessible,
+        the names of the variables that are not parameters are returned instead.
+
+        :returns: list of variable names in the order of the state vector.
+        """
+        if not self._has_private_attributes(_STATE_VECTOR_ATTRIBUTES):
+            parameters = self.get_parameter_variables()
+            return [name for name in self.get_variables() if name not in parameters]
+        n_parameters = len(self._SimulationProblem__mx["parameters"])
+        n_entries = len(self._SimulationProblem__state_vector) - n_parameters
+        names = [""] * n_entries
+        for name, (index, _) in sorted(self._SimulationProblem__indices.items()):
+            if index < n_entries and not names[index]:
+                names[index] = name
+        return names
+
+    def get_dae_residual_function(self) -> ca.Function:
+        """
+        Get the DAE residual of the model equations.
+
+        Lookup-table equations are not included.
+        The current values of the parameters are substituted,
+        so this is only available after initialize().
+
+        :returns: function with a named input for each variable, except parameters.
+        """
+        if not self._has_private_attributes((*_STATE_VECTOR_ATTRIBUTES, *_DAE_ATTRIBUTES)):
+            raise NotImplementedError(
+                f"The DAE residual is not available for rtc-tools {rtctools.__version__}."
+            )
+        if self._var_indices is None:
+            raise Exception("The DAE residual is only available after initialize().")
+        symbols = self._SimulationProblem__sym_list
+        residual = self._SimulationProblem__dae_residual
+        parameters = self._SimulationProblem__mx["parameters"]
+        if parameters:
+            values = self.get_vars(parameter.name() for parameter in parameters)
+            residual = ca.substitute(residual, ca.vertcat(*parameters), ca.DM(values))
+        parameter_names = {parameter.name() for parameter in parameters}
+        symbols = [symbol for symbol in symbols if symbol.name() not in parameter_names]
+        return ca.Function(
+            "dae_residual",
+            symbols,
+            [residual],
+            [symbol.name() for symbol in symbols],
+            ["residual"],
+        )
 
     def update(self, dt):
-        # Temporarily update the time to set input variables.
-        # TODO: Ideally, rtc-tools allows for preprocessing before calling update.
-        # For now, temporarily updating the time provides a workaround.
         if dt > 0:
             self.set_time_step(dt)
         dt = self.get_time_step()
+        self.pre_update(self.get_current_time() + dt)
+        self._update_state(dt)
+
+    def pre_update(self, t_new):
+        """
+        Prepare computing the state at the next time.
+
+        This method is called exactly once at each timestep, before the state is computed.
+        It sets the input variables at the next time t_new.
+        The current time is restored afterwards, since rtc-tools advances the time itself.
+
+        :param t_new: the next time (s).
+        """
         t_old = self.get_current_time()
-        t_new = t_old + dt
         self.set_var("time", t_new)
         self.set_input_variables()
-        # Restore the time and call super().update.
         self.set_var("time", t_old)
+
+    def _update_state(self, dt):
+        """Compute the state at the next time with the DAE solver of rtc-tools."""
         super().update(dt)
 
 
-class Model(PlotMixin, PIMixin, _SimulationProblem):
-    """Basic model class."""
+class HeadlessModel(ColumnarIOMixin, _SimulationProblem):
+    """
+    Basic model class without plotting.
+
+    A headless model does not import any plotting packages.
+    The results can be plotted later with :py:func:`.plotting.plot_results`.
+    See :py:class:`Model` for a model that plots the results after simulating.
+    """
 
     def __init__(self, config: ModelConfig, **kwargs):
         self._config = config
+        self.timeseries_format = config.timeseries_format()
         self._lookup_tables = self._get_lookup_tables()
+        self._numpy_lookup_tables = None
         self.plot_table_file = self._get_plot_table_file()
         kwargs["input_folder"] = str(self._config.get_dir("input"))
         kwargs["output_folder"] = str(self._config.get_dir("output"))
@@ -63,8 +235,13 @@ class Model(PlotMixin, PIMixin, _SimulationProblem):
             plot_table_file = Path(__file__).parent / "empty_plot_table.csv"
         return plot_table_file
 
-    def _get_lookup_tables(self) -> Dict[str, ca.Function]:
-        """Get a dict of lookup tables."""
+    def _get_lookup_tables(self, extraction_type="lookup_tables") -> Dict[str, ca.Function]:
+        """
+        Get a dict of lookup tables.
+
+        :param extraction_type: "lookup_tables" for CasADi lookup tables
+            or "numpy_lookup_tables" for NumPy lookup tables.
+        """
         lookup_tables_csv = self._config.get_file("lookup_tables.csv", dirs=["lookup_tables"])
         if lookup_tables_csv is None:
             logger.debug("No lookup tables found.")
@@ -72,8 +249,11 @@ class Model(PlotMixin, PIMixin, _SimulationProblem):
         lookup_tables_dir = self._config.get_dir("lookup_tables")
         if lookup_tables_dir is None:
             raise FileNotFoundError("Directory lookup_tables not found.")
-        lookup_tables = lut.get_lookup_tables_from_csv(
-            file=lookup_tables_csv, data_dir=lookup_tables_dir
+        lookup_tables = lut.extract_from_multiple_csv(
+            file=lookup_tables_csv,
+            data_dir=lookup_tables_dir,
+            extraction_type=extraction_type,
+            cache_dir=self._config.get_dir("cache"),
         )
         return lookup_tables
 
@@ -85,6 +265,16 @@ class Model(PlotMixin, PIMixin, _SimulationProblem):
         """Return a lookup table."""
         return self._lookup_tables[lookup_table]
 
+    def numpy_lookup_tables(self) -> Dict[str, lut.NumpyLookupTable]:
+        """Return a dict of lookup tables that interpolate arrays with NumPy."""
+        if self._numpy_lookup_tables is None:
+            self._numpy_lookup_tables = self._get_lookup_tables("numpy_lookup_tables")
+        return self._numpy_lookup_tables
+
+    def numpy_lookup_table(self, lookup_table: str) -> lut.NumpyLookupTable:
+        """Return a lookup table that interpolates arrays with NumPy."""
+        return self.numpy_lookup_tables()[lookup_table]
+
     def _get_lookup_table_equations(self, allow_missing_lookup_tables=False) -> List[ca.MX]:
         """Get a list of lookup-table equations."""
         equations_csv = self._config.get_file("lookup_table_equations.csv", dirs=["model"])
@@ -112,6 +302,10 @@ class Model(PlotMixin, PIMixin, _SimulationProblem):
         self.calculate_output_variables()
         super().post()
 
+    def _plotting_enabled(self) -> bool:
+        """Check if the results are plotted after simulating."""
+        return False
+
     def calculate_output_variables(self):
         """
         Calculate output variables.
@@ -120,3 +314,14 @@ class Model(PlotMixin, PIMixin, _SimulationProblem):
         The user can implement this method to calculate additional output variables.
         """
         pass
+
+
+class Model(PlotMixin, HeadlessModel):
+    """
+    Basic model class.
+
+    The results are plotted after simulating as described by input/plot_table.csv,
+    see :py:class:`.PlotMixin`.
+    Plotting can be switched off with :py:meth:`.ModelConfig.set_plotting`.
+    See :py:class:`HeadlessModel` for a model without plotting.
+    """
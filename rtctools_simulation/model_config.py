@@ -1,6 +1,8 @@
 """Module for setting up a simulation configuration."""
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Union
+
+from rtctools_simulation.columnar_io import TimeseriesFormat
 
 
 class ModelConfig:
@@ -43,6 +45,27 @@ class ModelConfig:
     For any other file and folder, it will search according to the above file structure.
     So for the timeseries_import.xml file it will look for
     "path/to/my/base_dir/input/timeseries_import.xml".
+
+    Compiled models can be cached by setting a cache directory,
+    for example dirs={"cache": "path/to/my/cache_dir"}.
+    Models in the cache directory are identified by a hash of the model files,
+    such that outdated models are not used.
+    The cache directory can be shared by multiple configurations.
+
+    The timeseries are read from and written to PI-XML files by default.
+    For batch studies, a columnar binary format can be chosen with the timeseries_format
+    parameter, for example timeseries_format="parquet".
+    The timeseries are then read from input/timeseries_import.parquet
+    and written to output/timeseries_export.parquet,
+    see :py:mod:`rtctools_simulation.columnar_io`.
+
+    By default, a model with plotting (see :py:class:`rtctools_simulation.model.Model`)
+    plots the results after simulating as described by input/plot_table.csv.
+    With plotting=False, no figures are created.
+    The results can then be plotted later from the output files,
+    see :py:func:`rtctools_simulation.plotting.plot_results`.
+    A headless model (see :py:class:`rtctools_simulation.model.HeadlessModel`)
+    does not import any plotting packages and never plots.
     """
 
     def __init__(
@@ -51,15 +74,21 @@ class ModelConfig:
         base_dir: Path = None,
         dirs: Dict[str, Path] = None,
         files: Dict[str, Path] = None,
+        timeseries_format: Union[TimeseriesFormat, str] = TimeseriesFormat.PI_XML,
+        plotting: bool = True,
     ):
         self._model = None
         self._base_dir = None
         self._dirs = {}
         self._files = {}
+        self._timeseries_format = TimeseriesFormat.PI_XML
+        self._plotting = True
         self.set_model(model)
         self.set_base_dir(base_dir)
         self.set_dirs(dirs)
         self.set_files(files)
+        self.set_timeseries_format(timeseries_format)
+        self.set_plotting(plotting)
 
     def model(self) -> str:
         """Get the model name"""
@@ -77,6 +106,14 @@ class ModelConfig:
         """Get a dict of files."""
         return self._files
 
+    def timeseries_format(self) -> TimeseriesFormat:
+        """Get the format of the timeseries files."""
+        return self._timeseries_format
+
+    def plotting(self) -> bool:
+        """Get whether the results are plotted after simulating."""
+        return self._plotting
+
     def set_model(self, model: str):
         """Set the model name."""
         self._model = model
@@ -88,6 +125,20 @@ class ModelConfig:
             assert base_dir.is_dir()
         self._base_dir = base_dir
 
+    def set_timeseries_format(self, timeseries_format: Union[TimeseriesFormat, str]):
+        """Set the format of the timeseries files."""
+        try:
+            self._timeseries_format = TimeseriesFormat(timeseries_format)
+        except ValueError:
+            formats = [f.value for f in TimeseriesFormat]
+            raise ValueError(
+                f"Timeseries format {timeseries_format} is not supported. Choose one of {formats}."
+            ) from None
+
+    def set_plotting(self, plotting: bool):
+        """Set whether the results are plotted after simulating."""
+        self._plotting = bool(plotting)
+
     def set_dir(self, dir_name: str, dir: Path):
         """Set a directory."""
         dir = Path(dir).resolve()
@@ -47,7 +47,9 @@ class OptimizationProblem(
         if lookup_tables_dir is None:
             raise ValueError("Directory lookup_tables not found.")
         lookup_tables = lut.get_lookup_tables_from_csv(
-            file=lookup_tables_csv, data_dir=lookup_tables_dir
+            file=lookup_tables_csv,
+            data_dir=lookup_tables_dir,
+            cache_dir=self._config.get_dir("cache"),
         )
         return lookup_tables
 
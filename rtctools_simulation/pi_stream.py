@@ -0,0 +1,714 @@
+"""
+Module for streaming PI-XML timeseries.
+
+Delft-FEWS exports can hold long timeseries for many locations.
+The PI reader of rtc-tools parses the whole XML tree into memory,
+which takes several times the file size.
+The classes in this module read and write PI-XML files series by series instead:
+
+* :py:class:`StreamingTimeseries` reads a timeseries file with ``iterparse``,
+  only keeps the series that are mapped in rtcDataConfig.xml,
+  and writes the values directly into NumPy arrays.
+* :py:class:`StreamingTimeseriesWriter` writes a timeseries file series by series
+  and flushes each series as soon as it has been written.
+* :py:class:`PIStreamingMixin` uses these classes in the PI mixin of a model.
+
+Memory use is the size of the selected NumPy arrays, independent of the file size.
+The binary PI format is not supported.
+"""
+
+import bisect
+import datetime
+import logging
+import os
+from array import array
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+import defusedxml.ElementTree as DefusedElementTree
+import numpy as np
+from rtctools.data import pi, rtc
+from rtctools.simulation.io_mixin import IOMixin
+from rtctools.simulation.pi_mixin import PIMixin
+
+logger = logging.getLogger("rtctools")
+
+_PI = "{" + pi.ns["pi"] + "}"
+
+#: Missing value of written timeseries.
+MISS_VAL = -999
+
+
+def _parse_date_time(element) -> datetime.datetime:
+    """Parse a PI date time element."""
+    return datetime.datetime.strptime(
+        element.get("date") + " " + element.get("time"), "%Y-%m-%d %H:%M:%S"
+    )
+
+
+def _parse_time_step(element) -> Optional[datetime.timedelta]:
+    """Parse a PI time step element, None for non-equidistant timeseries."""
+    unit = element.get("unit")
+    if unit == "second":
+        return datetime.timedelta(seconds=int(element.get("multiplier")))
+    if unit == "nonequidistant":
+        return None
+    raise ValueError(f"PI: Unsupported time step unit {unit}.")
+
+
+class _Series:
+    """Values of a single series while it is being read."""
+
+    def __init__(self, header, variable: str, dt: Optional[datetime.timedelta]):
+        self.variable = variable
+        self.start = _parse_date_time(header.find("pi:startDate", pi.ns))
+        self.end = _parse_date_time(header.find("pi:endDate", pi.ns))
+        self.miss_val = float(header.find("pi:missVal", pi.ns).text)
+        self.unit = header.find("pi:units", pi.ns).text
+        self.n_events = 0
+        if dt is None:
+            self.times: List[datetime.datetime] = []
+            self.values = array("d")
+        else:
+            n_values = round((self.end - self.start) / dt) + 1
+            self.times = None
+            self.values = np.full(n_values, np.nan)
+
+    def add_event(self, event):
+        """Add the value of an event."""
+        value = float(event.get("value"))
+        if self.times is not None:
+            self.times.append(_parse_date_time(event))
+            self.values.append(value)
+        elif self.n_events < len(self.values):
+            # Like rtc-tools, assume that the events start at the start date.
+            self.values[self.n_events] = value
+        self.n_events += 1
+
+    def to_array(self) -> np.ndarray:
+        """Get the values, with missing values replaced by nan."""
+        values = np.asarray(self.values, dtype=np.float64)
+        values[values == self.miss_val] = np.nan
+        return values
+
+
+class StreamingTimeseries:
+    """
+    PI timeseries that are read and written series by series.
+
+    This class provides the part of the interface of :py:class:`rtctools.data.pi.Timeseries`
+    that is used by the PI mixin. Only one ensemble member is kept in memory,
+    and the ensemble_member arguments of the methods are ignored.
+    Series that are not mapped in rtcDataConfig.xml are skipped.
+    For non-equidistant timeseries, the times are the union of the times of the kept series.
+    """
+
+    def __init__(
+        self,
+        data_config: rtc.DataConfig,
+        folder: str,
+        basename: str,
+        pi_validate_times: bool = False,
+        make_new_file: bool = False,
+        ensemble_member: int = 0,
+    ):
+        """
+        Read the timeseries from disk.
+
+        :param data_config: rtcDataConfig object.
+        :param folder: folder of the timeseries file.
+        :param basename: basename of the timeseries file.
+        :param pi_validate_times: check that all series are aligned with the global times.
+        :param make_new_file: create empty timeseries that can be filled and written.
+        :param ensemble_member: ensemble member to read.
+        """
+        self._data_config = data_config
+        self._folder = folder
+        self._basename = basename
+        self.make_new_file = make_new_file
+        self.ensemble_member = ensemble_member
+        self._values: Dict[str, np.ndarray] = {}
+        self._units: Dict[str, str] = {}
+        self._timezone = None
+        self._dt = None
+        self._times: List[datetime.datetime] = []
+        self._start_datetime = None
+        self._end_datetime = None
+        self._forecast_datetime = None
+        self._forecast_index = None
+        self._contains_ensemble = False
+        self._ensemble_size = 1
+        if not make_new_file:
+            self._read(pi_validate_times)
+
+    @property
+    def path(self) -> str:
+        """Path of the timeseries file."""
+        return os.path.join(self._folder, self._basename + ".xml")
+
+    def _iterate_series(self) -> Iterator[Tuple[object, Optional[_Series]]]:
+        """
+        Parse the file and yield the header of each series and its values.
+
+        The values are None if the series is not kept.
+        Parsed elements are removed, such that the tree never holds more than one series.
+        """
+        context = DefusedElementTree.iterparse(self.path, events=("start", "end"))
+        _, root = next(context)
+        series = None
+        header = None
+        for event, element in context:
+            if event != "end":
+                continue
+            tag = element.tag
+            if tag == _PI + "event":
+                if series is not None:
+                    series.add_event(element)
+                element.clear()
+            elif tag == _PI + "header":
+                header = element
+                series = self._select_series(header)
+            elif tag == _PI + "series":
+                yield header, series
+                series = header = None
+                root.clear()
+            elif tag == _PI + "timeZone":
+                self._timezone = float(element.text)
+
+    def _select_series(self, header) -> Optional[_Series]:
+        """Start reading a series if it is mapped and belongs to the ensemble member."""
+        variable = self._data_config.variable(header)
+        try:
+            self._data_config.pi_variable_ids(variable)
+        except KeyError:
+            logger.debug(f"PI: Skipping series {variable}, since it is not in rtcDataConfig.")
+            return None
+        el = header.find("pi:ensembleMemberIndex", pi.ns)
+        if el is not None and int(el.text) != self.ensemble_member:
+            return None
+        dt = _parse_time_step(header.find("pi:timeStep", pi.ns))
+        return _Series(header, variable, dt)
+
+    def _read(self, pi_validate_times: bool):
+        """Read the file in a single pass."""
+        series_list: List[_Series] = []
+        dts = set()
+        forecast_datetimes = set()
+        ensemble_indexes = set()
+        for header, series in self._iterate_series():
+            variable = self._data_config.variable(header)
+            try:
+                dts.add(_parse_time_step(header.find("pi:timeStep", pi.ns)))
+                start = _parse_date_time(header.find("pi:startDate", pi.ns))
+                end = _parse_date_time(header.find("pi:endDate", pi.ns))
+            except (AttributeError, ValueError) as error:
+                raise ValueError(f"PI: Invalid time settings of variable {variable}.") from error
+            self._start_datetime = min(start, self._start_datetime or start)
+            self._end_datetime = max(end, self._end_datetime or end)
+            el = header.find("pi:forecastDate", pi.ns)
+            if el is not None:
+                forecast_datetimes.add(_parse_date_time(el))
+            el = header.find("pi:ensembleMemberIndex", pi.ns)
+            if el is not None:
+                ensemble_indexes.add(int(el.text))
+            if series is not None:
+                series_list.append(series)
+        if len(dts) > 1:
+            raise ValueError("PI: Not all timeseries have the same time step size.")
+        if len(forecast_datetimes) > 1:
+            raise ValueError("PI: Not all timeseries share the same forecastDate.")
+        self._set_ensemble(ensemble_indexes)
+        self._set_times(dts.pop() if dts else None, forecast_datetimes, series_list)
+        for series in series_list:
+            self._store(series, pi_validate_times)
+
+    def _set_ensemble(self, ensemble_indexes: set):
+        """Set the ensemble properties from the ensemble member indexes of all series."""
+        if len(ensemble_indexes) > 1:
+            if sorted(ensemble_indexes) != list(range(len(ensemble_indexes))):
+                raise ValueError(
+                    "PI: Ensemble ids must be zero-based and increasing by 1 when more than one"
+                    " ensemble member is present."
+                )
+            self._contains_ensemble = True
+            self._ensemble_size = len(ensemble_indexes)
+
+    def _set_times(
+        self,
+        dt: Optional[datetime.timedelta],
+        forecast_datetimes: set,
+        series_list: List[_Series],
+    ):
+        """Set the global times and the forecast datetime."""
+        self._dt = dt
+        if self._dt:
+            n_times = round((self._end_datetime - self._start_datetime) / self._dt) + 1
+            self._times = [self._start_datetime + i * self._dt for i in range(n_times)]
+        else:
+            self._times = sorted({t for series in series_list for t in series.times})
+        if forecast_datetimes:
+            self._forecast_datetime = forecast_datetimes.pop()
+            if self._dt:
+                self._forecast_datetime = self._floor_date_time(self._forecast_datetime)
+        else:
+            self._forecast_datetime = self._start_datetime
+        try:
+            self._forecast_index = self._times.index(self._forecast_datetime)
+        except ValueError:
+            self._forecast_index = -1
+
+    def _floor_date_time(self, date_time: datetime.datetime) -> datetime.datetime:
+        """Round a datetime to a whole number of time steps from the start datetime."""
+        step = self._dt.total_seconds()
+        seconds = (date_time - self._start_datetime).seconds
+        rounding = (seconds + step / 2) // step * step
+        return date_time + datetime.timedelta(0, rounding - seconds, -date_time.microsecond)
+
+    def _store(self, series: _Series, pi_validate_times: bool):
+        """Store the values of a series on the global times."""
+        values = series.to_array()
+        if self._dt:
+            offset = (series.start - self._start_datetime) / self._dt
+            if pi_validate_times and offset != round(offset):
+                raise ValueError(
+                    "PI: Not all timeseries share the same time step spacing. Make sure "
+                    "the time steps of all series are a subset of the global time steps."
+                )
+            start_index = round(offset)
+            self._values[series.variable] = np.full(len(self._times), np.nan)
+            self._values[series.variable][start_index : start_index + len(values)] = values
+        else:
+            indices = [bisect.bisect_left(self._times, t) for t in series.times]
+            self._values[series.variable] = np.full(len(self._times), np.nan)
+            self._values[series.variable][indices] = values
+        self._units[series.variable] = series.unit
+
+    def write(self, output_folder: Optional[str] = None, output_filename: Optional[str] = None):
+        """
+        Write the timeseries to disk, series by series.
+
+        :param output_folder: folder of the output file. Defaults to the original folder.
+        :param output_filename: name of the output file without extension.
+            Defaults to the original basename.
+        """
+        folder = self._folder if output_folder is None else output_folder
+        basename = self._basename if output_filename is None else output_filename
+        path = os.path.join(folder, basename + ".xml")
+        with StreamingTimeseriesWriter(
+            path,
+            times=self._times,
+            dt=self._dt,
+            forecast_datetime=self._forecast_datetime,
+            timezone=self._timezone,
+        ) as writer:
+            for variable in sorted(self._values):
+                writer.write_series(
+                    self._data_config.pi_variable_ids(variable),
+                    self._values[variable],
+                    unit=self.get_unit(variable),
+                    ensemble_member=self.ensemble_member if self._contains_ensemble else None,
+                )
+
+    def items(self, ensemble_member: int = 0) -> Iterator[Tuple[str, np.ndarray]]:
+        """Iterate over the variables and values of the ensemble member that has been read."""
+        yield from self._values.items()
+
+    def get(self, variable: str, ensemble_member: int = 0) -> np.ndarray:
+        """Get the values of a variable."""
+        return self._values[variable]
+
+    def set(
+        self,
+        variable: str,
+        new_values: np.ndarray,
+        unit: Optional[str] = None,
+        ensemble_member: int = 0,
+    ):
+        """Set the values of a variable."""
+        self._values[variable] = np.asarray(new_values, dtype=np.float64)
+        if unit is not None:
+            self.set_unit(variable, unit)
+
+    def get_unit(self, variable: str, ensemble_member: int = 0) -> str:
+        """Get the unit of a variable."""
+        return self._units.get(variable, "unit_unknown")
+
+    def set_unit(self, variable: str, unit: str, ensemble_member: int = 0):
+        """Set the unit of a variable."""
+        self._units[variable] = unit
+
+    @property
+    def times(self) -> List[datetime.datetime]:
+        return self._times
+
+    @times.setter
+    def times(self, times: List[datetime.datetime]):
+        self._times = list(times)
+        self._start_datetime = self._times[0]
+        self._end_datetime = self._times[-1]
+
+    @property
+    def dt(self) -> Optional[datetime.timedelta]:
+        return self._dt
+
+    @dt.setter
+    def dt(self, dt: Optional[datetime.timedelta]):
+        self._dt = dt
+
+    @property
+    def timezone(self) -> Optional[float]:
+        return self._timezone
+
+    @timezone.setter
+    def timezone(self, timezone: Optional[float]):
+        self._timezone = timezone
+
+    @property
+    def forecast_datetime(self) -> datetime.datetime:
+        return self._forecast_datetime
+
+    @forecast_datetime.setter
+    def forecast_datetime(self, forecast_datetime: datetime.datetime):
+        self._forecast_datetime = forecast_datetime
+
+    @property
+    def forecast_index(self) -> int:
+        return self._forecast_index
+
+    @property
+    def start_datetime(self) -> datetime.datetime:
+        return self._start_datetime
+
+    @property
+    def end_datetime(self) -> datetime.datetime:
+        return self._end_datetime
+
+    @property
+    def contains_ensemble(self) -> bool:
+        return self._contains_ensemble
+
+    @contains_ensemble.setter
+    def contains_ensemble(self, contains_ensemble: bool):
+        self._contains_ensemble = contains_ensemble
+
+    @property
+    def ensemble_size(self) -> int:
+        return self._ensemble_size
+
+    @ensemble_size.setter
+    def ensemble_size(self, ensemble_size: int):
+        self._ensemble_size = ensemble_size
+
+
+class StreamingTimeseriesWriter:
+    """
+    Writer of a PI-XML timeseries file.
+
+    Series are written one at a time and flushed to disk,
+    so that no XML tree has to be kept in memory.
+    Use the writer as a context manager:
+
+    .. code-block:: python
+
+        with StreamingTimeseriesWriter(path, times, dt) as writer:
+            writer.write_series(data_config.pi_variable_ids("H"), values, unit="m")
+    """
+
+    def __init__(
+        self,
+        path: str,
+        times: List[datetime.datetime],
+        dt: Optional[datetime.timedelta] = None,
+        forecast_datetime: Optional[datetime.datetime] = None,
+        timezone: Optional[float] = None,
+    ):
+        """
+        Create the writer.
+
+        :param path: path of the output file.
+        :param times: times of all series.
+        :param dt: time step, None for non-equidistant times.
+        :param forecast_datetime: forecast datetime, written if it differs from the start.
+        :param timezone: time zone.
+        """
+        self.path = path
+        self._times = list(times)
+        self._dt = dt
+        self._forecast_datetime = forecast_datetime
+        self._timezone = timezone
+        self._file: Optional[TextIO] = None
+        dates = [t.strftime("%Y-%m-%d") for t in self._times]
+        times_of_day = [t.strftime("%H:%M:%S") for t in self._times]
+        # The event prefixes are the same for all series.
+        self._event_prefixes = [
+            f'    <pi:event date="{date}" time="{time}" value="'
+            for date, time in zip(dates, times_of_day)
+        ]
+
+    def __enter__(self) -> "StreamingTimeseriesWriter":
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(
+            '<pi:TimeSeries xmlns:pi="http://www.wldelft.nl/fews/PI"'
+            ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" version="1.2"'
+            ' xsi:schemaLocation="http://www.wldelft.nl/fews/PI'
+            ' http://fews.wldelft.nl/schemas/version1.0/pi-schemas/pi_timeseries.xsd">\n'
+        )
+        if self._timezone is not None:
+            self._file.write(f"  <pi:timeZone>{self._timezone}</pi:timeZone>\n")
+        return self
+
+    def __exit__(self, *args):
+        self._file.write("</pi:TimeSeries>\n")
+        self._file.close()
+        self._file = None
+
+    def write_series(
+        self,
+        location_parameter_id,
+        values: np.ndarray,
+        unit: str = "unit_unknown",
+        ensemble_member: Optional[int] = None,
+    ):
+        """
+        Write a series and flush it to disk.
+
+        :param location_parameter_id: PI ids of the series, see
+            :py:meth:`rtctools.data.rtc.DataConfig.pi_variable_ids`.
+        :param values: values at all times, nan values are written as missing values.
+        :param unit: unit of the values.
+        :param ensemble_member: ensemble member index, not written if None.
+        """
+        if self._file is None:
+            raise RuntimeError("The writer should be used as a context manager.")
+        if len(values) == 0:
+            return
+        if len(values) != len(self._times):
+            raise ValueError(
+                f"Expected {len(self._times)} values for {location_parameter_id},"
+                f" got {len(values)}."
+            )
+        self._file.write(self._header(location_parameter_id, unit, ensemble_member))
+        miss_val = str(MISS_VAL)
+        values = np.asarray(values, dtype=np.float64)
+        self._file.writelines(
+            f'{prefix}{miss_val if is_nan else value}" />\n'
+            for prefix, value, is_nan in zip(
+                self._event_prefixes, values.tolist(), np.isnan(values).tolist()
+            )
+        )
+        self._file.write("  </pi:series>\n")
+        self._file.flush()
+
+    def _header(self, location_parameter_id, unit: str, ensemble_member: Optional[int]) -> str:
+        """Get the header of a series."""
+        now = datetime.datetime.now()
+        start, end = self._times[0], self._times[-1]
+
+        def date_time(tag, t):
+            return (
+                f'      <pi:{tag} date="{t.strftime("%Y-%m-%d")}"'
+                f' time="{t.strftime("%H:%M:%S")}" />\n'
+            )
+
+        def text(tag, value):
+            return f"      <pi:{tag}>{escape(str(value))}</pi:{tag}>\n"
+
+        lines = [
+            "  <pi:series>\n",
+            "    <pi:header>\n",
+            text("type", "instantaneous"),
+            text("locationId", location_parameter_id.location_id),
+            text("parameterId", location_parameter_id.parameter_id),
+            *(text("qualifierId", q) for q in location_parameter_id.qualifier_id),
+        ]
+        if ensemble_member is not None:
+            lines.append(text("ensembleMemberIndex", ensemble_member))
+        if self._dt:
+            multiplier = quoteattr(str(int(self._dt.total_seconds())))
+            lines.append(f'      <pi:timeStep unit="second" multiplier={multiplier} />\n')
+        else:
+            lines.append('      <pi:timeStep unit="nonequidistant" />\n')
+        lines += [date_time("startDate", start), date_time("endDate", end)]
+        if self._forecast_datetime is not None and self._forecast_datetime != start:
+            lines.append(date_time("forecastDate", self._forecast_datetime))
+        lines += [
+            text("missVal", MISS_VAL),
+            text("stationName", location_parameter_id.location_id),
+            text("units", unit),
+            text("creationDate", now.strftime("%Y-%m-%d")),
+            text("creationTime", now.strftime("%H:%M:%S")),
+            "    </pi:header>\n",
+        ]
+        return "".join(lines)
+
+
+class PIStreamingMixin(PIMixin):
+    """
+    PI mixin that can read and write timeseries series by series.
+
+    If :py:attr:`pi_streaming` is True, timeseries_import.xml is read with
+    :py:class:`StreamingTimeseries` and timeseries_export.xml is written with
+    :py:class:`StreamingTimeseriesWriter`. Otherwise, the PI mixin of rtc-tools is used.
+    The streamed timeseries are kept by this mixin, so all methods of the PI mixin
+    that use its timeseries are overridden when streaming.
+
+    :cvar pi_streaming: Whether to stream the PI timeseries. Default is ``False``.
+    """
+
+    #: Whether to stream the PI timeseries.
+    pi_streaming = False
+
+    __data_config: Optional[rtc.DataConfig] = None
+    __timeseries_import: Optional[StreamingTimeseries] = None
+    __timeseries_export: Optional[StreamingTimeseries] = None
+
+    def _get_data_config(self, required: bool = True) -> Optional[rtc.DataConfig]:
+        """
+        Get the data config of rtcDataConfig.xml in the input folder.
+
+        The data config of the PI mixin is private, so the file is read again
+        the first time this method is called.
+
+        :param required: if False, None is returned if the file does not exist.
+        """
+        if self.__data_config is None:
+            path = os.path.join(self._input_folder, "rtcDataConfig.xml")
+            if not required and not os.path.isfile(path):
+                return None
+            self.__data_config = rtc.DataConfig(self._input_folder)
+        return self.__data_config
+
+    def read(self):
+        if not self.pi_streaming:
+            super().read()
+            return
+        if self.pi_binary_timeseries:
+            raise ValueError("Streaming PI timeseries do not support the binary format.")
+        IOMixin.read(self)
+        data_config = self._get_data_config()
+        self._read_parameter_config(data_config)
+        try:
+            timeseries_import = StreamingTimeseries(
+                data_config,
+                self._input_folder,
+                self.timeseries_import_basename,
+                pi_validate_times=self.pi_validate_timeseries,
+                ensemble_member=self.pi_ensemble_member,
+            )
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                f"PIMixin: {self.timeseries_import_basename}.xml not found in {self._input_folder}"
+            ) from None
+        self.__timeseries_import = timeseries_import
+        self.__timeseries_export = StreamingTimeseries(
+            data_config,
+            self._output_folder,
+            self.timeseries_export_basename,
+            make_new_file=True,
+        )
+        times = timeseries_import.times
+        if self.pi_validate_timeseries and len(set(np.diff(times))) > 1:
+            raise ValueError(
+                "PIMixin: Expecting equidistant timeseries. "
+                "Set unit to nonequidistant if this is intended."
+            )
+        self.io.reference_datetime = timeseries_import.forecast_datetime
+        for variable, values in timeseries_import.items(self.pi_ensemble_member):
+            self.io.set_timeseries(variable, times, values)
+
+    def _read_parameter_config(self, data_config: Optional[rtc.DataConfig], required: bool = True):
+        """
+        Read the parameter config files and set the parameters.
+
+        :param data_config: data config to map parameter ids, or None to use the parameter ids.
+        :param required: if False, missing parameter config files are skipped.
+        """
+        for basename in self.pi_parameter_config_basenames:
+            try:
+                parameter_config = pi.ParameterConfig(self._input_folder, basename)
+            except FileNotFoundError:
+                if not required:
+                    logger.debug(f"PIMixin: {basename}.xml not found in {self._input_folder}.")
+                    continue
+                raise FileNotFoundError(
+                    f"PIMixin: {basename}.xml not found in {self._input_folder}."
+                ) from None
+            for location_id, model_id, parameter_id, value in parameter_config:
+                try:
+                    parameter = data_config.parameter(parameter_id, location_id, model_id)
+                except (AttributeError, KeyError):
+                    parameter = parameter_id
+                self.io.set_parameter(parameter, value)
+
+    def write(self):
+        if not self.pi_streaming:
+            super().write()
+            return
+        IOMixin.write(self)
+        times = self._simulation_times
+        dts = set(np.diff(times))
+        timeseries_import = self.__timeseries_import
+        timeseries_export = self.__timeseries_export
+        timeseries_export.times = [
+            self.io.reference_datetime + datetime.timedelta(seconds=t) for t in times
+        ]
+        timeseries_export.forecast_datetime = self.io.reference_datetime
+        timeseries_export.dt = datetime.timedelta(seconds=dts.pop()) if len(dts) == 1 else None
+        timeseries_export.timezone = timeseries_import.timezone
+        timeseries_export.ensemble_size = 1
+        timeseries_export.contains_ensemble = timeseries_import.contains_ensemble
+        data_config = self._get_data_config()
+        for variable in self._io_output_variables:
+            try:
+                data_config.pi_variable_ids(variable)
+            except KeyError:
+                logger.debug(f"PIMixin: variable {variable} has no mapping in rtcDataConfig.")
+                continue
+            timeseries_export.set(
+                variable,
+                np.array(self._io_output[variable]),
+                unit=timeseries_import.get_unit(variable),
+            )
+        timeseries_export.write()
+
+    @property
+    def timeseries_import(self):
+        """Timeseries object containing the input data."""
+        if not self.pi_streaming:
+            return super().timeseries_import
+        return self.__timeseries_import
+
+    @property
+    def timeseries_export(self):
+        """Timeseries object for holding the output data."""
+        if not self.pi_streaming:
+            return super().timeseries_export
+        return self.__timeseries_export
+
+    def set_timeseries(self, variable, values, output=True, check_consistency=True, unit=None):
+        if not self.pi_streaming:
+            super().set_timeseries(variable, values, output, check_consistency, unit)
+            return
+        if check_consistency and len(self.times()) != len(values):
+            raise ValueError(
+                f"PIMixin: Trying to set/append values {variable} with a different "
+                "length than the forecast length."
+            )
+        if unit is None:
+            unit = self.__timeseries_import.get_unit(variable)
+        if output:
+            try:
+                self._get_data_config().pi_variable_ids(variable)
+            except KeyError:
+                logger.debug(f"PIMixin: variable {variable} has no mapping in rtcDataConfig.")
+            else:
+                self.__timeseries_export.set(variable, values, unit=unit)
+        self.__timeseries_import.set(variable, values, unit=unit)
+        self.io.set_timeseries(variable, self.io.datetimes, values)
+
+    def set_unit(self, variable: str, unit: str):
+        if not self.pi_streaming:
+            super().set_unit(variable, unit)
+            return
+        self.__timeseries_import.set_unit(variable, unit)
+        self.__timeseries_export.set_unit(variable, unit)
@@ -0,0 +1,252 @@
+"""
+Module for plotting the results of a simulation after it has run.
+
+A headless model (see :py:class:`.HeadlessModel`) does not import any plotting packages.
+The results of such a model, or of a model with plotting switched off
+(see :py:meth:`.ModelConfig.set_plotting`), can be plotted later from the output files
+with :py:func:`plot_results`, for example on another machine than the batch workers.
+The plots are the same as the plots of a model with plotting enabled.
+"""
+import datetime
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from rtctools.data import rtc
+
+from rtctools_simulation.columnar_io import (
+    ColumnarTimeseries,
+    TimeseriesFormat,
+    read_timeseries,
+    timeseries_file,
+)
+from rtctools_simulation.model_config import ModelConfig
+from rtctools_simulation.pi_stream import StreamingTimeseries
+
+logger = logging.getLogger("rtctools")
+
+
+def _read_persisted_timeseries(
+    config: ModelConfig, dir_name: str, basename: str
+) -> Optional[Union[StreamingTimeseries, ColumnarTimeseries]]:
+    """Read a timeseries file in the format of the config, None if the file does not exist."""
+    timeseries_format = TimeseriesFormat(config.timeseries_format())
+    folder = config.get_dir(dir_name)
+    path = timeseries_file(folder, basename, timeseries_format)
+    if not path.is_file():
+        return None
+    if timeseries_format == TimeseriesFormat.PI_XML:
+        data_config = rtc.DataConfig(str(config.get_dir("input")))
+        return StreamingTimeseries(data_config, str(folder), basename)
+    return read_timeseries(path, timeseries_format)
+
+
+def _collect_timeseries_data(
+    variables: List[str], times: List[datetime.datetime], timeseries_list: list
+) -> Dict[str, np.ndarray]:
+    """
+    Get the values of each variable at the given times.
+
+    The timeseries are searched in the given order. Variables that are not found are NaN.
+    """
+    sources = [
+        ({t: i for i, t in enumerate(timeseries.times)}, dict(timeseries.items()))
+        for timeseries in timeseries_list
+        if timeseries is not None
+    ]
+    timeseries_data = {}
+    for variable in variables:
+        values = np.full(len(times), np.nan)
+        for index, series in sources:
+            if variable in series:
+                values = np.array(
+                    [series[variable][index[t]] if t in index else np.nan for t in times]
+                )
+                break
+        else:
+            logger.warning(f"Variable {variable} not found in the persisted results.")
+        timeseries_data[variable] = values
+    return timeseries_data
+
+
+def plot_results(
+    config: ModelConfig,
+    plotting_library: str = "plotly",
+    save_plot_to: str = "image",
+    plot_max_rows: int = 4,
+) -> dict:
+    """
+    Plot the persisted results of a simulation.
+
+    The plots are described by input/plot_table.csv.
+    The results are read from the timeseries export file in the output folder,
+    in the timeseries format of the config.
+    Variables that are not in the export file are read from the timeseries import file.
+    Note that PI-XML files only contain the variables in rtcDataConfig.xml,
+    whereas columnar files contain all output variables.
+    As for a model with plotting enabled, the results are cached in output/cached_results
+    and compared with the results of the previous run.
+
+    :param config: config of the model that has been simulated.
+    :param plotting_library: 'plotly' or 'matplotlib'.
+    :param save_plot_to: 'image' to save the figures in the output folder
+        or 'stringio' to only return them.
+    :param plot_max_rows: maximum number of rows of subplots.
+
+    :returns: dict of the created figures, empty if there is no plot table.
+    """
+    # Plotting packages are only imported when plotting.
+    from rtctools_interface.utils.read_plot_table import get_plot_config
+    from rtctools_interface.utils.results_collection import get_plot_variables
+
+    plot_table_file = config.get_file("plot_table.csv", dirs=["input"])
+    if plot_table_file is None:
+        logger.info("No plot_table.csv found in the input folder, no plots are created.")
+        return {}
+    plot_config = get_plot_config(plot_table_file)
+    timeseries_export = _read_persisted_timeseries(config, "output", "timeseries_export")
+    if timeseries_export is None:
+        raise FileNotFoundError(f"No timeseries export found in {config.get_dir('output')}.")
+    timeseries_import = _read_persisted_timeseries(config, "input", "timeseries_import")
+    times = list(timeseries_export.times)
+    reference_datetime = timeseries_export.forecast_datetime or times[0]
+    timeseries_data = _collect_timeseries_data(
+        get_plot_variables(plot_config), times, [timeseries_export, timeseries_import]
+    )
+    return _plot_run(
+        output_folder=config.get_dir("output"),
+        plot_config=plot_config,
+        timeseries_data=timeseries_data,
+        io_datetimes=times,
+        times=np.array([(t - reference_datetime).total_seconds() for t in times]),
+        plotting_library=plotting_library,
+        save_plot_to=save_plot_to,
+        plot_max_rows=plot_max_rows,
+    )
+
+
+def _plot_run(
+    output_folder: Path,
+    plot_config: list,
+    timeseries_data: Dict[str, np.ndarray],
+    io_datetimes: List[datetime.datetime],
+    times: np.ndarray,
+    plotting_library: str,
+    save_plot_to: str,
+    plot_max_rows: int,
+) -> dict:
+    """
+    Plot the results of a run and cache them in output/cached_results.
+
+    The plot data have the same structure as the plot data of rtc-tools-interface,
+    such that the results are compared with the results of the previous run.
+    """
+    from rtctools_interface.plotting.plot_tools import create_plot_final_results
+    from rtctools_interface.utils.results_collection import (
+        CONFIG_VERSION,
+        read_cache_file_from_folder,
+        write_cache_file,
+    )
+
+    current_run = {
+        "intermediate_results": [{"timeseries_data": timeseries_data, "priority": 0}],
+        "plot_options": {
+            "plot_config": plot_config,
+            "plot_max_rows": plot_max_rows,
+            "output_folder": str(output_folder),
+            "save_plot_to": save_plot_to,
+        },
+        "prio_independent_data": {
+            "io_datetimes": io_datetimes,
+            "times": times,
+            "base_goals": [],
+        },
+        "config_version": CONFIG_VERSION,
+    }
+    cache_folder = Path(output_folder) / "cached_results"
+    previous_run = read_cache_file_from_folder(cache_folder)
+    write_cache_file(cache_folder, current_run)
+    return create_plot_final_results(current_run, previous_run, plotting_library=plotting_library)
+
+
+class PlotMixin:
+    """
+    Mixin for plotting the results after simulating.
+
+    The plots are described by the plot table of the model (input/plot_table.csv)
+    and are the same as the plots of the plot mixin of rtc-tools-interface.
+    The values of the plotted variables are collected at each timestep.
+    After simulating, the results are plotted, cached in output/cached_results
+    and compared with the results of the previous run.
+
+    Plotting can be switched off with :py:meth:`.ModelConfig.set_plotting`.
+    The plotting packages are only imported when the results are plotted.
+    """
+
+    #: Plotting library, 'plotly' or 'matplotlib'.
+    plotting_library = "plotly"
+    #: 'image' to save the figures in the output folder or 'stringio' to only return them.
+    save_plot_to = "image"
+    #: Maximum number of rows of subplots.
+    plot_max_rows = 4
+
+    # Values of the plotted variables at each timestep, None if plotting is switched off.
+    _plot_states: Optional[Dict[str, list]] = None
+
+    def _plotting_enabled(self) -> bool:
+        return self._config.plotting()
+
+    def initialize(self, config_file=None):
+        super().initialize(config_file)
+        self._plot_states = None
+        if not self._plotting_enabled():
+            return
+        from rtctools_interface.utils.read_plot_table import get_plot_config
+        from rtctools_interface.utils.results_collection import (
+            filter_plot_config,
+            get_plot_variables,
+        )
+
+        # Like rtc-tools-interface, only keep the rows that do not refer to goals.
+        self._plot_config = filter_plot_config(get_plot_config(self.plot_table_file), [])
+        self._plot_states = {variable: [] for variable in get_plot_variables(self._plot_config)}
+        self._collect_plot_states()
+
+    def update(self, dt):
+        super().update(dt)
+        if self._plot_states is not None:
+            self._collect_plot_states()
+
+    def _collect_plot_states(self):
+        """Append the current values of the plotted variables."""
+        for variable, values in self._plot_states.items():
+            try:
+                values.append(self.get_var(variable))
+            except KeyError:
+                logger.debug(f"Variable {variable} not found in output of model.")
+
+    def post(self):
+        super().post()
+        if self._plot_states is None:
+            return
+        timeseries_data = {}
+        for variable, values in self._plot_states.items():
+            timeseries_data[variable] = np.array(values)
+            if values:
+                continue
+            # Variables that are not states, such as input timeseries.
+            try:
+                timeseries_data[variable] = np.array(self.get_timeseries(variable))
+            except KeyError:
+                logger.warning(f"Variable {variable} not found in output of model.")
+        _plot_run(
+            output_folder=self._config.get_dir("output"),
+            plot_config=self._plot_config,
+            timeseries_data=timeseries_data,
+            io_datetimes=self.io.datetimes,
+            times=self.times(),
+            plotting_library=self.plotting_library,
+            save_plot_to=self.save_plot_to,
+            plot_max_rows=self.plot_max_rows,
+        )
@@ -2,27 +2,170 @@
 
 All the input of the reservoir model can be organised in one object.
 This makes it easier to set, validate, and analyse the input variables.
+
+The input is set at every timestep, so the input classes are light-weight records
+with ``__slots__``. Fields are validated with :py:meth:`Input.validate`,
+which only validates the fields that have changed since the last validation.
 """
 
+import copy
 from enum import Enum
-from typing import Annotated, Optional
-
-import pydantic
+from typing import Any, Callable, Dict
 
 from rtctools_simulation.reservoir._variables import InputVar
 
+MAX_DAY = 31
+
+
+def _validate_float(name: str, value: Any) -> float:
+    """Validate a float."""
+    try:
+        return float(value)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Input {name} should be a float, got {value}.") from error
+
+
+def _validate_non_negative_float(name: str, value: Any) -> float:
+    """Validate a non-negative float."""
+    value = _validate_float(name, value)
+    if not value >= 0:
+        raise ValueError(f"Input {name} should be a non-negative float, got {value}.")
+    return value
+
+
+def _validate_bool(name: str, value: Any) -> bool:
+    """Validate a boolean."""
+    if value in (True, False):
+        return bool(value)
+    raise ValueError(f"Input {name} should be a boolean, got {value}.")
+
+
+def _validate_day(name: str, value: Any) -> int:
+    """Validate a day of the month."""
+    try:
+        day = int(value)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Input {name} should be an integer, got {value}.") from error
+    if day != value:
+        raise ValueError(f"Input {name} should be an integer, got {value}.")
+    if not 1 <= day <= MAX_DAY:
+        raise ValueError(f"Input {name} should be between 1 and 31, got {value}.")
+    return day
+
+
+class _Record:
+    """
+    Base class for input records.
+
+    Subclasses define their fields with default values and validators.
+    Assigned fields are marked as changed and validated by :py:meth:`validate`.
+    """
+
+    __slots__ = ("_changed",)
+    _defaults: Dict[str, Any] = {}
+    _validators: Dict[str, Callable[[str, Any], Any]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Split the fields into values and nested records, such that resetting is fast.
+        cls._value_defaults = tuple(
+            (name, default)
+            for name, default in cls._defaults.items()
+            if not isinstance(default, type) or issubclass(default, Enum)
+        )
+        cls._record_types = tuple(
+            (name, default)
+            for name, default in cls._defaults.items()
+            if (name, default) not in cls._value_defaults
+        )
+
+    def __init__(self, **kwargs):
+        object.__setattr__(self, "_changed", set())
+        for name, record_type in self._record_types:
+            object.__setattr__(self, name, record_type())
+        self.reset()
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def __setattr__(self, name: str, value: Any):
+        object.__setattr__(self, name, value)
+        if name in self._validators:
+            self._changed.add(name)
+
+    def __deepcopy__(self, memo) -> "_Record":
+        record = type(self).__new__(type(self))
+        object.__setattr__(record, "_changed", set(self._changed))
+        for name in self._defaults:
+            object.__setattr__(record, name, copy.deepcopy(getattr(self, name), memo))
+        return record
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._defaults)
+        return f"{type(self).__name__}({fields})"
 
-class Volume(pydantic.BaseModel):
-    h_observed: pydantic.NonNegativeFloat = 0
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._defaults)
 
+    def reset(self):
+        """Reset all fields to their default values. Nested records are reset in place."""
+        for name, default in self._value_defaults:
+            object.__setattr__(self, name, default)
+        for name, _ in self._record_types:
+            getattr(self, name).reset()
+        self._changed.clear()
 
-class RainEvap(pydantic.BaseModel):
+    def validate(self):
+        """Validate the fields that have changed since the last validation."""
+        for name in self._changed:
+            object.__setattr__(self, name, self._validators[name](name, getattr(self, name)))
+        self._changed.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the fields as a dict, with nested dicts for nested records."""
+        values = {name: getattr(self, name) for name, _ in self._value_defaults}
+        for name, _ in self._record_types:
+            values[name] = getattr(self, name).to_dict()
+        return values
+
+    def load_dict(self, values: Dict[str, Any]):
+        """Set the fields from a dict as returned by :py:meth:`to_dict`."""
+        for name, _ in self._value_defaults:
+            if name in values:
+                setattr(self, name, values[name])
+        for name, _ in self._record_types:
+            if name in values:
+                getattr(self, name).load_dict(values[name])
+
+
+class Volume(_Record):
+    __slots__ = ("h_observed",)
+    _defaults = {"h_observed": 0.0}
+    _validators = {"h_observed": _validate_non_negative_float}
+
+
+class RainEvap(_Record):
     """Rain/evaporation input."""
 
-    include_evaporation: bool = False
-    include_rain: bool = False
-    mm_evaporation_per_hour: pydantic.NonNegativeFloat = 0
-    mm_rain_per_hour: pydantic.NonNegativeFloat = 0
+    __slots__ = (
+        "include_evaporation",
+        "include_rain",
+        "mm_evaporation_per_hour",
+        "mm_rain_per_hour",
+    )
+    _defaults = {
+        "include_evaporation": False,
+        "include_rain": False,
+        "mm_evaporation_per_hour": 0.0,
+        "mm_rain_per_hour": 0.0,
+    }
+    _validators = {
+        "include_evaporation": _validate_bool,
+        "include_rain": _validate_bool,
+        "mm_evaporation_per_hour": _validate_non_negative_float,
+        "mm_rain_per_hour": _validate_non_negative_float,
+    }
 
 
 class OutflowType(str, Enum):
@@ -37,41 +180,57 @@ class OutflowComponent(str, Enum):
     SLUICE = "sluice"
 
 
-class OutflowComponents(pydantic.BaseModel):
-    do_spill: bool = False
-    turbine: pydantic.NonNegativeFloat = 0
-    sluice: pydantic.NonNegativeFloat = 0
-
-
-class Outflow(pydantic.BaseModel):
-    outflow_type: OutflowType = OutflowType.COMPOSITE
-    components: Optional[OutflowComponents] = None
-    from_input: pydantic.NonNegativeFloat = 0
-    optimized: pydantic.NonNegativeFloat = 0
-
-    @pydantic.model_validator(mode="after")
-    def set_defaults(self) -> "Outflow":
-        if self.components is None or self.outflow_type != OutflowType.COMPOSITE:
-            self.components = OutflowComponents()
-        return self
-
-
-class Input(pydantic.BaseModel):
-    volume: Optional[Volume] = None
-    inflow: float = 0
-    rain_evap: Optional[RainEvap] = None
-    outflow: Optional[Outflow] = None
-    day: Annotated[int, pydantic.Field(ge=1, le=31)] = 1
-
-    @pydantic.model_validator(mode="after")
-    def set_defaults(self) -> "Input":
-        if self.volume is None:
-            self.volume = Volume()
-        if self.rain_evap is None:
-            self.rain_evap = RainEvap()
-        if self.outflow is None:
-            self.outflow = Outflow()
-        return self
+class OutflowComponents(_Record):
+    __slots__ = ("do_spill", "turbine", "sluice")
+    _defaults = {"do_spill": False, "turbine": 0.0, "sluice": 0.0}
+    _validators = {
+        "do_spill": _validate_bool,
+        "turbine": _validate_non_negative_float,
+        "sluice": _validate_non_negative_float,
+    }
+
+
+class Outflow(_Record):
+    __slots__ = ("outflow_type", "components", "from_input", "optimized")
+    _defaults = {
+        "outflow_type": OutflowType.COMPOSITE,
+        "components": OutflowComponents,
+        "from_input": 0.0,
+        "optimized": 0.0,
+    }
+    _validators = {
+        "outflow_type": lambda name, value: OutflowType(value),
+        "from_input": _validate_non_negative_float,
+        "optimized": _validate_non_negative_float,
+    }
+
+    def validate(self):
+        super().validate()
+        if self.outflow_type != OutflowType.COMPOSITE:
+            # Components are only used for composite outflow.
+            self.components.reset()
+        self.components.validate()
+
+
+class Input(_Record):
+    __slots__ = ("volume", "inflow", "rain_evap", "outflow", "day")
+    _defaults = {
+        "volume": Volume,
+        "inflow": 0.0,
+        "rain_evap": RainEvap,
+        "outflow": Outflow,
+        "day": 1,
+    }
+    _validators = {
+        "inflow": _validate_float,
+        "day": _validate_day,
+    }
+
+    def validate(self):
+        super().validate()
+        self.volume.validate()
+        self.rain_evap.validate()
+        self.outflow.validate()
 
 
 def input_to_dict(model_input: Input) -> dict[InputVar]:
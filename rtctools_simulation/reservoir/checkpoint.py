@@ -0,0 +1,140 @@
+"""
+Checkpoint module for the reservoir model.
+------------------------------------------
+
+A checkpoint contains the state of a reservoir model at one time,
+such that a later run can resume from that time instead of simulating the whole history again.
+See :py:meth:`.ReservoirModel.save_checkpoint` and the restart_checkpoint option
+of :py:class:`.ReservoirModel`.
+
+The checkpoint is stored in a NumPy archive (.npz) with
+
+- the values of the non-parameter entries of the state vector of the model and their names,
+- the input of the model at the checkpoint time,
+- the first time with a missing observed elevation, see :py:meth:`.ReservoirModel.adjust_rulecurve`,
+- the timeseries computed by schemes, for example the minimized outflow of
+  :py:meth:`.ReservoirModel.apply_minq`.
+
+All times are stored as datetimes, such that the checkpoint can be used
+by runs with a different reference time.
+"""
+
+import datetime
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+_STATE = "state"
+_VARIABLES = "variables"
+_METADATA = "__metadata__"
+_TIMESERIES = "timeseries"
+
+#: Version of the checkpoint file layout.
+CHECKPOINT_VERSION = 1
+
+
+@dataclass
+class Checkpoint:
+    """
+    State of a reservoir model at one time.
+
+    :param datetime: datetime of the state.
+    :param dt: time step (s) of the model.
+    :param variables: names of the entries of the state vector.
+    :param state: values of the variables.
+    :param model_input: input of the model, see :py:meth:`.Input.to_dict`.
+    :param first_missing_h_observed: first datetime with a missing observed elevation.
+    :param tailwater: last tailwater of :py:meth:`.ReservoirModel.find_maxq`.
+    :param qmin_end_datetime: end of the optimization window of
+        :py:meth:`.ReservoirModel.apply_minq` with a receding horizon.
+    :param timeseries: timeseries computed by schemes, as datetimes and values.
+    """
+
+    datetime: datetime.datetime
+    dt: float
+    variables: List[str]
+    state: np.ndarray
+    model_input: Dict[str, Any]
+    first_missing_h_observed: Optional[datetime.datetime] = None
+    tailwater: Optional[float] = None
+    qmin_end_datetime: Optional[datetime.datetime] = None
+    timeseries: Dict[str, Tuple[List[datetime.datetime], np.ndarray]] = field(default_factory=dict)
+
+
+def _to_isoformat(value: Optional[datetime.datetime]) -> Optional[str]:
+    return None if value is None else value.isoformat()
+
+
+def _from_isoformat(value: Optional[str]) -> Optional[datetime.datetime]:
+    return None if value is None else datetime.datetime.fromisoformat(value)
+
+
+def write_checkpoint(path: Union[str, Path], checkpoint: Checkpoint):
+    """
+    Write a checkpoint file.
+
+    :param path: path of the .npz file.
+    :param checkpoint: checkpoint to write.
+    """
+    metadata = {
+        "version": CHECKPOINT_VERSION,
+        "datetime": checkpoint.datetime.isoformat(),
+        "dt": checkpoint.dt,
+        "model_input": checkpoint.model_input,
+        "first_missing_h_observed": _to_isoformat(checkpoint.first_missing_h_observed),
+        "tailwater": checkpoint.tailwater,
+        "qmin_end_datetime": _to_isoformat(checkpoint.qmin_end_datetime),
+        "timeseries": list(checkpoint.timeseries),
+    }
+    arrays = {
+        _METADATA: np.array(json.dumps(metadata)),
+        _STATE: np.asarray(checkpoint.state, dtype=float),
+        _VARIABLES: np.array(checkpoint.variables, dtype=str),
+    }
+    for name, (times, values) in checkpoint.timeseries.items():
+        arrays[f"{_TIMESERIES}/{name}/time"] = np.array(times, dtype="datetime64[us]")
+        arrays[f"{_TIMESERIES}/{name}/values"] = np.asarray(values, dtype=float)
+    # Write to a temporary file first, such that a checkpoint is never incomplete.
+    # Writing to a file object also keeps np.savez from changing the extension.
+    path = Path(path)
+    fd, tmp_file = tempfile.mkstemp(dir=path.parent, suffix=".npz")
+    with os.fdopen(fd, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(tmp_file, path)
+
+
+def read_checkpoint(path: Union[str, Path]) -> Checkpoint:
+    """
+    Read a checkpoint file.
+
+    :param path: path of the .npz file.
+
+    :returns: the checkpoint.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        metadata = json.loads(data[_METADATA].item())
+        if metadata.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Checkpoint {path} has an unsupported version.")
+        timeseries = {
+            name: (
+                data[f"{_TIMESERIES}/{name}/time"].astype("datetime64[us]").tolist(),
+                data[f"{_TIMESERIES}/{name}/values"],
+            )
+            for name in metadata["timeseries"]
+        }
+        return Checkpoint(
+            datetime=datetime.datetime.fromisoformat(metadata["datetime"]),
+            dt=metadata["dt"],
+            variables=data[_VARIABLES].tolist(),
+            state=data[_STATE],
+            model_input=metadata["model_input"],
+            first_missing_h_observed=_from_isoformat(metadata["first_missing_h_observed"]),
+            tailwater=metadata["tailwater"],
+            qmin_end_datetime=_from_isoformat(metadata["qmin_end_datetime"]),
+            timeseries=timeseries,
+        )
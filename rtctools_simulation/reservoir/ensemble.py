@@ -0,0 +1,254 @@
+"""
+Ensemble module for the reservoir model.
+----------------------------------------
+
+Simulate multiple inflow scenarios (ensemble members) of a reservoir model in lock-step.
+All members share one compiled model and one set of lookup tables.
+Each member has its own timeseries, parameters and scheme state,
+such that the result of a member does not depend on the other members.
+At each timestep, the schemes are applied for each member,
+after which all members are advanced in one vectorized call of
+:py:class:`~rtctools_simulation.reservoir.fast_engine.ReservoirEngine`.
+"""
+
+import bisect
+import copy
+import logging
+from math import isfinite
+from typing import Dict, Type
+
+import numpy as np
+from rtctools.data.storage import DataStore
+
+from rtctools_simulation.reservoir._variables import InputVar, OutputVar
+from rtctools_simulation.reservoir.model import HeadlessReservoirModel
+
+logger = logging.getLogger("rtctools")
+
+#: Attributes that all members share and that schemes do not modify,
+#: such as the compiled model, the config and the lookup tables.
+#: All other attributes, including any state that schemes keep on the model,
+#: are kept for each member separately.
+_SHARED_ATTRIBUTES = (
+    "io",
+    "_config",
+    "_engine",
+    "_engine_name",
+    "_lookup_tables",
+    "_numpy_lookup_tables",
+    "_var_indices",
+    "_input_folder",
+    "_output_folder",
+    "_simulation_times",
+    "timeseries_format",
+    "plot_table_file",
+)
+#: Prefixes of the private and cached attributes of rtc-tools, which are shared by all members.
+#: The states and inputs in the state vector are set for each member at each timestep.
+_SHARED_PREFIXES = ("_SimulationProblem__", "_IOMixin__", "_PIMixin__", "_CSVMixin__", "__")
+
+
+def run_ensemble(
+    model_class: Type[HeadlessReservoirModel],
+    inflows: np.ndarray,
+    write_output: bool = False,
+    **kwargs,
+) -> Dict[str, np.ndarray]:
+    """
+    Create a reservoir model and simulate an ensemble of inflows.
+
+    :param model_class: reservoir model class.
+    :param inflows: array of inflows (m^3/s) with shape (n_members, n_times).
+    :param write_output: if True, write the results of all members to one output file.
+    :param kwargs: keyword arguments to create the model, for example ``config``.
+
+    :returns: dict of output variables and their values as arrays
+        with shape (n_members, n_times).
+    """
+    model = model_class(**kwargs)
+    return simulate_ensemble(model, inflows, write_output)
+
+
+def simulate_ensemble(
+    model: HeadlessReservoirModel, inflows: np.ndarray, write_output: bool = False
+) -> Dict[str, np.ndarray]:
+    """
+    Simulate an ensemble of inflows with a given reservoir model.
+
+    The inflow of each member replaces the input variable ``Q_in``
+    and the values of the timeseries ``Q_in`` at the times of the model.
+    Each member has its own copy of the timeseries and parameters
+    and of the state that schemes keep on the model, such as the input,
+    the tailwater of :py:meth:`.ReservoirModel.find_maxq`
+    and the optimized outflow of :py:meth:`.ReservoirModel.apply_minq`.
+    The schemes of each member therefore behave as in a single simulation of that member,
+    provided that the state that a scheme keeps on the model is set in ``__init__``,
+    as is done for the schemes of :py:class:`.ReservoirModel`.
+    Only the compiled model, the config and the lookup tables are shared by all members.
+    Postprocessing (:py:meth:`.ReservoirModel.post`) is not done for ensembles.
+    Instead, the results of all members can be written to one output file
+    with a member dimension, in the timeseries format of the model config
+    (see :py:meth:`.ColumnarIOMixin.write_ensemble`).
+
+    .. note:: Ensembles can only be simulated for the default reservoir model.
+
+    :param model: reservoir model that has not been simulated yet.
+    :param inflows: array of inflows (m^3/s) with shape (n_members, n_times).
+    :param write_output: if True, write the results of all members to one output file.
+
+    :returns: dict of output variables and their values as arrays
+        with shape (n_members, n_times).
+    """
+    inflows = np.atleast_2d(np.asarray(inflows, dtype=float))
+    model.pre()
+    times = np.array(model.times())
+    n_members, n_times = inflows.shape
+    if n_times != len(times):
+        raise ValueError(f"Inflows have {n_times} times, but the model has {len(times)} times.")
+    # Initializing the model applies the schemes at the start time,
+    # which is done for each member instead.
+    attributes = copy.deepcopy(_member_attributes(model))
+    model.initialize()
+    engine = model._create_engine()
+    input_vars = engine.input_variables
+    output_vars = list(model.get_output_variables())
+    results = {var: np.full((n_members, n_times), np.nan) for var in output_vars}
+    io = model.io
+    io_times = io.times_sec
+    members = [
+        _MemberState(model, inflows[member], times, attributes) for member in range(n_members)
+    ]
+
+    def apply_schemes(t_idx: int, members_state: Dict[str, np.ndarray]):
+        """Apply the schemes for each member and return the stacked inputs."""
+        io_idx = bisect.bisect_left(io_times, times[t_idx])
+        inputs = {var: np.zeros(n_members) for var in input_vars}
+        for member, member_state in enumerate(members):
+            member_state.activate(model)
+            for var, values in members_state.items():
+                model.set_var(var, values[member])
+            for var, values in _get_input_timeseries(model).items():
+                value = values[io_idx]
+                if isfinite(value):
+                    model.set_var(var, value)
+            model.set_var(InputVar.Q_IN.value, inflows[member, t_idx])
+            model.set_input_variables()
+            for var in input_vars:
+                inputs[var][member] = model.get_var(var)
+            member_state.deactivate(model)
+        return inputs
+
+    # Initial state.
+    initial_state = {var: np.full(n_members, model.get_var(var)) for var in _state_vars(model)}
+    inputs = apply_schemes(0, initial_state)
+    members_state = engine.evaluate(initial_state[OutputVar.VOLUME.value], inputs)
+    _store_results(results, 0, members_state, inputs)
+
+    # Timesteps.
+    dt = model.get_time_step()
+    for t_idx in range(1, n_times):
+        model.set_var("time", times[t_idx])
+        inputs = apply_schemes(t_idx, members_state)
+        volume = members_state[OutputVar.VOLUME.value]
+        members_state = engine.step(volume, inputs, dt)
+        _store_results(results, t_idx, members_state, inputs)
+    model.io = io
+    if write_output:
+        model.write_ensemble(results)
+    return results
+
+
+class _MemberState:
+    """Timeseries, parameters and scheme state of one ensemble member."""
+
+    def __init__(
+        self,
+        model: HeadlessReservoirModel,
+        inflow: np.ndarray,
+        times: np.ndarray,
+        attributes: Dict[str, object],
+    ):
+        """
+        Copy the timeseries, parameters and scheme state of a model that has been initialized.
+
+        :param model: reservoir model.
+        :param inflow: inflow of the member at the given times.
+        :param times: times (s) of the model.
+        :param attributes: attributes of the model before it was initialized,
+            which replace the values of these attributes after initializing the model.
+        """
+        self.io = _copy_data_store(model.io, model)
+        q_in = InputVar.Q_IN.value
+        io_times = self.io.times_sec
+        if q_in in self.io.get_timeseries_names():
+            _, values = self.io.get_timeseries_sec(q_in)
+        else:
+            values = np.full(len(io_times), np.nan)
+        values[np.searchsorted(io_times, times)] = inflow
+        self.io.set_timeseries_sec(q_in, io_times, values)
+        self.attributes = copy.deepcopy({**_member_attributes(model), **attributes})
+
+    def activate(self, model: HeadlessReservoirModel):
+        """Set the timeseries, parameters and scheme state of the member on the model."""
+        model.io = self.io
+        for name in _member_attributes(model):
+            if name not in self.attributes:
+                delattr(model, name)
+        for name, value in self.attributes.items():
+            setattr(model, name, value)
+
+    def deactivate(self, model: HeadlessReservoirModel):
+        """Store the scheme state of the member after its schemes have been applied."""
+        self.attributes = _member_attributes(model)
+
+
+def _is_shared(name: str) -> bool:
+    """Check if an attribute of the model is shared by all members."""
+    return name in _SHARED_ATTRIBUTES or name.startswith(_SHARED_PREFIXES)
+
+
+def _member_attributes(model: HeadlessReservoirModel) -> Dict[str, object]:
+    """Get the attributes of the model that are kept for each member separately."""
+    return {name: value for name, value in vars(model).items() if not _is_shared(name)}
+
+
+def _copy_data_store(io: DataStore, model: HeadlessReservoirModel) -> DataStore:
+    """Copy the timeseries and parameters of a data store."""
+    io_copy = DataStore(model)
+    io_copy.reference_datetime = io.reference_datetime
+    for name in io.get_timeseries_names():
+        _, values = io.get_timeseries(name)
+        io_copy.set_timeseries(name, io.datetimes, np.array(values, dtype=float))
+    for name, value in io.parameters().items():
+        io_copy.set_parameter(name, value)
+    return io_copy
+
+
+def _state_vars(model: HeadlessReservoirModel):
+    """Get the names of the states and algebraic variables of the model."""
+    return list(model.get_state_variables().keys())
+
+
+def _get_input_timeseries(model: HeadlessReservoirModel) -> Dict[str, np.ndarray]:
+    """Get the timeseries of the model input variables."""
+    timeseries_names = set(model.io.get_timeseries_names())
+    input_timeseries = {}
+    for var in model.get_input_variables():
+        if var in timeseries_names:
+            _, values = model.io.get_timeseries_sec(var)
+            input_timeseries[var] = values
+    return input_timeseries
+
+
+def _store_results(
+    results: Dict[str, np.ndarray],
+    t_idx: int,
+    state: Dict[str, np.ndarray],
+    inputs: Dict[str, np.ndarray],
+):
+    """Store the state and inputs at a given time index in the results."""
+    for var, values in results.items():
+        if var in state:
+            values[:, t_idx] = state[var]
+        elif var in inputs:
+            values[:, t_idx] = inputs[var]
@@ -0,0 +1,378 @@
+"""
+Fast engine module for the reservoir model.
+-------------------------------------------
+
+The fast engine computes timesteps of the default reservoir model
+(see :ref:`single-reservoir-model`) directly with NumPy,
+instead of solving the DAE of the model with the rootfinder of rtc-tools.
+The fluxes are solved symbolically from the DAE residual of the compiled model,
+so the engine follows the equations of the Modelica model.
+"""
+
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Set, Tuple, Union
+
+import casadi as ca
+import numpy as np
+
+import rtctools_simulation.lookup_table as lut
+from rtctools_simulation.reservoir._variables import InputVar, OutputVar
+
+logger = logging.getLogger("rtctools")
+
+#: Name of the volume derivative in the state vector.
+DER_VOLUME = "der(V)"
+
+ArrayLike = Union[float, np.ndarray]
+LookupTable = Union[ca.Function, lut.NumpyLookupTable]
+
+# NumPy expressions of the CasADi operations that are supported by _to_numpy_function.
+_NUMPY_OPERATIONS = {
+    ca.OP_ASSIGN: "{0}",
+    ca.OP_ADD: "{0} + {1}",
+    ca.OP_SUB: "{0} - {1}",
+    ca.OP_MUL: "{0} * {1}",
+    ca.OP_DIV: "{0} / {1}",
+    ca.OP_NEG: "-{0}",
+    ca.OP_SQ: "{0} * {0}",
+    ca.OP_POW: "{0} ** {1}",
+    ca.OP_SQRT: "np.sqrt({0})",
+    ca.OP_EXP: "np.exp({0})",
+    ca.OP_LOG: "np.log({0})",
+    ca.OP_FABS: "np.abs({0})",
+    ca.OP_FMIN: "np.minimum({0}, {1})",
+    ca.OP_FMAX: "np.maximum({0}, {1})",
+    ca.OP_LT: "1.0 * ({0} < {1})",
+    ca.OP_LE: "1.0 * ({0} <= {1})",
+    ca.OP_EQ: "1.0 * ({0} == {1})",
+    ca.OP_NE: "1.0 * ({0} != {1})",
+    ca.OP_NOT: "1.0 * ({0} == 0)",
+    ca.OP_AND: "1.0 * (({0} != 0) & ({1} != 0))",
+    ca.OP_OR: "1.0 * (({0} != 0) | ({1} != 0))",
+    ca.OP_IF_ELSE_ZERO: "np.where({0} != 0, {1}, 0.0)",
+}
+
+
+def _to_numpy_function(function: ca.Function) -> Callable[..., Tuple[ArrayLike, ...]]:
+    """
+    Convert a CasADi function of scalars to a Python function of NumPy arrays.
+
+    The instructions of the (expanded) function are translated to NumPy expressions,
+    which avoids the overhead of calling CasADi for each evaluation.
+    """
+    function = function.expand()
+    lines = []
+    outputs = ["0.0"] * function.n_out()
+    for k in range(function.n_instructions()):
+        op = function.instruction_id(k)
+        args = function.instruction_input(k)
+        results = function.instruction_output(k)
+        if op == ca.OP_INPUT:
+            lines.append(f"w{results[0]} = x{args[0]}")
+        elif op == ca.OP_OUTPUT:
+            # Work variables are reused, so the output is assigned immediately.
+            lines.append(f"y{results[0]} = w{args[0]}")
+            outputs[results[0]] = f"y{results[0]}"
+        elif op == ca.OP_CONST:
+            lines.append(f"w{results[0]} = {function.instruction_constant(k)!r}")
+        elif op in _NUMPY_OPERATIONS:
+            expression = _NUMPY_OPERATIONS[op].format(*[f"w{arg}" for arg in args])
+            lines.append(f"w{results[0]} = {expression}")
+        else:
+            raise ValueError(f"CasADi operation {op} is not supported by the fast engine.")
+    arguments = ", ".join(f"x{i}" for i in range(function.n_in()))
+    body = "".join(f"    {line}\n" for line in lines)
+    source = f"def {function.name()}({arguments}):\n{body}    return ({', '.join(outputs)},)\n"
+    namespace = {"np": np}
+    exec(source, namespace)
+    return namespace[function.name()]
+
+
+class ReservoirEngine:
+    """
+    Class for computing timesteps of the default reservoir model with NumPy.
+
+    The engine evaluates the relations of ``lookup_table_equations.csv``
+    and the equations of the model, such as the mass balance
+
+        der(V) = Q_in - Q_out + Q_rain - Q_evap
+
+    The equations are given by the DAE residual of the model (without lookup tables),
+    and are solved explicitly for the derivative and the remaining variables (the fluxes).
+    A timestep is first predicted with an explicit Euler step.
+    If ``implicit`` is True, the prediction is corrected with Newton iterations
+    such that the result satisfies the backward Euler scheme used by rtc-tools.
+    Missing lookup tables return zero, like the empty lookup tables of the DAE.
+
+    All computations are array based, so that multiple reservoir states
+    can be advanced in a single call.
+    """
+
+    def __init__(
+        self,
+        lookup_tables: Dict[str, LookupTable],
+        relations: List[Tuple[str, List[str], str]],
+        dae_residual: ca.Function,
+        implicit: bool = True,
+        max_iterations: int = 50,
+        tolerance: float = 1e-10,
+    ):
+        """
+        Initialize the engine.
+
+        :param lookup_tables: dict of lookup tables,
+            either CasADi functions or :class:`~rtctools_simulation.lookup_table.NumpyLookupTable`.
+        :param relations: list of lookup-table relations (lookup_table, var_in, var_out),
+            see :func:`rtctools_simulation.lookup_table.get_lookup_table_relations_from_csv`.
+        :param dae_residual: DAE residual of the model with a named input for each variable,
+            see :py:meth:`rtctools_simulation.model.HeadlessModel.get_dae_residual_function`.
+        :param implicit: if True, correct the explicit Euler step with Newton iterations.
+        :param max_iterations: maximum number of Newton iterations.
+        :param tolerance: relative tolerance of the mass balance residual.
+        """
+        self._lookup_tables = lookup_tables
+        # CasADi lookup tables are mapped over arrays of a given size.
+        self._mapped_lookup_tables: Dict[Tuple[str, int], ca.Function] = {}
+        self.implicit = implicit
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self._input_relations, self._state_relations = self._sort_relations(relations)
+        known = set(self.input_variables) | {var_out for _, _, var_out in relations}
+        known.add(OutputVar.VOLUME.value)
+        fluxes = self._solve_fluxes(dae_residual, known)
+        self._flux_inputs = fluxes.name_in()
+        self._flux_outputs = fluxes.name_out()
+        self._fluxes = _to_numpy_function(fluxes)
+
+    @classmethod
+    def from_csv(
+        cls,
+        lookup_tables: Dict[str, LookupTable],
+        equations_csv: Path,
+        **kwargs,
+    ) -> "ReservoirEngine":
+        """Create an engine from a lookup_table_equations.csv file."""
+        relations = lut.get_lookup_table_relations_from_csv(equations_csv)
+        return cls(lookup_tables, relations, **kwargs)
+
+    @property
+    def input_variables(self) -> List[str]:
+        """List of input variables that are required for computing a timestep."""
+        return [var.value for var in InputVar]
+
+    @staticmethod
+    def _sort_relations(relations):
+        """
+        Sort relations in order of evaluation.
+
+        Relations that only depend on inputs are separated from relations that
+        (indirectly) depend on the volume, since only the latter need to be reevaluated
+        when iterating on the volume.
+        """
+        known = {var.value for var in InputVar}
+        input_relations = []
+        state_relations = []
+        volume_dependent = {OutputVar.VOLUME.value}
+        remaining = list(relations)
+        known.add(OutputVar.VOLUME.value)
+        while remaining:
+            ready = [rel for rel in remaining if all(var in known for var in rel[1])]
+            if not ready:
+                missing = {var for rel in remaining for var in rel[1] if var not in known}
+                raise ValueError(f"Lookup table relations depend on unknown variables {missing}.")
+            for relation in ready:
+                _, var_in, var_out = relation
+                if any(var in volume_dependent for var in var_in):
+                    volume_dependent.add(var_out)
+                    state_relations.append(relation)
+                else:
+                    input_relations.append(relation)
+                known.add(var_out)
+                remaining.remove(relation)
+        return input_relations, state_relations
+
+    def _evaluate_lookup_table(self, name: str, args: List[np.ndarray], size: int) -> np.ndarray:
+        """Evaluate a lookup table for arrays of input values."""
+        lookup_table = self._lookup_tables.get(name)
+        if lookup_table is None:
+            return np.zeros(size)
+        if isinstance(lookup_table, lut.NumpyLookupTable):
+            return np.broadcast_to(lookup_table(*args), (size,))
+        if size == 1:
+            return np.array([float(lookup_table(*[float(arg[0]) for arg in args]))])
+        key = (name, size)
+        if key not in self._mapped_lookup_tables:
+            self._mapped_lookup_tables[key] = lookup_table.map(size)
+        mapped_lookup_table = self._mapped_lookup_tables[key]
+        values = mapped_lookup_table(*[arg.reshape(1, size) for arg in args])
+        return np.array(values).ravel()
+
+    def _evaluate_relations(self, relations, values: Dict[str, np.ndarray], size: int):
+        """Evaluate relations and add the results to values."""
+        for name, var_in, var_out in relations:
+            args = [values[var] for var in var_in]
+            values[var_out] = self._evaluate_lookup_table(name, args, size)
+
+    @staticmethod
+    def _solve_fluxes(dae_residual: ca.Function, known: Set[str]) -> ca.Function:
+        """
+        Solve the DAE residual for the fluxes.
+
+        The fluxes are the variables of the residual that are not known,
+        including the derivative of the volume.
+        Each equation should be linear in a single flux, given the fluxes solved before.
+
+        :returns: function from the known variables to the fluxes.
+        """
+        dae_residual = dae_residual.expand()
+        symbols = dict(zip(dae_residual.name_in(), dae_residual.sx_in()))
+        residual = dae_residual.call(list(symbols.values()))[0]
+        fluxes = {
+            name: symbol
+            for name, symbol in symbols.items()
+            if name not in known and ca.depends_on(residual, symbol)
+        }
+        # Solve the equations one by one, each for a single remaining flux.
+        # Substituting the solved fluxes shares their expressions instead of copying them.
+        remaining = dict(fluxes)
+        solved: Dict[str, ca.SX] = {}
+        equations = ca.vertsplit(residual)
+        while remaining:
+            for i, equation in enumerate(equations):
+                unknowns = [name for name in remaining if ca.depends_on(equation, remaining[name])]
+                if len(unknowns) != 1:
+                    continue
+                symbol = remaining.pop(unknowns[0])
+                coefficient = ca.jacobian(equation, symbol)
+                if ca.depends_on(coefficient, symbol):
+                    raise ValueError(f"The model equation for {unknowns[0]} is not linear.")
+                expression = -ca.substitute(equation, symbol, ca.SX(0)) / coefficient
+                solved[unknowns[0]] = ca.substitute(
+                    [expression],
+                    [fluxes[name] for name in solved],
+                    list(solved.values()),
+                )[0]
+                del equations[i]
+                break
+            else:
+                raise ValueError(
+                    f"The model equations cannot be solved for {list(remaining)} one by one."
+                )
+        solution = ca.vertcat(*[solved[name] for name in fluxes])
+        inputs = {
+            name: symbol
+            for name, symbol in symbols.items()
+            if name not in fluxes and ca.depends_on(solution, symbol)
+        }
+        unknown = set(inputs) - known
+        if unknown:
+            raise ValueError(f"The model equations depend on unknown variables {unknown}.")
+        return ca.Function(
+            "fluxes",
+            list(inputs.values()),
+            ca.vertsplit(solution),
+            list(inputs),
+            list(fluxes),
+        )
+
+    def _evaluate_fluxes(self, values: Dict[str, np.ndarray], size: int):
+        """Compute the fluxes of the reservoir model and add them to values."""
+        fluxes = self._fluxes(*[values[var] for var in self._flux_inputs])
+        for var, flux in zip(self._flux_outputs, fluxes):
+            values[var] = flux if np.ndim(flux) else np.full(size, flux)
+
+    def _evaluate_state(self, volume: np.ndarray, inputs: Dict[str, np.ndarray]):
+        """Evaluate all variables for a given volume."""
+        values = dict(inputs)
+        values[OutputVar.VOLUME.value] = volume
+        self._evaluate_relations(self._state_relations, values, len(volume))
+        self._evaluate_fluxes(values, len(volume))
+        return values
+
+    @staticmethod
+    def _net_inflow(values: Dict[str, np.ndarray]) -> np.ndarray:
+        """Get the net inflow of the reservoir."""
+        return values[DER_VOLUME]
+
+    def step(
+        self,
+        volume: ArrayLike,
+        inputs: Dict[str, ArrayLike],
+        dt: float,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Compute a timestep.
+
+        :param volume: volume(s) at the previous time.
+        :param inputs: dict of input values at the new time.
+            Values can be scalars or arrays with the same size as volume.
+        :param dt: timestep size (s).
+
+        :returns: dict of state variables and their values at the new time.
+            Each value is an array with the same size as volume.
+        """
+        volume_prev = np.atleast_1d(np.asarray(volume, dtype=float))
+        values = self._get_input_values(inputs, len(volume_prev))
+        # Explicit Euler prediction.
+        state = self._evaluate_state(volume_prev, values)
+        volume_new = volume_prev + dt * self._net_inflow(state)
+        state = self._evaluate_state(volume_new, values)
+        if self.implicit:
+            volume_new, state = self._correct(volume_prev, volume_new, state, values, dt)
+        state[DER_VOLUME] = (volume_new - volume_prev) / dt
+        return self._get_state_values(state)
+
+    def evaluate(self, volume: ArrayLike, inputs: Dict[str, ArrayLike]) -> Dict[str, np.ndarray]:
+        """
+        Evaluate the state variables for given volume(s) without taking a timestep.
+
+        :param volume: volume(s).
+        :param inputs: dict of input values, see :py:meth:`step`.
+
+        :returns: dict of state variables and their values.
+        """
+        volume = np.atleast_1d(np.asarray(volume, dtype=float))
+        values = self._get_input_values(inputs, len(volume))
+        state = self._evaluate_state(volume, values)
+        state[DER_VOLUME] = self._net_inflow(state)
+        return self._get_state_values(state)
+
+    def _get_input_values(self, inputs: Dict[str, ArrayLike], size: int):
+        """Get a dict of input arrays and the values of relations that only depend on inputs."""
+        values = {
+            var: np.broadcast_to(np.asarray(inputs[var], dtype=float), (size,))
+            for var in self.input_variables
+        }
+        self._evaluate_relations(self._input_relations, values, size)
+        return values
+
+    def _get_state_values(self, values: Dict[str, np.ndarray]):
+        """Get the values of the state variables, excluding the input variables."""
+        input_variables = set(self.input_variables)
+        return {var: value for var, value in values.items() if var not in input_variables}
+
+    def _correct(self, volume_prev, volume, state, inputs, dt):
+        """Correct a volume prediction with Newton iterations on the backward Euler residual."""
+        residual = volume - volume_prev - dt * self._net_inflow(state)
+        for _ in range(self.max_iterations):
+            scale = np.maximum(np.abs(volume), 1.0)
+            if np.all(np.abs(residual) <= self.tolerance * scale):
+                break
+            step_size = 1e-7 * scale
+            state_perturbed = self._evaluate_state(volume + step_size, inputs)
+            residual_perturbed = (
+                volume + step_size - volume_prev - dt * self._net_inflow(state_perturbed)
+            )
+            derivative = (residual_perturbed - residual) / step_size
+            # The residual is increasing in the volume for non-decreasing outflow relations.
+            derivative = np.where(derivative > 0, derivative, 1.0)
+            volume = volume - residual / derivative
+            state = self._evaluate_state(volume, inputs)
+            residual = volume - volume_prev - dt * self._net_inflow(state)
+        else:
+            logger.warning(
+                f"Fast engine did not converge within {self.max_iterations} iterations. "
+                f"Maximum residual is {np.max(np.abs(residual))}."
+            )
+        return volume, state
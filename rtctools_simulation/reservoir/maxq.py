@@ -0,0 +1,234 @@
+"""
+Maximum discharge module for the reservoir model.
+-------------------------------------------------
+
+Helpers for :py:meth:`.ReservoirModel.find_maxq`.
+"""
+
+import bisect
+import logging
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+from rtctools_simulation.lookup_table import NumpyLookupTable
+
+logger = logging.getLogger("rtctools")
+
+
+class _PiecewiseLinear:
+    """Scalar evaluation of a 1-D lookup table with linear extrapolation."""
+
+    def __init__(self, lookup_table: NumpyLookupTable):
+        if lookup_table.n_in() != 1:
+            raise ValueError(
+                f"Lookup table {lookup_table.name} should have a single input variable,"
+                f" got {lookup_table.vars_in}."
+            )
+        self.coordinates: List[float] = lookup_table.coordinates[0].tolist()
+        self.values: List[float] = lookup_table(lookup_table.coordinates[0]).tolist()
+        self.slopes: List[float] = [
+            (v_upper - v_lower) / (x_upper - x_lower)
+            for x_lower, x_upper, v_lower, v_upper in zip(
+                self.coordinates[:-1], self.coordinates[1:], self.values[:-1], self.values[1:]
+            )
+        ]
+        self._last_segment = len(self.slopes) - 1
+
+    def segment(self, x: float) -> int:
+        """Get the index of the segment that is used to evaluate x."""
+        i = bisect.bisect_right(self.coordinates, x) - 1
+        return min(max(i, 0), self._last_segment)
+
+    def __call__(self, x: float) -> float:
+        i = self.segment(x)
+        return self.values[i] + self.slopes[i] * (x - self.coordinates[i])
+
+
+class TailwaterSolver:
+    """
+    Solver for the tailwater elevation at maximum discharge.
+
+    The tailwater elevation tw is the root of
+
+        f(tw) = qnotspill_from_dh(h - tw) + qspill_from_h(h) - qtw_from_tw(tw),
+
+    i.e. the non-spillway and spillway discharge are equal to the downstream discharge.
+    Since the lookup tables are piecewise linear, f is linear on each pair of segments
+    (i, j) of qnotspill_from_dh and qtw_from_tw, and the root on such a pair is computed
+    exactly with a closed-form expression.
+
+    Starting from an initial guess, such as the tailwater elevation of the previous timestep,
+    the solver takes Newton steps until the root lies on the segments that were used to compute it.
+    This typically takes one or two steps. If the Newton steps do not converge,
+    all segments are scanned and the root closest to the initial guess is used.
+    Since the root is always computed with the same expression for a given pair of segments,
+    the result does not depend on the initial guess, unless there are multiple roots.
+    """
+
+    def __init__(
+        self,
+        qspill_from_h: NumpyLookupTable,
+        qnotspill_from_dh: NumpyLookupTable,
+        qtw_from_tw: NumpyLookupTable,
+    ):
+        """
+        Initialize the solver.
+
+        :param qspill_from_h: spillway discharge as function of reservoir elevation.
+        :param qnotspill_from_dh: maximum non-spillway discharge as function of head difference.
+        :param qtw_from_tw: downstream discharge as function of tailwater elevation.
+        """
+        self._qspill_from_h = _PiecewiseLinear(qspill_from_h)
+        self._qnotspill_from_dh = _PiecewiseLinear(qnotspill_from_dh)
+        self._qtw_from_tw = _PiecewiseLinear(qtw_from_tw)
+        self._max_newton_steps = len(self._qnotspill_from_dh.slopes) + len(self._qtw_from_tw.slopes)
+
+    def solve(self, h: float, tw_guess: float) -> Tuple[float, float]:
+        """
+        Solve the tailwater elevation and the corresponding maximum discharge.
+
+        :param h: reservoir elevation.
+        :param tw_guess: initial guess of the tailwater elevation.
+        :returns: tailwater elevation and downstream discharge at that elevation.
+        """
+        q_spill = self._qspill_from_h(h)
+        tw = self._solve_newton(h, q_spill, tw_guess)
+        if tw is None:
+            tw = self._solve_scan(h, q_spill, tw_guess)
+        return tw, self._qtw_from_tw(tw)
+
+    def _segment_root(self, h: float, q_spill: float, i: int, j: int) -> float:
+        """
+        Get the root of f on segment i of qnotspill_from_dh and segment j of qtw_from_tw.
+
+        Returns nan if f has a constant nonzero value on these segments.
+        """
+        dh_table, tw_table = self._qnotspill_from_dh, self._qtw_from_tw
+        numerator = (
+            dh_table.values[i]
+            + dh_table.slopes[i] * (h - dh_table.coordinates[i])
+            + q_spill
+            - tw_table.values[j]
+            + tw_table.slopes[j] * tw_table.coordinates[j]
+        )
+        denominator = dh_table.slopes[i] + tw_table.slopes[j]
+        if denominator == 0:
+            return float("nan")
+        return numerator / denominator
+
+    def _segments(self, h: float, tw: float) -> Tuple[int, int]:
+        """Get the segments of both lookup tables that are used at a given tailwater."""
+        return self._qnotspill_from_dh.segment(h - tw), self._qtw_from_tw.segment(tw)
+
+    def _solve_newton(self, h: float, q_spill: float, tw_guess: float):
+        """Solve with Newton steps, return None if the steps do not converge."""
+        segments = self._segments(h, tw_guess)
+        for _ in range(self._max_newton_steps):
+            tw = self._segment_root(h, q_spill, *segments)
+            if math.isnan(tw):
+                return None
+            new_segments = self._segments(h, tw)
+            if new_segments == segments:
+                return tw
+            segments = new_segments
+        return None
+
+    def _solve_scan(self, h: float, q_spill: float, tw_guess: float) -> float:
+        """Solve by scanning all segments, return the root closest to the guess."""
+        breakpoints = sorted(
+            set(self._qtw_from_tw.coordinates)
+            | {h - dh for dh in self._qnotspill_from_dh.coordinates}
+        )
+        bounds = [-float("inf"), *breakpoints, float("inf")]
+        roots = []
+        for lower, upper in zip(bounds[:-1], bounds[1:]):
+            # Any point inside the interval determines its segments.
+            if lower == -float("inf"):
+                tw_inner = upper - 1
+            elif upper == float("inf"):
+                tw_inner = lower + 1
+            else:
+                tw_inner = 0.5 * (lower + upper)
+            i, j = self._segments(h, tw_inner)
+            root = self._segment_root(h, q_spill, i, j)
+            if lower <= root <= upper:
+                roots.append(root)
+            elif math.isnan(root) and self._residual(h, q_spill, tw_inner) == 0:
+                # f is zero on the whole interval.
+                roots.append(min(max(tw_guess, lower), upper))
+        if not roots:
+            tw = min(breakpoints, key=lambda tw: abs(self._residual(h, q_spill, tw)))
+            logger.warning(
+                f"Tailwater solver did not find a root for h={h}."
+                f" Using the tailwater {tw} with the smallest residual."
+            )
+            return tw
+        return min(roots, key=lambda root: abs(root - tw_guess))
+
+    def _residual(self, h: float, q_spill: float, tw: float) -> float:
+        """Compute the difference between the upstream and downstream discharge."""
+        return self._qnotspill_from_dh(h - tw) + q_spill - self._qtw_from_tw(tw)
+
+
+class MaxQCurve:
+    """
+    Precomputed curve of the maximum discharge as function of the reservoir elevation.
+
+    The curve is computed on a regular elevation grid with the exact
+    :py:class:`TailwaterSolver` and is evaluated by linear interpolation.
+    The interpolation error is estimated by comparing the curve with the exact solver
+    at a few points inside each grid interval.
+    """
+
+    #: Number of points inside each grid interval at which the interpolation error is estimated.
+    n_check_points = 4
+
+    def __init__(self, solver: TailwaterSolver, h_min: float, h_max: float, h_step: float):
+        """
+        Compute the curve.
+
+        :param solver: solver for the exact maximum discharge.
+        :param h_min: minimum reservoir elevation of the curve.
+        :param h_max: maximum reservoir elevation of the curve.
+        :param h_step: maximum grid spacing of the curve.
+            A smaller spacing gives a smaller interpolation error.
+        """
+        if not h_step > 0:
+            raise ValueError(f"The grid spacing should be positive, got {h_step}.")
+        if not h_max > h_min:
+            raise ValueError(f"The elevation range [{h_min}, {h_max}] is empty.")
+        n_points = math.ceil((h_max - h_min) / h_step) + 1
+        self.h = np.linspace(h_min, h_max, n_points)
+        self.qmax = self._solve(solver, self.h)
+        fractions = np.arange(1, self.n_check_points + 1) / (self.n_check_points + 1)
+        h_check = (self.h[:-1, None] + np.diff(self.h)[:, None] * fractions).ravel()
+        errors = np.abs(np.interp(h_check, self.h, self.qmax) - self._solve(solver, h_check))
+        #: Estimated maximum interpolation error of the curve with respect to the exact solver.
+        self.max_error = float(np.max(errors))
+        self._h_min = float(h_min)
+        self._h_max = float(h_max)
+        self._h_step = float(self.h[1] - self.h[0])
+        self._qmax = self.qmax.tolist()
+
+    @staticmethod
+    def _solve(solver: TailwaterSolver, h: np.ndarray) -> np.ndarray:
+        """Compute the exact maximum discharge, warm-started from the previous elevation."""
+        qmax = np.empty(len(h))
+        tw = h[0]
+        for i, h_i in enumerate(h):
+            tw, qmax[i] = solver.solve(h_i, tw)
+        return qmax
+
+    def contains(self, h: float) -> bool:
+        """Check if a reservoir elevation is within the range of the curve."""
+        return self._h_min <= h <= self._h_max
+
+    def __call__(self, h: float) -> float:
+        """
+        Interpolate the maximum discharge at a reservoir elevation within the range of the curve.
+        """
+        i = min(int((h - self._h_min) / self._h_step), len(self._qmax) - 2)
+        weight = (h - self._h_min) / self._h_step - i
+        return (1 - weight) * self._qmax[i] + weight * self._qmax[i + 1]
@@ -2,17 +2,35 @@
 
 The qmin scheme determines the outflow based on an optimization problem.
 """
+import logging
+import time
 from datetime import datetime
-from typing import List, Optional, Union
+from enum import Enum
+from typing import Dict, List, Optional, Union
 
+import casadi
 import numpy as np
 import pydantic
 from rtctools.optimization.goal_programming_mixin import Goal
+from rtctools.optimization.timeseries import Timeseries
 
 from rtctools_simulation.model_config import ModelConfig
 from rtctools_simulation.optimization_problem import OptimizationProblem
 from rtctools_simulation.reservoir._variables import InputVar, OptimizationVar, OutputVar
 
+logger = logging.getLogger("rtctools")
+
+
+class MinQBackend(str, Enum):
+    """Method for solving the qmin optimization problem."""
+
+    #: Goal programming with rtc-tools (:py:class:`QMinProblem`).
+    GOAL_PROGRAMMING = "goal_programming"
+    #: A single NLP that is reused for all priorities (:py:class:`QMinNLP`).
+    NLP = "nlp"
+    #: Bisection and dynamic programming, see :py:mod:`.minq_bisection`.
+    BISECTION = "bisection"
+
 
 class QMinParameters(pydantic.BaseModel):
     """Data class containing qmin-specific parameters in terms of volume."""
@@ -62,7 +80,13 @@ class TargetVolume(Goal):
 
 
 class QMinProblem(OptimizationProblem):
-    """Class for describing an outflow optimization problem."""
+    """
+    Class for describing an outflow optimization problem.
+
+    The problem can be optimized over a part of the datetimes for a receding horizon.
+    In that case, a new problem is created for each optimization,
+    seeded with the results of the previous optimization.
+    """
 
     def __init__(
         self,
@@ -70,21 +94,77 @@ class QMinProblem(OptimizationProblem):
         datetimes: List[datetime],
         params: QMinParameters,
         input_timeseries: dict[InputVar],
+        start_index: int = 0,
+        end_index: Optional[int] = None,
+        previous_results: Optional[Dict[str, Timeseries]] = None,
+        receding_horizon: bool = False,
         **kwargs,
     ):
+        """
+        :param config: model config of the ReservoirMinQ model.
+        :param datetimes: datetimes of the input timeseries.
+        :param params: optimization parameters. A list of target volumes should have
+            the same length as the optimization horizon.
+        :param input_timeseries: input timeseries for all datetimes.
+        :param start_index: index of the first datetime of the optimization horizon.
+            The initial state is taken from the input timeseries at this datetime.
+        :param end_index: index after the last datetime of the optimization horizon.
+            Defaults to the number of datetimes.
+        :param previous_results: results of a previous optimization
+            (see :py:attr:`results_timeseries`) to seed the first priority with.
+        :param receding_horizon: if True, the minimized peak outflow is bounded
+            instead of fixed for the next priorities.
+        """
         self.datetimes = datetimes
         self.params = params
         self.input_timeseries = input_timeseries
+        self.receding_horizon = receding_horizon
+        self._start_index = start_index
+        self._end_index = len(datetimes) if end_index is None else end_index
+        self._previous_results = previous_results
+        #: Results of the optimization as timeseries, None before optimizing.
+        self.results_timeseries: Optional[Dict[str, Timeseries]] = None
         super().__init__(config, **kwargs)
 
+    def optimize(self, *args, **kwargs) -> bool:
+        success = super().optimize(*args, **kwargs)
+        if success:
+            times = self.times()
+            self.results_timeseries = {
+                var: Timeseries(times, values)
+                for var, values in self.extract_results().items()
+                if len(values) == len(times)
+            }
+        return success
+
+    def seed(self, ensemble_member):
+        seed = super().seed(ensemble_member)
+        if self._gp_first_run and self._previous_results is not None:
+            # Warm start from the previous optimization.
+            times = self.times()
+            for var, timeseries in self._previous_results.items():
+                values = np.interp(times, timeseries.times, timeseries.values)
+                seed[var] = Timeseries(times, values)
+        return seed
+
     def pre(self):
         self.io.reference_datetime = self.datetimes[0]
         for var, value in self.input_timeseries.items():
             self.io.set_timeseries(var.value, self.datetimes, np.array(value))
         super().pre()
 
+    def goal_programming_options(self):
+        options = super().goal_programming_options()
+        if self.receding_horizon:
+            # Bound the minimized peak outflow instead of fixing it.
+            # Fixing it makes the next priority degenerate when the minimal peak is zero,
+            # for example when optimizing from the current state without inflow.
+            options["fix_minimized_values"] = False
+        return options
+
     def times(self, variable=None):
-        return self.io.datetime_to_sec(self.datetimes, self.datetimes[0])
+        times = self.io.datetime_to_sec(self.datetimes, self.datetimes[0])
+        return times[self._start_index : self._end_index]
 
     def goals(self):
         return [
@@ -115,3 +195,205 @@ class QMinProblem(OptimizationProblem):
             OutputVar.Q_OUT.value: (0, np.inf),
             OptimizationVar.Q_OUT_MAX.value: (self.params.q_flood, np.inf),
         }
+
+
+class QMinNLP:
+    """
+    Fast formulation of the qmin optimization problem for a fixed number of times.
+
+    The problem is the same as :py:class:`QMinProblem`, but the NLP is built once
+    and the IPOPT solver is reused for all priorities and for all optimizations
+    with the same number of times.
+    The input data are parameters of the NLP and the priorities are imposed
+    with the bounds of the decision variables, similar to how rtc-tools turns the goals
+    of a solved priority into constraints:
+
+    1. :py:class:`VolumeBounds`: minimize the violation eps1 of the volume bounds.
+       The optimal eps1 becomes an upper bound for the next priorities.
+    2. :py:class:`MinimizeQOutMax`: minimize the peak outflow Q_out_max.
+       The optimal peak becomes an upper bound for the next priority.
+    3. :py:class:`TargetVolume`: minimize the deviation eps3 from the target volume.
+
+    Each priority is warm-started from the solution of the previous priority.
+    The solve time of each priority is stored in :py:attr:`timings`.
+    """
+
+    #: Priorities of the goals, in order of solving.
+    priorities = (VolumeBounds.priority, MinimizeQOutMax.priority, TargetVolume.priority)
+
+    def __init__(self, n_times: int, solver_options: Optional[dict] = None):
+        """
+        Build the NLP and the solver.
+
+        :param n_times: number of times of the optimization horizon.
+        :param solver_options: options for the IPOPT solver, see casadi.nlpsol.
+        """
+        if n_times < 2:  # noqa: PLR2004
+            raise ValueError(f"The qmin problem needs at least two times, got {n_times}.")
+        self.n_times = n_times
+        n = n_times
+        start = time.perf_counter()
+        # Decision variables.
+        volume = casadi.SX.sym("V", n)
+        q_out = casadi.SX.sym("Q_out", n)
+        q_out_max = casadi.SX.sym("Q_out_max")
+        eps_bounds = casadi.SX.sym("eps_bounds", n)
+        eps_target = casadi.SX.sym("eps_target", n)
+        x = casadi.vertcat(volume, q_out, q_out_max, eps_bounds, eps_target)
+        self._slices = {}
+        offset = 0
+        for name, size in [
+            ("V", n),
+            ("Q_out", n),
+            ("Q_out_max", 1),
+            ("eps_bounds", n),
+            ("eps_target", n),
+        ]:
+            self._slices[name] = slice(offset, offset + size)
+            offset += size
+        # Parameters.
+        dt = casadi.SX.sym("dt", n - 1)
+        q_in = casadi.SX.sym("Q_in", n)
+        v_min = casadi.SX.sym("v_min")
+        v_max = casadi.SX.sym("v_max")
+        v_target = casadi.SX.sym("v_target", n)
+        weights = casadi.SX.sym("weights", len(self.priorities))
+        p = casadi.vertcat(dt, q_in, v_min, v_max, v_target, weights)
+        # Constraints, with the same function range as the goals of QMinProblem.
+        range_min = v_min - casadi.fabs(v_min) - 1
+        range_max = 2 * v_max
+        g = casadi.vertcat(
+            # Implicit Euler discretization of der(V) = Q_in - Q_out.
+            volume[1:] - volume[:-1] - dt * (q_in[1:] - q_out[1:]),
+            q_out_max - q_out,
+            volume - eps_bounds * (range_min - v_min) - v_min,
+            volume - eps_bounds * (range_max - v_max) - v_max,
+            volume - eps_target * (range_min - v_target) - v_target,
+            volume - eps_target * (range_max - v_target) - v_target,
+        )
+        zeros, infs = np.zeros(n), np.full(n, np.inf)
+        self._lbg = np.concatenate([zeros[1:], zeros, zeros, -infs, zeros, -infs])
+        self._ubg = np.concatenate([zeros[1:], infs, infs, zeros, infs, zeros])
+        # The objective of each priority is selected with the weights.
+        f = (
+            weights[0] * casadi.sumsqr(eps_bounds)
+            + weights[1] * n * q_out_max**2
+            + weights[2] * casadi.sumsqr(eps_target)
+        )
+        options = {"ipopt.print_level": 0, "ipopt.sb": "yes", "print_time": False}
+        options.update(solver_options or {})
+        self._solver = casadi.nlpsol("qmin", "ipopt", {"x": x, "p": p, "f": f, "g": g}, options)
+        self._x_opt: Optional[np.ndarray] = None
+        self._times_opt: Optional[np.ndarray] = None
+        #: Time (s) to build the NLP and the solver.
+        self.build_time = time.perf_counter() - start
+        #: Solve time (s) of each priority of the last optimization.
+        self.timings: Dict[int, float] = {}
+
+    def solve(
+        self,
+        times: np.ndarray,
+        v_initial: float,
+        q_in: np.ndarray,
+        params: QMinParameters,
+        q_out_initial: Optional[float] = None,
+        previous: Optional["QMinNLP"] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Solve all priorities of the qmin problem.
+
+        The first priority is warm-started from the solution of the previous call,
+        or from the last solution of another NLP, interpolated to the given times.
+
+        :param times: times (s) of the optimization horizon.
+        :param v_initial: volume at the first time.
+        :param q_in: inflow at each time.
+        :param params: optimization parameters. A list of target volumes should have
+            the same length as the times.
+        :param q_out_initial: outflow at the first time.
+            If None, the outflow at the first time is free.
+            When the volume before the first time is known, rtc-tools derives the outflow
+            at the first time from the history, and it contributes to the peak outflow.
+        :param previous: NLP to warm-start from, for example the NLP of the previous horizon
+            of a receding horizon. Defaults to this NLP.
+        :returns: dict with the volume (V), outflow (Q_out) and peak outflow (Q_out_max)
+            at each time.
+        """
+        n = self.n_times
+        times = np.asarray(times, dtype=float)
+        q_in = np.asarray(q_in, dtype=float)
+        if len(times) != n or len(q_in) != n:
+            raise ValueError(f"Expected {n} times and inflows, got {len(times)} and {len(q_in)}.")
+        if params.v_max is None:
+            raise ValueError("The qmin problem requires a maximum volume.")
+        v_target = np.broadcast_to(np.asarray(params.v_target, dtype=float), (n,))
+        data = np.concatenate([np.diff(times), q_in, [params.v_min, params.v_max], v_target])
+        lbx = np.zeros(4 * n + 1)
+        ubx = np.full(4 * n + 1, np.inf)
+        lbx[self._slices["V"]] = -np.inf
+        lbx[self._slices["V"].start] = ubx[self._slices["V"].start] = v_initial
+        lbx[self._slices["Q_out_max"]] = params.q_flood
+        if q_out_initial is not None:
+            lbx[self._slices["Q_out"].start] = ubx[self._slices["Q_out"].start] = q_out_initial
+        ubx[self._slices["eps_bounds"]] = 1
+        ubx[self._slices["eps_target"]] = 1
+        x0 = self._get_warm_start(times, self if previous is None else previous)
+        if x0 is None:
+            x0 = np.concatenate(
+                [
+                    np.full(n, v_initial),
+                    q_in,
+                    [max(np.max(q_in), params.q_flood)],
+                    np.ones(2 * n),
+                ]
+            )
+        self.timings = {}
+        for i, priority in enumerate(self.priorities):
+            weights = np.zeros(len(self.priorities))
+            weights[i] = 1
+            start = time.perf_counter()
+            result = self._solver(
+                x0=np.clip(x0, lbx, ubx),
+                p=np.concatenate([data, weights]),
+                lbx=lbx,
+                ubx=ubx,
+                lbg=self._lbg,
+                ubg=self._ubg,
+            )
+            self.timings[priority] = time.perf_counter() - start
+            stats = self._solver.stats()
+            logger.debug(
+                f"qmin priority {priority}: {stats['return_status']}"
+                f" in {self.timings[priority]:.4f} s."
+            )
+            if not stats["success"]:
+                raise ValueError(
+                    f"Solving minimal peak outflow did not succeed for priority {priority}:"
+                    f" {stats['return_status']}."
+                )
+            x0 = result["x"].toarray().ravel()
+            # Impose the optimal objective of the solved priority on the next priorities.
+            if priority == VolumeBounds.priority:
+                ubx[self._slices["eps_bounds"]] = x0[self._slices["eps_bounds"]]
+            elif priority == MinimizeQOutMax.priority:
+                ubx[self._slices["Q_out_max"]] = x0[self._slices["Q_out_max"]]
+        self._x_opt = x0
+        self._times_opt = times
+        return {
+            OutputVar.VOLUME.value: x0[self._slices["V"]],
+            OutputVar.Q_OUT.value: x0[self._slices["Q_out"]],
+            OptimizationVar.Q_OUT_MAX.value: np.full(n, x0[self._slices["Q_out_max"]][0]),
+        }
+
+    def _get_warm_start(self, times: np.ndarray, previous: "QMinNLP") -> Optional[np.ndarray]:
+        """Get the last solution of an NLP, interpolated to the given times."""
+        if previous._x_opt is None:
+            return None
+        if previous is self and np.array_equal(times, self._times_opt):
+            return self._x_opt
+        x0 = np.empty(4 * self.n_times + 1)
+        for name in ["V", "Q_out", "eps_bounds", "eps_target"]:
+            values = previous._x_opt[previous._slices[name]]
+            x0[self._slices[name]] = np.interp(times, previous._times_opt, values)
+        x0[self._slices["Q_out_max"]] = previous._x_opt[previous._slices["Q_out_max"]]
+        return x0
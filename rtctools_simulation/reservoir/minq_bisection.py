@@ -0,0 +1,298 @@
+"""
+Direct solver for the qmin optimization problem.
+------------------------------------------------
+
+The qmin problem (see :py:class:`.QMinProblem`) has a linear storage model
+der(V) = Q_in - Q_out with 0 <= Q_out <= Q_out_max, discretized with implicit Euler.
+Its priorities are solved directly, without IPOPT:
+
+1. Volume bounds: the volume should stay within [v_min, v_max].
+   The upper bound can always be met after the first time by releasing more water.
+   The lower bound can not be met if the reservoir does not fill quickly enough,
+   in which case the volume should be as high as possible.
+   This gives effective volume bounds for the next priorities.
+2. Peak outflow: the minimal Q_out_max for which the effective volume bounds can be met.
+   The feasibility of a given Q_out_max is checked with a forward sweep over the
+   reachable volume intervals, and the minimum is found by bisection.
+3. Target volume: the squared deviations from the target volume are minimized
+   with a backward dynamic programming sweep. The cost-to-go is a convex,
+   piecewise quadratic function of the volume, so it is represented exactly.
+
+If the lower volume bound can not be met, priority 1 keeps the volume as high as possible
+at each time. Goal programming minimizes the sum of squared violations, which can give
+a different trade-off when exceeding v_max helps to reduce a later shortage.
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from rtctools_simulation.reservoir._variables import OptimizationVar, OutputVar
+
+#: Maximum number of bisection steps for the peak outflow.
+MAX_BISECTION_STEPS = 200
+
+#: Relative tolerance of the peak outflow.
+PEAK_RTOL = 1e-10
+
+
+class _PiecewiseQuadratic:
+    """
+    Convex piecewise quadratic function on an interval.
+
+    Each piece i is stored relative to its left breakpoint x[i], as
+    c0 + c1 * (x - x[i]) + c2 * (x - x[i]) ** 2, such that the coefficients
+    do not change when the function is shifted.
+    """
+
+    def __init__(self, x: List[float], coefficients: List[Tuple[float, float, float]]):
+        self.x = x
+        self.coefficients = coefficients
+
+    @property
+    def lower(self) -> float:
+        return self.x[0]
+
+    @property
+    def upper(self) -> float:
+        return self.x[-1]
+
+    def split(self, x_split: float):
+        """Add a breakpoint at x_split if it lies inside a piece."""
+        for i, (x_left, x_right) in enumerate(zip(self.x[:-1], self.x[1:])):
+            if x_left < x_split < x_right:
+                c0, c1, c2 = self.coefficients[i]
+                s = x_split - x_left
+                self.x.insert(i + 1, x_split)
+                self.coefficients.insert(i + 1, (c0 + c1 * s + c2 * s * s, c1 + 2 * c2 * s, c2))
+                return
+
+    def add_deviation(self, target: float, weight_below: float, weight_above: float):
+        """
+        Add the squared deviation from a target.
+
+        The deviation is weighted with weight_below below the target
+        and with weight_above above the target.
+        """
+        self.split(target)
+        for i, x_left in enumerate(self.x[:-1]):
+            weight = weight_below if self.x[i + 1] <= target else weight_above
+            d = x_left - target
+            c0, c1, c2 = self.coefficients[i]
+            self.coefficients[i] = (c0 + weight * d * d, c1 + 2 * weight * d, c2 + weight)
+
+    def restrict(self, lower: float, upper: float) -> bool:
+        """Restrict the domain, return False if the domain becomes empty."""
+        lower = max(lower, self.lower)
+        upper = min(upper, self.upper)
+        if lower > upper:
+            return False
+        self.split(lower)
+        self.split(upper)
+        x, coefficients = [], []
+        for i, (x_left, x_right) in enumerate(zip(self.x[:-1], self.x[1:])):
+            if x_left >= lower and x_right <= upper:
+                if not x:
+                    x.append(x_left)
+                x.append(x_right)
+                coefficients.append(self.coefficients[i])
+        if not x:
+            # The domain is a single point.
+            value = self(lower)
+            x, coefficients = [lower, upper], [(value, 0.0, 0.0)]
+        self.x, self.coefficients = x, coefficients
+        return True
+
+    def __call__(self, x: float) -> float:
+        i = min(max(np.searchsorted(self.x, x, side="right") - 1, 0), len(self.coefficients) - 1)
+        c0, c1, c2 = self.coefficients[i]
+        s = x - self.x[i]
+        return c0 + c1 * s + c2 * s * s
+
+    def argmin(self) -> Tuple[float, float]:
+        """Get the minimizer and the minimum."""
+        x_min, f_min = self.x[0], math.inf
+        for i, (x_left, x_right) in enumerate(zip(self.x[:-1], self.x[1:])):
+            c0, c1, c2 = self.coefficients[i]
+            length = x_right - x_left
+            s = min(max(-c1 / (2 * c2), 0.0), length) if c2 > 0 else (0.0 if c1 >= 0 else length)
+            f = c0 + c1 * s + c2 * s * s
+            if f < f_min:
+                x_min, f_min = x_left + s, f
+        return x_min, f_min
+
+    def slide(self, d_lower: float, d_upper: float, x_min: float, f_min: float):
+        """
+        Replace f(u) by the minimum of f(v) for v in [u + d_lower, u + d_upper].
+
+        The part below the minimizer is shifted by -d_upper, the part above the minimizer
+        is shifted by -d_lower, and the gap in between is filled with the minimum.
+        """
+        self.split(x_min)
+        x, coefficients = [], []
+        for i, (x_left, x_right) in enumerate(zip(self.x[:-1], self.x[1:])):
+            if x_right <= x_min:
+                if not x:
+                    x.append(x_left - d_upper)
+                x.append(x_right - d_upper)
+                coefficients.append(self.coefficients[i])
+        if not x:
+            x.append(x_min - d_upper)
+        if d_upper > d_lower:
+            x.append(x_min - d_lower)
+            coefficients.append((f_min, 0.0, 0.0))
+        for i, (x_left, x_right) in enumerate(zip(self.x[:-1], self.x[1:])):
+            if x_left >= x_min:
+                x.append(x_right - d_lower)
+                coefficients.append(self.coefficients[i])
+        if not coefficients:
+            x.append(x[0])
+            coefficients.append((f_min, 0.0, 0.0))
+        self.x, self.coefficients = x, coefficients
+
+
+def _effective_bounds(
+    dv_in: np.ndarray, v_initial: float, v_min: float, v_max: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the volume bounds after solving the volume bounds priority.
+
+    :param dv_in: inflow volume dt * Q_in of each timestep.
+    """
+    n = len(dv_in) + 1
+    lower, upper = np.full(n, v_min), np.full(n, v_max)
+    lower[0] = upper[0] = v_initial
+    v_highest = v_initial
+    for i, dv in enumerate(dv_in, start=1):
+        # Highest reachable volume without exceeding v_max.
+        v_highest = min(v_highest + dv, v_max)
+        lower[i] = min(v_min, v_highest)
+    return lower, upper
+
+
+def _is_feasible(
+    q_out_max: float, dt: np.ndarray, dv_in: np.ndarray, lower: np.ndarray, upper: np.ndarray
+) -> bool:
+    """Check if the volume bounds can be met with a given peak outflow."""
+    v_low = v_high = lower[0]
+    for i, (dt_i, dv) in enumerate(zip(dt, dv_in), start=1):
+        v_low = max(v_low + dv - dt_i * q_out_max, lower[i])
+        v_high = min(v_high + dv, upper[i])
+        if v_low > v_high:
+            return False
+    return True
+
+
+def _minimize_peak(
+    q_lower: float, dt: np.ndarray, dv_in: np.ndarray, lower: np.ndarray, upper: np.ndarray
+) -> float:
+    """Find the minimal feasible peak outflow by bisection."""
+    if _is_feasible(q_lower, dt, dv_in, lower, upper):
+        return q_lower
+    # Going from the upper to the lower bound in each timestep is always feasible.
+    q_upper = max(q_lower, np.max((upper[:-1] + dv_in - lower[1:]) / dt))
+    q_upper += PEAK_RTOL * max(abs(q_upper), 1.0)
+    for _ in range(MAX_BISECTION_STEPS):
+        if q_upper - q_lower <= PEAK_RTOL * max(abs(q_upper), 1.0):
+            break
+        q_mid = 0.5 * (q_lower + q_upper)
+        if _is_feasible(q_mid, dt, dv_in, lower, upper):
+            q_upper = q_mid
+        else:
+            q_lower = q_mid
+    return q_upper
+
+
+def _track_target(
+    q_out_max: float,
+    dt: np.ndarray,
+    dv_in: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    v_target: np.ndarray,
+    weights_below: np.ndarray,
+    weights_above: np.ndarray,
+) -> np.ndarray:
+    """Minimize the weighted squared deviation from the target volume."""
+    n = len(lower)
+    argmins = np.empty(n)
+    domains = np.empty((n, 2))
+    cost = _PiecewiseQuadratic([lower[-1], upper[-1]], [(0.0, 0.0, 0.0)])
+    for i in range(n - 1, 0, -1):
+        cost.add_deviation(v_target[i], weights_below[i], weights_above[i])
+        x_min, f_min = cost.argmin()
+        argmins[i] = x_min
+        domains[i] = cost.lower, cost.upper
+        dv = dv_in[i - 1]
+        cost.slide(dv - dt[i - 1] * q_out_max, dv, x_min, f_min)
+        if i > 1 and not cost.restrict(lower[i - 1], upper[i - 1]):
+            raise ValueError("The minimal peak outflow is not feasible.")
+    volume = np.empty(n)
+    volume[0] = lower[0]
+    for i in range(1, n):
+        dv = dv_in[i - 1]
+        v_low = max(volume[i - 1] + dv - dt[i - 1] * q_out_max, domains[i, 0])
+        v_high = min(volume[i - 1] + dv, domains[i, 1])
+        volume[i] = min(max(argmins[i], v_low), v_high)
+    return volume
+
+
+def solve_qmin_bisection(
+    times: np.ndarray,
+    v_initial: float,
+    q_in: np.ndarray,
+    v_min: float,
+    v_max: float,
+    v_target: Union[float, List[float]],
+    q_flood: float = 0,
+    q_out_initial: Optional[float] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Solve the qmin problem with bisection and dynamic programming.
+
+    :param times: times (s) of the optimization horizon.
+    :param v_initial: volume at the first time.
+    :param q_in: inflow at each time.
+    :param v_min: minimum volume.
+    :param v_max: maximum volume.
+    :param v_target: target volume, either a float or a list with a value for each time.
+    :param q_flood: flood discharge, the peak outflow is at least this value.
+    :param q_out_initial: outflow at the first time.
+        If None, the outflow at the first time is free, see :py:meth:`.QMinNLP.solve`.
+    :returns: dict with the volume (V), outflow (Q_out) and peak outflow (Q_out_max)
+        at each time.
+    """
+    times = np.asarray(times, dtype=float)
+    q_in = np.asarray(q_in, dtype=float)
+    n = len(times)
+    if n < 2:  # noqa: PLR2004
+        raise ValueError(f"The qmin problem needs at least two times, got {n}.")
+    if v_max is None:
+        raise ValueError("The qmin problem requires a maximum volume.")
+    v_target = np.broadcast_to(np.asarray(v_target, dtype=float), (n,))
+    dt = np.diff(times)
+    dv_in = dt * q_in[1:]
+    lower, upper = _effective_bounds(dv_in, v_initial, v_min, v_max)
+    q_lower = max(q_flood, 0.0 if q_out_initial is None else q_out_initial)
+    q_out_max = _minimize_peak(q_lower, dt, dv_in, lower, upper)
+    # The deviation from the target is scaled with the function range of TargetVolume.
+    range_min = v_min - abs(v_min) - 1
+    range_max = 2 * v_max
+    weights_below = 1 / (v_target - range_min) ** 2
+    weights_above = 1 / np.maximum(range_max - v_target, np.finfo(float).tiny) ** 2
+    volume = _track_target(
+        q_out_max, dt, dv_in, lower, upper, v_target, weights_below, weights_above
+    )
+    q_out = np.empty(n)
+    q_out[1:] = q_in[1:] - np.diff(volume) / dt
+    if q_out_initial is None:
+        # The outflow at the first time does not affect the volume.
+        q_out[0] = min(max(q_in[0], 0.0), q_out_max)
+    else:
+        q_out[0] = q_out_initial
+    return {
+        OutputVar.VOLUME.value: volume,
+        OutputVar.Q_OUT.value: q_out,
+        OptimizationVar.Q_OUT_MAX.value: np.full(n, q_out_max),
+    }
@@ -1,20 +1,34 @@
 """Module for a reservoir model."""
 
 import filecmp
+import hashlib
 import logging
 import math
+import os
 import shutil
+import tempfile
 from copy import deepcopy
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Union, get_args
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+    get_args,
+)
 
+import casadi
 import numpy as np
-import scipy
+import pymoca
 
 import rtctools_simulation.reservoir.setq_help_functions as setq_functions
 from rtctools_simulation.interpolate import fill_nans_with_interpolation
-from rtctools_simulation.model import Model, ModelConfig
+from rtctools_simulation.model import HeadlessModel, Model, ModelConfig
 from rtctools_simulation.reservoir._input import (
     Input,
     OutflowType,
@@ -28,27 +42,219 @@ from rtctools_simulation.reservoir._variables import (
     SchemeVar,
     StateVar,
 )
-from rtctools_simulation.reservoir.minq import QMinParameters, QMinProblem
+from rtctools_simulation.reservoir.checkpoint import Checkpoint, read_checkpoint, write_checkpoint
+from rtctools_simulation.reservoir.fast_engine import ReservoirEngine
+from rtctools_simulation.reservoir.maxq import MaxQCurve, TailwaterSolver
+from rtctools_simulation.reservoir.minq_bisection import solve_qmin_bisection
 from rtctools_simulation.reservoir.rule_curve import rule_curve_deviation, rule_curve_discharge
 
+if TYPE_CHECKING:
+    # The qmin optimization stack (pydantic, rtc-tools optimization) is imported on first use.
+    from rtctools_simulation.reservoir.minq import (
+        MinQBackend,
+        QMinNLP,
+        QMinParameters,
+        QMinProblem,
+    )
+
 DEFAULT_MODEL_DIR = Path(__file__).parent.parent / "modelica" / "reservoir"
 
+DEFAULT_MODEL_FILES = ["reservoir.mo", "reservoir_minq.mo", "lookup_table_equations.csv"]
+
+#: Prefix of the model folders in a model cache directory.
+MODEL_CACHE_PREFIX = "reservoir_"
+
 logger = logging.getLogger("rtctools")
 
 
-class ReservoirModel(Model):
-    """Class for a reservoir model."""
+#: Engines for computing the timesteps of a reservoir model.
+ENGINES = ["casadi", "numpy"]
+
+# Variables that are read at each timestep to set the default input.
+_DEFAULT_INPUT_VARS = (
+    InputVar.H_OBSERVED.value,
+    InputVar.Q_IN.value,
+    "mm_evaporation_per_hour",
+    "mm_rain_per_hour",
+    "Q_turbine",
+    "Q_sluice",
+    "Q_out_from_input",
+)
+
+# Names of the Modelica input variables, in the order of input_to_dict.
+_MODELICA_INPUT_VARS = tuple(var.value for var in input_to_dict(Input()))
+
+
+def _copy_default_model_files(model_dir: Path):
+    """
+    Copy the files of the default model to a model folder, if they have changed.
+
+    Each file is copied to a temporary file first and then renamed,
+    such that processes sharing the model folder never read an incomplete file.
+    """
+    for filename in DEFAULT_MODEL_FILES:
+        default_file = DEFAULT_MODEL_DIR / filename
+        file = model_dir / filename
+        if file.is_file() and filecmp.cmp(default_file, file, shallow=False):
+            continue
+        fd, tmp_file = tempfile.mkstemp(dir=model_dir, prefix=f".{filename}.")
+        os.close(fd)
+        try:
+            shutil.copy2(default_file, tmp_file)
+            os.replace(tmp_file, file)
+        except BaseException:
+            Path(tmp_file).unlink(missing_ok=True)
+            raise
+
+
+def _get_model_hash() -> str:
+    """
+    Get the hash of the default model.
+
+    The hash depends on the default model files and the pymoca and casadi versions,
+    since these determine the compiled model.
+    """
+    model_hash = hashlib.sha256()
+    for filename in DEFAULT_MODEL_FILES:
+        model_hash.update(filename.encode())
+        model_hash.update((DEFAULT_MODEL_DIR / filename).read_bytes())
+    model_hash.update(pymoca.__version__.encode())
+    model_hash.update(casadi.__version__.encode())
+    return model_hash.hexdigest()[:16]
+
+
+def _get_cached_model_dir(cache_dir: Path) -> Path:
+    """
+    Get the folder of the default model in a model cache directory.
+
+    The model folder is named after the hash of the default model.
+    If it does not exist yet, it is created and the model files are copied to it.
+    The compiled model is stored in the same folder by pymoca.
+    Folders of outdated models are kept, since other processes may still use them,
+    see :py:func:`clean_model_cache`.
+    """
+    model_dir = cache_dir / f"{MODEL_CACHE_PREFIX}{_get_model_hash()}"
+    if not model_dir.is_dir():
+        # Create the folder under a temporary name first,
+        # such that other processes never see an incomplete folder.
+        tmp_dir = Path(tempfile.mkdtemp(dir=cache_dir, prefix=".tmp_"))
+        _copy_default_model_files(tmp_dir)
+        try:
+            tmp_dir.rename(model_dir)
+        except OSError:
+            # The folder was created by another process in the meantime.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return model_dir
+
+
+def clean_model_cache(cache_dir: Path) -> List[Path]:
+    """
+    Remove the folders of outdated default models from a model cache directory.
+
+    Outdated folders were created for other versions of the default model,
+    pymoca or casadi. Only run this when no process with such a version uses the cache.
+
+    :param cache_dir: model cache directory.
+    :returns: list of removed folders.
+    """
+    model_dir = Path(cache_dir) / f"{MODEL_CACHE_PREFIX}{_get_model_hash()}"
+    removed_dirs = []
+    for stale_dir in sorted(Path(cache_dir).glob(f"{MODEL_CACHE_PREFIX}*")):
+        if stale_dir != model_dir and stale_dir.is_dir():
+            logger.debug(f"Removing outdated model cache {stale_dir}.")
+            shutil.rmtree(stale_dir, ignore_errors=True)
+            removed_dirs.append(stale_dir)
+    return removed_dirs
+
 
-    def __init__(self, config: ModelConfig, use_default_model=True, **kwargs):
+class HeadlessReservoirModel(HeadlessModel):
+    """
+    Class for a reservoir model without plotting.
+
+    This class contains all methods of :py:class:`ReservoirModel`,
+    but does not import any plotting packages, see :py:class:`.HeadlessModel`.
+
+    :cvar checkpoint_timeseries: Timeseries computed by schemes
+        that are stored in a checkpoint, see :py:meth:`.ReservoirModel.save_checkpoint`.
+    """
+
+    #: Timeseries computed by schemes that are stored in a checkpoint.
+    checkpoint_timeseries: Tuple[str, ...] = ("Q_out_minq",)
+
+    def __init__(
+        self,
+        config: ModelConfig,
+        use_default_model=True,
+        engine: str = "casadi",
+        maxq_h_step: Optional[float] = None,
+        restart_checkpoint: Optional[Union[str, Path]] = None,
+        checkpoint_file: Optional[Union[str, Path]] = None,
+        checkpoint_datetime: Optional[datetime] = None,
+        **kwargs,
+    ):
         """
         Initialize the model.
 
         :param use_default_model BOOL: (default=True)
             If true, the default single reservoir model will be used.
+        :param engine STR: (default="casadi")
+            Engine for computing the timesteps. Options are
+
+                - "casadi": solve the model equations with the DAE solver of rtc-tools.
+                - "numpy": compute the timesteps with
+                  :py:class:`~rtctools_simulation.reservoir.fast_engine.ReservoirEngine`.
+                  This engine is only available for the default model.
+        :param maxq_h_step FLOAT: (default=None)
+            If given, the maximum discharge of :py:meth:`.ReservoirModel.find_maxq`
+            with the 'Tailwater' relation is precomputed during :py:meth:`.ReservoirModel.pre`
+            on an elevation grid with this spacing over the range of lookup table ``v_from_h``.
+            See :py:meth:`.ReservoirModel.get_maxq_curve`.
+        :param restart_checkpoint PATH: (default=None)
+            If given, the simulation resumes from the state in this checkpoint file
+            instead of starting at the first time.
+            The checkpoint datetime should be one of the times of the model.
+            Columnar output only contains the times from the checkpoint onwards,
+            PI-XML output contains all times with NaN before the checkpoint.
+            Plotting is not supported when resuming,
+            use :py:func:`~rtctools_simulation.plotting.plot_results` instead.
+        :param checkpoint_file PATH: (default=None)
+            If given, a checkpoint is written to this file,
+            at checkpoint_datetime or at the end of the simulation.
+        :param checkpoint_datetime DATETIME: (default=None)
+            Datetime at which the checkpoint is written, for example the forecast time.
+            If None, the checkpoint is written at the end of the simulation.
         """
+        if engine not in ENGINES:
+            raise ValueError(f"Engine {engine} is not supported. Choose one of {ENGINES}.")
+        if engine == "numpy" and not use_default_model:
+            raise ValueError("The numpy engine is only available for the default model.")
+        self._restart_checkpoint = restart_checkpoint
+        self._checkpoint_file = checkpoint_file
+        self._checkpoint_datetime = checkpoint_datetime
+        self._checkpoint_time: Optional[float] = None
+        self._engine_name = engine
+        self._engine: Optional[ReservoirEngine] = None
+        self._use_model_cache = False
+        self._setq_cache = setq_functions.SetqCache()
+        self._tailwater_solver: Optional[TailwaterSolver] = None
+        self._tailwater: Optional[float] = None
+        self._maxq_h_step = maxq_h_step
+        self._maxq_curve: Optional[MaxQCurve] = None
+        self._qmin_problem: Optional["QMinProblem"] = None
+        # NLPs of the nlp backend by number of times, and the last solved NLP.
+        self._qmin_nlps: Dict[int, "QMinNLP"] = {}
+        self._qmin_nlp: Optional["QMinNLP"] = None
+        self._qmin_end_index = 0
         if use_default_model:
             self._create_model(config)
         super().__init__(config, **kwargs)
+        # The data store counts the versions of the timeseries for the setq cache.
+        self.io = setq_functions.VersionedDataStore(self)
+        if restart_checkpoint is not None and self._plotting_enabled():
+            raise ValueError(
+                "Plotting is not supported when resuming from a checkpoint. "
+                "Disable plotting in the model config and plot the results afterwards."
+            )
         # Stored parameters
         self.max_reservoir_area = 0  # Set during pre().
         # Model inputs and input controls.
@@ -65,21 +271,24 @@ class ReservoirModel(Model):
         base_dir = config.base_dir()
         if base_dir is None:
             raise ValueError("A base directory should be set when using the default model.")
-        model_dir = base_dir / "generated_model"
-        if not model_dir.is_dir():
-            model_dir.mkdir()
+        cache_dir = config.get_dir("cache")
+        if cache_dir is not None:
+            model_dir = _get_cached_model_dir(cache_dir)
+            self._use_model_cache = True
+        else:
+            model_dir = base_dir / "generated_model"
+            # Scenarios running in parallel may create the folder at the same time.
+            model_dir.mkdir(exist_ok=True)
+            _copy_default_model_files(model_dir)
         config.set_dir("model", model_dir)
         config.set_model("Reservoir")
-        for filename in [
-            "reservoir.mo",
-            "reservoir_minq.mo",
-            "lookup_table_equations.csv",
-        ]:
-            default_file = DEFAULT_MODEL_DIR / filename
-            file = model_dir / filename
-            if file.is_file() and filecmp.cmp(default_file, file, shallow=False):
-                continue
-            shutil.copy2(default_file, file)
+
+    def compiler_options(self):
+        compiler_options = super().compiler_options()
+        if self._use_model_cache:
+            # Cached model folders are identified by the hash of their content.
+            compiler_options["mtime_check"] = False
+        return compiler_options
 
     # Methods for preprocsesing.
     def pre(self, *args, **kwargs):
@@ -96,6 +305,164 @@ class ReservoirModel(Model):
         self._handle_missing_h_observed()
         self._process_input_variables(initial_h)
         self.max_reservoir_area = self.parameters().get("max_reservoir_area", 0)
+        if self._maxq_h_step is not None:
+            self._create_maxq_curve()
+
+    def initialize(self, config_file=None):
+        super().initialize(config_file)
+        if self._restart_checkpoint is not None:
+            self._restore_checkpoint(read_checkpoint(self._restart_checkpoint))
+        if self._engine_name == "numpy":
+            self._engine = self._create_engine()
+        self._checkpoint_time = None
+        if self._checkpoint_file is not None and self._checkpoint_datetime is not None:
+            self._checkpoint_time = self._datetime_to_sec(self._checkpoint_datetime)
+            self._save_checkpoint_at_time()
+
+    def update(self, dt):
+        super().update(dt)
+        self._save_checkpoint_at_time()
+
+    def post(self):
+        super().post()
+        if self._checkpoint_file is None:
+            return
+        if self._checkpoint_datetime is None:
+            self.save_checkpoint(self._checkpoint_file)
+        elif self._checkpoint_time not in self._simulation_times:
+            logger.warning(
+                f"No checkpoint is written, since {self._checkpoint_datetime} "
+                "is not one of the simulated times."
+            )
+
+    # Methods for checkpoints.
+    def _datetime_to_sec(self, value: datetime) -> float:
+        """Convert a datetime to the time (s) since the reference datetime."""
+        return (value - self.io.reference_datetime).total_seconds()
+
+    def _save_checkpoint_at_time(self):
+        """Write a checkpoint if the current time is the checkpoint time."""
+        if self._checkpoint_time is not None and self.get_current_time() == self._checkpoint_time:
+            self.save_checkpoint(self._checkpoint_file)
+
+    def get_checkpoint(self) -> Checkpoint:
+        """
+        Get a checkpoint of the current state of the model.
+
+        The checkpoint contains the values of the state vector (except the parameters), the input,
+        the first missing observed elevation and the timeseries
+        in :py:attr:`checkpoint_timeseries`.
+
+        :returns: the checkpoint, see :py:mod:`.checkpoint`.
+        """
+        names = self.get_state_vector_names()
+        state = self.get_vars(names)
+        timeseries = {}
+        for name in self.checkpoint_timeseries:
+            if name in self.io.get_timeseries_names():
+                times, values = self.io.get_timeseries(name)
+                timeseries[name] = (list(times), np.array(values, dtype=float))
+        qmin_end_datetime = None
+        if self._qmin_end_index > 0:
+            t_end = self.times()[0] + self._qmin_end_index * self.get_time_step()
+            qmin_end_datetime = self.io.sec_to_datetime(t_end, self.io.reference_datetime)
+        return Checkpoint(
+            datetime=self.get_current_datetime(),
+            dt=float(self.get_time_step()),
+            variables=names,
+            state=state,
+            model_input=self._input.to_dict(),
+            first_missing_h_observed=getattr(self, "first_missing_Hobs", None),
+            tailwater=self._tailwater,
+            qmin_end_datetime=qmin_end_datetime,
+            timeseries=timeseries,
+        )
+
+    def save_checkpoint(self, path: Union[str, Path]):
+        """
+        Write a checkpoint of the current state of the model.
+
+        A later run can resume from this checkpoint with the restart_checkpoint option,
+        see :py:class:`.ReservoirModel`.
+
+        :param path: path of the checkpoint file (.npz).
+        """
+        write_checkpoint(path, self.get_checkpoint())
+        logger.info(f"Checkpoint at {self.get_current_datetime()} written to {path}.")
+
+    def _restore_checkpoint(self, checkpoint: Checkpoint):
+        """Continue the simulation from the state in a checkpoint."""
+        names = self.get_state_vector_names()
+        if names != checkpoint.variables:
+            raise ValueError("The checkpoint does not match the variables of the model.")
+        if not math.isclose(checkpoint.dt, self.get_time_step()):
+            raise ValueError(
+                f"The time step of the checkpoint ({checkpoint.dt} s) does not match "
+                f"the time step of the model ({self.get_time_step()} s)."
+            )
+        t_restart = self._datetime_to_sec(checkpoint.datetime)
+        times = np.asarray(self.times())
+        if t_restart not in times or t_restart >= times[-1]:
+            raise ValueError(
+                f"The checkpoint datetime {checkpoint.datetime} is not one of the times "
+                "of the model before the end time."
+            )
+        self.set_vars(dict(zip(names, checkpoint.state)))
+        self.set_var("time", t_restart)
+        # The output starts at the checkpoint time.
+        self._simulation_times = [t_restart]
+        for variable in self._io_output_variables:
+            self._io_output[variable] = [self.get_var(variable)]
+        self._input.load_dict(checkpoint.model_input)
+        self._input.validate()
+        # The first missing observation of the current input is used if there is one.
+        if not hasattr(self, "first_missing_Hobs") and checkpoint.first_missing_h_observed:
+            self.first_missing_Hobs = checkpoint.first_missing_h_observed
+        self._tailwater = checkpoint.tailwater
+        if checkpoint.qmin_end_datetime is not None:
+            t_end = self._datetime_to_sec(checkpoint.qmin_end_datetime)
+            self._qmin_end_index = int(np.searchsorted(times, t_end))
+        datetimes = self.io.sec_to_datetime(times, self.io.reference_datetime)
+        for name, (checkpoint_datetimes, checkpoint_values) in checkpoint.timeseries.items():
+            index = {t: i for i, t in enumerate(checkpoint_datetimes)}
+            values = np.array(
+                [checkpoint_values[index[t]] if t in index else np.nan for t in datetimes]
+            )
+            # Timeseries that do not cover the remaining times are computed again by the schemes.
+            if np.isnan(values[times >= t_restart]).any():
+                logger.info(f"Timeseries {name} of the checkpoint does not cover all times.")
+                continue
+            self.set_timeseries(name, values)
+
+    def _create_engine(self) -> ReservoirEngine:
+        """Create the engine for computing timesteps with NumPy."""
+        equations_csv = self._config.get_file("lookup_table_equations.csv", dirs=["model"])
+        if equations_csv is None:
+            raise FileNotFoundError("File lookup_table_equations.csv not found.")
+        return ReservoirEngine.from_csv(
+            lookup_tables=self.numpy_lookup_tables(),
+            equations_csv=equations_csv,
+            dae_residual=self.get_dae_residual_function(),
+        )
+
+    def _update_state(self, dt):
+        if self._engine is None:
+            super()._update_state(dt)
+            return
+        inputs = {var: self.get_var(var) for var in self._engine.input_variables}
+        volume = self.get_var(OutputVar.VOLUME.value)
+        self.set_var("time", self.get_current_time() + dt)
+        state = self._engine.step(volume, inputs, dt)
+        for var, values in state.items():
+            value = float(values[0])
+            if np.isnan(value):
+                message = (
+                    f"Simulation has failed at time {self.get_current_time()}: "
+                    f"the fast engine computed a NaN value for {var}."
+                )
+                logger.error(message)
+                raise ValueError(message)
+            self.set_var(var, value)
 
     def _copy_timeseries(self):
         """Create a copy of timeseries which may be overwritten by the simulation."""
@@ -214,6 +581,37 @@ class ReservoirModel(Model):
             raise ValueError("Do not set variables directly. Use schemes instead.")
         return super().set_var(name, value)
 
+    def get_vars(self, names: Iterable[str]) -> np.ndarray:
+        """
+        Get the values of given variables at the current time.
+
+        This is faster than calling :py:meth:`.ReservoirModel.get_var` for each variable.
+
+        :param names: names of the variables.
+        :returns: array of values of the given variables.
+        """
+        try:
+            values = super().get_vars(names)
+        except KeyError as error:
+            expected_vars = list(InputVar) + list(OutputVar)
+            message = (
+                f"Variable {error.args[0]} not found. Expected var to be one of {expected_vars}."
+            )
+            raise KeyError(message) from error
+        return values
+
+    def set_vars(self, values: Mapping[str, float]):
+        """
+        Set the values of given variables at the current time.
+
+        :param values: dict of variable names and values.
+
+        :meta private:
+        """
+        if not self._allow_set_var:
+            raise ValueError("Do not set variables directly. Use schemes instead.")
+        super().set_vars(values)
+
     def get_current_time(self) -> int:
         """
         Get the current time (in seconds).
@@ -578,6 +976,15 @@ class ReservoirModel(Model):
         if hasattr(self, "_io_output"):
             self.extract_results().update({"rule_curve_deviation_" + h_var: deviations})
 
+    def _get_constant_time_step(self) -> float:
+        """Get the timestep size, assuming a constant timestep if it is not set yet."""
+        dt = self.get_time_step()
+        if dt is None:
+            times = self.times()
+            dt = times[1] - times[0]
+            logger.debug("We assume a constant timestep size of %s", dt)
+        return dt
+
     def calculate_single_cumulative_inflow(
         self,
         start_time: int = None,
@@ -593,11 +1000,7 @@ class ReservoirModel(Model):
             start_time = int(self.get_start_time())
         if end_time is None:
             end_time = int(self.get_current_time())
-        dt = self.get_time_step()
-        if dt is None:
-            times = self.times()
-            dt = times[1] - times[0]
-            logger.debug("We assume a constant timestep size of %s", dt)
+        dt = self._get_constant_time_step()
         if start_time < end_time:
             return sum(self.get_timeseries("Q_in")[start_time : end_time + 1]) * dt
         elif start_time == end_time:
@@ -614,15 +1017,33 @@ class ReservoirModel(Model):
 
         This can be called in ``pre``. Reults are saved to the timeseries
         ``cumulative_inflows``."""
-        inflows = self.get_timeseries("Q_in")
-        cumulative_inflows = np.zeros_like(inflows)
-        for i in range(len(cumulative_inflows)):
-            cumulative_inflows[i] = self.calculate_single_cumulative_inflow(
-                start_time=0, end_time=i
-            )
+        inflows = np.asarray(self.get_timeseries("Q_in"), dtype=float)
+        cumulative_inflows = np.cumsum(inflows) * self._get_constant_time_step()
         self.set_timeseries("cumulative_inflows", cumulative_inflows)
         return cumulative_inflows
 
+    def _get_indicative_elevations(self, q_out_daily_average: float) -> np.ndarray:
+        """
+        Get indicative elevations based on inflows (``Q_in``) and a constant outflow.
+
+        :param q_out_daily_average: The average outflow over a 24 hour period (m^3/s).
+        :returns: array of elevations (m) for each time of the ``Q_in`` timeseries.
+        """
+        q_in_ts = np.asarray(self.get_timeseries("Q_in"), dtype=float)
+        # convert the daily average outflow to a timestep outflow.
+        dt = self._get_constant_time_step()
+        q_out = q_out_daily_average
+        # for each timestep calculate the volume of the reservoir given the inflow and outflow
+        volumes = np.zeros_like(q_in_ts)
+        volumes[0] = self.initial_v
+        volumes[1:] = (q_in_ts[1:] - q_out) * dt
+        volumes = np.cumsum(volumes)
+        # convert volumes to elevations
+        h_from_v = self.numpy_lookup_tables().get("h_from_v")
+        if h_from_v is None:
+            raise ValueError("The lookup table h_from_v is not found.")
+        return h_from_v(volumes)
+
     def get_flood_flag(
         self,
         q_out_daily_average: float,
@@ -638,30 +1059,41 @@ class ReservoirModel(Model):
         :param flood_elevation: The elevation above which flooding occurs (m).
         :returns: A boolean flag indicating whether flooding occurs (True) or not (False).
         """
-        q_in_ts = self.get_timeseries("Q_in")
-        # convert the daily average outflow to a timestep outflow.
-        dt = self.get_time_step()
-        if dt is None:
-            times = self.times()
-            dt = times[1] - times[0]
-            logger.debug("We assume a constant timestep size of %s", dt)
-        q_out = q_out_daily_average
-        # for each timestep calculate the volume of the reservoir given the inflow and outflow
-        volumes = np.zeros_like(q_in_ts)
-        volumes[0] = self.initial_v
-        for i in range(1, len(q_in_ts)):
-            volumes[i] = volumes[i - 1] + (q_in_ts[i] - q_out) * dt
-        # convert volumes to elevations
-        h_from_v = self.lookup_tables().get("h_from_v")
-        if h_from_v is None:
-            raise ValueError("The lookup table h_from_v is not found.")
-        elevations = np.zeros_like(volumes)
-        for i in range(len(volumes)):
-            elevations[i] = h_from_v(volumes[i])
+        elevations = self._get_indicative_elevations(q_out_daily_average)
         # check if any elevation is above the flood elevation
-        flood_flag = any(elevation > flood_elevation for elevation in elevations)
+        flood_flag = bool(np.any(elevations > flood_elevation))
         return flood_flag
 
+    def get_flood_times(
+        self,
+        q_out_daily_average: float,
+        flood_elevations: Iterable[float],
+    ) -> Dict[float, Optional[datetime]]:
+        """Preprocessing step which determines when flooding starts for multiple flood elevations.
+        Can be called during ``pre``.
+
+        Indicative elevations are calculated as in :py:meth:`.ReservoirModel.get_flood_flag`.
+        For each flood elevation, the first time is determined at which
+        an indicative elevation is above the flood elevation.
+
+        :param q_out_daily_average: The average outflow over a 24 hour period (m^3/s).
+        :param flood_elevations: The elevations above which flooding occurs (m).
+        :returns: A dict with for each flood elevation the first time of flooding,
+            or None if no flooding occurs.
+        """
+        elevations = self._get_indicative_elevations(q_out_daily_average)
+        datetimes = self.io.get_timeseries("Q_in")[0]
+        # The running maximum is non-decreasing, so the first exceedance can be found by bisection.
+        max_elevations = np.fmax.accumulate(elevations)
+        flood_times = {}
+        for flood_elevation in flood_elevations:
+            index = np.searchsorted(max_elevations, flood_elevation, side="right")
+            if index < len(max_elevations) and max_elevations[index] > flood_elevation:
+                flood_times[flood_elevation] = datetimes[index]
+            else:
+                flood_times[flood_elevation] = None
+        return flood_times
+
     def adjust_rulecurve(
         self,
         periods: int,
@@ -736,6 +1168,9 @@ class ReservoirModel(Model):
         h_max: Optional[float] = None,
         q_flood: Optional[float] = 0,
         recalculate: bool = False,
+        receding_horizon: bool = False,
+        look_ahead: Optional[int] = None,
+        backend: Union["MinQBackend", str] = "goal_programming",
     ):
         """
         Determine and use outflow with a minimal peak.
@@ -744,6 +1179,23 @@ class ReservoirModel(Model):
         If recalculate is True, the minimzed outflow will be recalculated.
         This is useful if some of the parameters like h_target have changed.
 
+        By default, the outflow is optimized over all times of the model.
+        With receding_horizon, the outflow is optimized from the current state onwards,
+        optionally over a limited number of timesteps (look_ahead).
+        Each optimization is then warm-started with the results of the previous optimization.
+        The outflow is also recalculated when the current time is beyond the look-ahead window.
+        With goal programming and a receding horizon, the minimized peak outflow is bounded
+        instead of fixed for the next priority (goal programming option fix_minimized_values).
+        Fixing it makes the target volume priority degenerate when the minimal peak is zero,
+        for example when there is no inflow over the remaining horizon.
+
+        The optimization problem is solved with goal programming by default.
+        The "nlp" backend solves the same problem, but builds the NLP only once
+        and reuses the solver for all priorities and recalculations (see :py:class:`.QMinNLP`).
+        This is faster, in particular for long horizons and repeated recalculations.
+        The "bisection" backend solves the problem directly without an NLP solver
+        (see :py:mod:`.minq_bisection`), which is the fastest.
+
         :param h_target: float, Iterable[float], str.
             Target elevation. Can be the name of a timeseries.
         :param h_min: float, optional.
@@ -755,7 +1207,18 @@ class ReservoirModel(Model):
             values below the flood discharge are ignored.
         :param recalculate: bool, optional.
             If True, the outflow will be recalculated. Default is False.
+        :param receding_horizon: bool, optional.
+            If True, optimize from the current state onwards. Default is False.
+        :param look_ahead: int, optional.
+            Number of timesteps to optimize when using a receding horizon.
+            Default is None (optimize until the end time).
+        :param backend: str, optional.
+            Method for solving the optimization problem: "goal_programming" (default),
+            "nlp" or "bisection".
         """
+        from rtctools_simulation.reservoir.minq import MinQBackend, QMinParameters
+
+        backend = MinQBackend(backend)
         self._input.outflow.outflow_type = OutflowType.FROM_INPUT
         if self.get_current_time() == self.get_start_time():
             # Q_out at the start time will have no affect, so we can set it to zero.
@@ -763,47 +1226,187 @@ class ReservoirModel(Model):
             self._input.outflow.from_input = 0
             return
         name = "Q_out_minq"
-        if name not in self.io.get_timeseries_names() or recalculate:
+        t_idx = int(np.searchsorted(self.times(), self.get_current_time()))
+        outside_window = receding_horizon and t_idx >= self._qmin_end_index
+        if name not in self.io.get_timeseries_names() or recalculate or outside_window:
             if isinstance(h_target, str):
                 h_target = self.get_timeseries(h_target)
             v_from_h = self.lookup_tables().get("v_from_h")
             if v_from_h is None:
                 raise ValueError("The lookup table v_from_h is not found.")
+            v_target = v_from_h(h_target).toarray().flatten()
+            if receding_horizon:
+                # The optimization starts at the last time with a known state.
+                start_index = t_idx - 1
+                end_index = len(self.times())
+                if look_ahead is not None:
+                    end_index = min(t_idx + look_ahead, end_index)
+                if len(v_target) > 1:
+                    v_target = v_target[start_index:end_index]
+            else:
+                start_index, end_index = 0, None
             params = QMinParameters(
                 v_min=v_from_h(h_min),
                 v_max=v_from_h(h_max),
-                v_target=v_from_h(h_target).toarray().flatten(),
+                v_target=v_target,
                 q_flood=q_flood,
             )
-            self._calculate_qmin(params=params, name=name)
+            self._calculate_qmin(
+                params=params,
+                name=name,
+                start_index=start_index,
+                end_index=end_index,
+                receding_horizon=receding_horizon,
+                backend=backend,
+            )
         q_out = self.timeseries_at(name, self.get_current_time())
         self._input.outflow.from_input = q_out
 
-    def _calculate_qmin(self, params: QMinParameters, name: str):
+    def _calculate_qmin(
+        self,
+        params: "QMinParameters",
+        name: str,
+        start_index: int = 0,
+        end_index: Optional[int] = None,
+        receding_horizon: bool = False,
+        backend: Union["MinQBackend", str] = "goal_programming",
+    ):
         """
         Calculate the optimized outflow for the Q_min scheme.
 
+        The outflow is optimized for the times from start_index to end_index.
         Store the result in the timeseries with the given name.
+        If receding_horizon is True, the optimization is warm-started
+        with the results of the previous calculation.
         """
+        from rtctools_simulation.reservoir.minq import MinQBackend
+
         times_sec = self.times()
-        datetimes = [self.io.sec_to_datetime(t, self.io.reference_datetime) for t in times_sec]
         self._input.outflow.outflow_type = OutflowType.FROM_INPUT
         input_timeseries = self._get_optimization_input_timeseries(times_sec)
+        end_index = len(times_sec) if end_index is None else end_index
+        if backend == MinQBackend.NLP:
+            q_out = self._solve_qmin_nlp(params, input_timeseries, start_index, end_index)
+        elif backend == MinQBackend.BISECTION:
+            q_out = self._solve_qmin_bisection(params, input_timeseries, start_index, end_index)
+        else:
+            q_out = self._solve_qmin_problem(
+                params, input_timeseries, start_index, end_index, receding_horizon
+            )
+        if name in self.io.get_timeseries_names():
+            values = np.array(self.get_timeseries(name), dtype=float)
+        else:
+            values = np.full(len(times_sec), np.nan)
+        values[start_index:end_index] = q_out
+        self.set_timeseries(name, values)
+        self._qmin_end_index = end_index
+
+    def _solve_qmin_problem(
+        self,
+        params: "QMinParameters",
+        input_timeseries: Dict[InputVar, list],
+        start_index: int,
+        end_index: int,
+        receding_horizon: bool,
+    ) -> np.ndarray:
+        """
+        Solve the Q_min optimization problem with goal programming.
+
+        A new problem is created for each optimization, also for a receding horizon.
+        rtc-tools caches the bounds, seed and history on the problem,
+        so a problem cannot be optimized again for another horizon or other parameters.
+        Creating the problem is cheap, since the compiled model is loaded from the pymoca cache;
+        most of the time is spent transcribing and solving the problem.
+        Use the "nlp" or "bisection" backend to avoid this.
+        """
+        from rtctools_simulation.reservoir.minq import QMinProblem
+
+        times_sec = self.times()
+        datetimes = [self.io.sec_to_datetime(t, self.io.reference_datetime) for t in times_sec]
         config = deepcopy(self._config)
         config.set_model("ReservoirMinQ")
+        previous_problem = self._qmin_problem if receding_horizon else None
         problem = QMinProblem(
             config=config,
             datetimes=datetimes,
             params=params,
             input_timeseries=input_timeseries,
+            start_index=start_index,
+            end_index=end_index,
+            previous_results=getattr(previous_problem, "results_timeseries", None),
+            receding_horizon=receding_horizon,
         )
+        if receding_horizon:
+            self._qmin_problem = problem
         success = problem.optimize()
         if not success:
             raise ValueError("Solving minimal peak outflow did not succeed.")
-        results = problem.extract_results()
-        var = OutputVar.Q_OUT.value
-        values = results[var]
-        self.set_timeseries(name, values)
+        return problem.extract_results()[OutputVar.Q_OUT.value]
+
+    def _solve_qmin_nlp(
+        self,
+        params: "QMinParameters",
+        input_timeseries: Dict[InputVar, list],
+        start_index: int,
+        end_index: int,
+    ) -> np.ndarray:
+        """
+        Solve the Q_min optimization problem with a single NLP.
+
+        An NLP is built for each number of optimized times and reused when a horizon
+        of the same length is optimized again, such as the windows of a receding horizon
+        with a look-ahead. Each optimization is warm-started from the last NLP.
+        """
+        from rtctools_simulation.reservoir.minq import QMinNLP
+
+        n_times = end_index - start_index
+        nlp = self._qmin_nlps.get(n_times)
+        if nlp is None:
+            nlp = self._qmin_nlps[n_times] = QMinNLP(n_times)
+        results = nlp.solve(
+            params=params,
+            previous=self._qmin_nlp,
+            **self._get_qmin_data(input_timeseries, start_index, end_index),
+        )
+        self._qmin_nlp = nlp
+        return results[OutputVar.Q_OUT.value]
+
+    def _solve_qmin_bisection(
+        self,
+        params: "QMinParameters",
+        input_timeseries: Dict[InputVar, list],
+        start_index: int,
+        end_index: int,
+    ) -> np.ndarray:
+        """Solve the Q_min optimization problem with bisection and dynamic programming."""
+        results = solve_qmin_bisection(
+            v_min=params.v_min,
+            v_max=params.v_max,
+            v_target=params.v_target,
+            q_flood=params.q_flood,
+            **self._get_qmin_data(input_timeseries, start_index, end_index),
+        )
+        return results[OutputVar.Q_OUT.value]
+
+    def _get_qmin_data(
+        self, input_timeseries: Dict[InputVar, list], start_index: int, end_index: int
+    ) -> dict:
+        """Get the data of the Q_min optimization problem for the fast backends."""
+        times_sec = self.times()
+        volume = input_timeseries[OutputVar.VOLUME]
+        q_in = input_timeseries[InputVar.Q_IN]
+        q_out_initial = None
+        if start_index > 0:
+            # Like goal programming, use the outflow that follows from the volume history.
+            dt = times_sec[start_index] - times_sec[start_index - 1]
+            dv = volume[start_index] - volume[start_index - 1]
+            q_out_initial = q_in[start_index] - dv / dt
+        return {
+            "times": times_sec[start_index:end_index],
+            "v_initial": volume[start_index],
+            "q_in": q_in[start_index:end_index],
+            "q_out_initial": q_out_initial,
+        }
 
     def _get_optimization_input_timeseries(self, times_sec: List[int]) -> Dict[str, list]:
         """Get timeseries to use for optimization."""
@@ -834,14 +1437,16 @@ class ReservoirModel(Model):
 
         :meta private:
         """
-        self._input = Input()
-        self._input.volume.h_observed = self.get_var(InputVar.H_OBSERVED.value)
-        self._input.inflow = self.get_var(InputVar.Q_IN.value)
-        self._input.rain_evap.mm_evaporation_per_hour = self.get_var("mm_evaporation_per_hour")
-        self._input.rain_evap.mm_rain_per_hour = self.get_var("mm_rain_per_hour")
-        self._input.outflow.components.turbine = self.get_var("Q_turbine")
-        self._input.outflow.components.sluice = self.get_var("Q_sluice")
-        self._input.outflow.from_input = self.get_var("Q_out_from_input")
+        self._input.reset()
+        (
+            self._input.volume.h_observed,
+            self._input.inflow,
+            self._input.rain_evap.mm_evaporation_per_hour,
+            self._input.rain_evap.mm_rain_per_hour,
+            self._input.outflow.components.turbine,
+            self._input.outflow.components.sluice,
+            self._input.outflow.from_input,
+        ) = self.get_vars(_DEFAULT_INPUT_VARS).tolist()
         self._input.day = self.get_current_datetime().day
 
     def apply_schemes(self):
@@ -884,12 +1489,11 @@ class ReservoirModel(Model):
 
     def _set_modelica_input(self):
         """Set the Modelica input variables."""
-        # Validate model input.
-        self._input = Input(**self._input.model_dump())
+        # Validate the model input that has changed.
+        self._input.validate()
         # Set Modelica inputs.
         modelica_vars = input_to_dict(self._input)
-        for var, value in modelica_vars.items():
-            self.set_var(var.value, value)
+        self.set_vars(dict(zip(_MODELICA_INPUT_VARS, modelica_vars.values())))
 
     # Plotting
     def get_output_variables(self):
@@ -971,6 +1575,18 @@ class ReservoirModel(Model):
         )
         self._set_q(target_variable.value, target_value)
 
+    def get_setq_cache_statistics(self) -> Dict[str, int]:
+        """
+        Get the number of cache hits and misses of timeseries lookups in
+        :py:meth:`.ReservoirModel.set_q`.
+
+        Reductions (MEAN/MIN/MAX) and indices of missing values of a timeseries
+        are cached until the values of the timeseries change.
+
+        :returns: dict with the number of "hits" and "misses".
+        """
+        return self._setq_cache.statistics()
+
     def find_maxq(self, discharge_relation: str, solve_guess: Optional[float] = np.nan):
         """
         Utility to calculate the theoretical maximum discharge out of the reservoir.
@@ -991,11 +1607,13 @@ class ReservoirModel(Model):
                   curve). maxq is calculated by determining Qspill based on the simulated elvation,
                   and then using a solver to determine the intersection of the remaining lookup
                   tables using the function ``_find_maxq_tailwater``.
+                  If the model is created with ``maxq_h_step``, maxq is interpolated from
+                  a precomputed curve instead, see :py:meth:`.ReservoirModel.get_maxq_curve`.
 
         :param solve_guess: Optional[float] (default: np.nan)
-            Initial guess for the solver when using the 'Tailwater' method. Defaults to current
-            reservoir elevation in the supporting function
-            :py:meth:`.ReservoirModel._find_maxq_tailwater` when it is np.nan.
+            Initial guess for the solver when using the 'Tailwater' method. Defaults to the
+            tailwater elevation of the previous call, or the current reservoir elevation
+            for the first call, when it is np.nan.
 
         This utility can be applied inside :py:meth:`.ReservoirModel.apply_schemes`.
         """
@@ -1034,8 +1652,6 @@ class ReservoirModel(Model):
                 )
             maxq = self.parameters()["Reservoir_Qmax"]
         elif discharge_relation == "Tailwater":
-            if np.isnan(solve_guess):
-                solve_guess = latest_h
             maxq = self._find_maxq_tailwater(latest_h, solve_guess)
         elif discharge_relation == "Elevation_Qmax_LUT":
             try:
@@ -1050,6 +1666,51 @@ class ReservoirModel(Model):
             maxq = qmax_from_h(latest_h)
         return max(0, maxq)
 
+    def get_maxq_curve(self) -> Optional[MaxQCurve]:
+        """
+        Get the precomputed maximum discharge curve of the 'Tailwater' relation.
+
+        The curve is only computed if the model is created with ``maxq_h_step``.
+        Its attribute ``max_error`` is the maximum interpolation error
+        with respect to the exact solver.
+
+        :returns: :py:class:`~rtctools_simulation.reservoir.maxq.MaxQCurve`,
+            or None if no curve has been computed.
+        """
+        return self._maxq_curve
+
+    def _create_maxq_curve(self):
+        """Precompute the maximum discharge of the 'Tailwater' relation."""
+        h_coordinates = self.numpy_lookup_table("v_from_h").coordinates[0]
+        self._maxq_curve = MaxQCurve(
+            self._get_tailwater_solver(),
+            h_min=h_coordinates[0],
+            h_max=h_coordinates[-1],
+            h_step=self._maxq_h_step,
+        )
+        logger.info(
+            f"Precomputed maxq curve with {len(self._maxq_curve.h)} elevations"
+            f" between {h_coordinates[0]} and {h_coordinates[-1]},"
+            f" maximum interpolation error {self._maxq_curve.max_error:.3e} m^3/s."
+        )
+
+    def _get_tailwater_solver(self) -> TailwaterSolver:
+        """Get the tailwater solver, which is created once."""
+        if self._tailwater_solver is None:
+            try:
+                self._tailwater_solver = TailwaterSolver(
+                    qspill_from_h=self.numpy_lookup_table("qspill_from_h"),
+                    qnotspill_from_dh=self.numpy_lookup_table("qnotspill_from_dh"),
+                    qtw_from_tw=self.numpy_lookup_table("qtw_from_tw"),
+                )
+            except KeyError as e:
+                logger.warning(
+                    "Utility find_maxq is not able to compute spill from h."
+                    "Not all required lookup tables are found."
+                )
+                raise ValueError("find_maxq: Not all lookup tables are present") from e
+        return self._tailwater_solver
+
     def _find_maxq_tailwater(self, latest_h: float, solve_guess: float):
         """
         Supporting function for utility ``find_maxq``. Requires presence of 3 lookup tables.
@@ -1057,34 +1718,31 @@ class ReservoirModel(Model):
             - ``qnotspill_from_dh``: Maximum non-spillway discharge as a function of head difference
             - ``qtw_from_tw``: Downstream discharge as function of tailwater elevation.
 
+        The tailwater elevation is solved with
+        :py:class:`~rtctools_simulation.reservoir.maxq.TailwaterSolver`,
+        which is created once and stored on the model.
+
         :param latest_h: float
             Current reservoir elevation
 
         :param solve_guess: float
-            Initial TW elevation guess for increased solver performance.
+            Initial TW elevation guess, used as warm start of the solver.
+            Defaults to the previous tailwater elevation when it is np.nan.
         """
-        try:
-            qs_from_h = self.lookup_tables().get("qspill_from_h")
-            qnotspill_from_dh = self.lookup_tables().get("qnotspill_from_dh")
-            qtw_from_tw = self.lookup_tables().get("qtw_from_tw")
-        except Exception as e:
-            logger.warning(
-                f" At timestep {self.get_current_datetime()}:"
-                f"Utility find_maxq is not able to compute spill from h."
-                f"Not all required lookup tables are found."
-            )
-            raise ValueError("find_maxq: Not all lookup tables are present") from e
+        if self._maxq_curve is not None and self._maxq_curve.contains(latest_h):
+            return max(0, self._maxq_curve(latest_h))
+        if np.isnan(solve_guess):
+            solve_guess = latest_h if self._tailwater is None else self._tailwater
+        solver = self._get_tailwater_solver()
+        self._tailwater, qmax = solver.solve(latest_h, solve_guess)
+        return max(0, qmax)
 
-        q_spill = qs_from_h(latest_h)
 
-        def qmax_func(tw_solve, h_res, q_spill):
-            tw = tw_solve[0]  # fsolve passes arrays
-            q_upstream = qnotspill_from_dh(h_res - tw) + q_spill  ## Water release needs to equal
-            q_downstream = qtw_from_tw(tw)  ## Downstream water flux
-            return [float(q_upstream - q_downstream)]  # fsolve wants arrays
+class ReservoirModel(Model, HeadlessReservoirModel):
+    """
+    Class for a reservoir model.
 
-        result = scipy.optimize.fsolve(
-            lambda tw: qmax_func(tw, latest_h, q_spill), x0=[solve_guess]
-        )
-        qmax = qtw_from_tw(result)
-        return max(0, qmax)
+    The results are plotted after simulating as described by input/plot_table.csv,
+    see :py:class:`.Model`.
+    See :py:class:`HeadlessReservoirModel` for a reservoir model without plotting.
+    """
@@ -1,7 +1,6 @@
 from typing import Union
 
 import numpy as np
-import pandas as pd
 
 
 def read_reservoir_data(
@@ -44,6 +43,8 @@ def read_reservoir_data(
         volume setpoints
     """
 
+    import pandas as pd
+
     res_df = pd.read_csv(reservoirs_csv_path, sep=None, index_col=0, engine="python")
     vh_data_df = pd.read_csv(volume_level_csv_path, sep=None, index_col=0, engine="python")
     va_data_df = pd.read_csv(volume_area_csv_path, sep=None, index_col=0, engine="python")
@@ -4,6 +4,7 @@ Rule curve module for reservoir operation.
 """
 
 import logging
+import warnings
 from typing import Optional
 
 import numpy as np
@@ -43,6 +44,10 @@ def rule_curve_discharge(
     return min(required_flow, q_max)
 
 
+#: Methods for computing moving averages in :func:`rule_curve_deviation`.
+MOVING_AVERAGE_METHODS = ["cumsum", "sliding_window"]
+
+
 def rule_curve_deviation(
     observed_elevations: np.ndarray,
     rule_curve: np.ndarray,
@@ -50,14 +55,19 @@ def rule_curve_deviation(
     inflows: Optional[np.ndarray] = None,
     qin_max: float = np.inf,
     maximum_difference: float = np.inf,
+    method: str = "cumsum",
 ) -> np.ndarray:
     """
     Computes a moving average of the deviation between the observed pool elevation and
     the rule curve elevation. Deviations at timesteps where the inflow exceeds the maximum inflow
     are set to 0. Deviations that exceed the maximum deviation are also set to the 0.
 
+    The observed elevations can be a 2-D array with one elevation trace per row,
+    for example one row per ensemble member.
+    The moving average is then computed for each row.
+
     :param observed_elevations: np.ndarray
-        The observed pool elevations [m].
+        The observed pool elevations [m], with time along the last axis.
     :param rule_curve: np.ndarray
         The rule curve [m].
     :param periods: int
@@ -68,13 +78,30 @@ def rule_curve_deviation(
         The maximum inflow.
     :param maximum_difference: float (optional)
         The maximum absolute deviation per timestep.
+    :param method: str (optional)
+        Method for computing the moving average. Options are
 
-    :return: np.ndarray (same shape as rule_curve)
+            - "cumsum": use cumulative sums of the deviations (default).
+              This takes time and memory proportional to the number of timesteps,
+              but the averages can differ in the last digits from averaging each window
+              separately, due to rounding.
+            - "sliding_window": average over windows of
+              ``numpy.lib.stride_tricks.sliding_window_view``.
+              The averages are identical to averaging each window separately,
+              but each window is copied, which takes time and memory
+              proportional to the number of timesteps times the number of periods.
+
+    :return: np.ndarray (broadcast shape of the observed elevations and the rule curve)
         The average deviation for each timestep.
     """
+    if method not in MOVING_AVERAGE_METHODS:
+        raise ValueError(
+            f"Method {method} is not supported. Choose one of {MOVING_AVERAGE_METHODS}."
+        )
+    observed_elevations = np.asarray(observed_elevations, dtype=float)
     if periods < 1:
         raise ValueError("The number of periods should be at least 1.")
-    if periods > len(observed_elevations):
+    if periods > observed_elevations.shape[-1]:
         raise ValueError(
             "The number of periods cannot be larger than the number of observed elevations."
         )
@@ -87,14 +114,55 @@ def rule_curve_deviation(
     if inflows is not None:
         deviation_array = np.where(inflows > qin_max, 0, deviation_array)
 
-    average_deviation = np.full(len(rule_curve), np.nan)
-    for i in range(periods, len(observed_elevations) + 1):
-        if not np.sum(np.isnan(deviation_array[i - periods : i])) > (periods / 2):
-            average_deviation[i - 1] = np.nanmean(deviation_array[i - periods : i])
-        else:  ## Check for count of missing data in moving window
-            average_deviation[i - 1] = 0
-            logger.warning(
-                "Rule_curve_deviation: more than half of observed elevations in "
-                f'moving window of size {periods} are missing, deviation defaults to value of "0"'
-            )
+    if method == "cumsum":
+        window_means, window_missing = _moving_average_cumsum(deviation_array, periods)
+    else:
+        window_means, window_missing = _moving_average_sliding_window(deviation_array, periods)
+    ## Check for count of missing data in moving window
+    too_many_missing = window_missing > (periods / 2)
+    n_too_many_missing = np.count_nonzero(too_many_missing)
+    if n_too_many_missing > 0:
+        logger.warning(
+            "Rule_curve_deviation: more than half of observed elevations are missing in "
+            f"{n_too_many_missing} moving window(s) of size {periods}, "
+            'deviation defaults to value of "0" for these windows'
+        )
+    average_deviation = np.full(deviation_array.shape, np.nan)
+    average_deviation[..., periods - 1 :] = np.where(too_many_missing, 0, window_means)
     return average_deviation
+
+
+def _moving_average_cumsum(values: np.ndarray, periods: int):
+    """
+    Compute moving averages with cumulative sums, ignoring missing values.
+
+    :returns: the average and the number of missing values of each window.
+    """
+    is_valid = ~np.isnan(values)
+    cumsum_shape = values.shape[:-1] + (1,)
+    values_sum = np.concatenate(
+        [np.zeros(cumsum_shape), np.cumsum(np.where(is_valid, values, 0), axis=-1)], axis=-1
+    )
+    valid_count = np.concatenate(
+        [np.zeros(cumsum_shape, dtype=int), np.cumsum(is_valid, axis=-1)], axis=-1
+    )
+    window_sum = values_sum[..., periods:] - values_sum[..., :-periods]
+    window_count = valid_count[..., periods:] - valid_count[..., :-periods]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        window_mean = window_sum / window_count
+    return window_mean, periods - window_count
+
+
+def _moving_average_sliding_window(values: np.ndarray, periods: int):
+    """
+    Compute moving averages with sliding windows, ignoring missing values.
+
+    :returns: the average and the number of missing values of each window.
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(values, periods, axis=-1)
+    window_missing = np.sum(np.isnan(windows), axis=-1)
+    with warnings.catch_warnings():
+        # Windows without valid values give a warning for an empty slice.
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        window_mean = np.nanmean(windows, axis=-1)
+    return window_mean, window_missing
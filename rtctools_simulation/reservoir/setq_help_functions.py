@@ -3,9 +3,12 @@ SetQ module for reservoir operation.
 ------------------------------------
 """
 
+import functools
 import logging
+from typing import Dict, Tuple
 
 import numpy as np
+from rtctools.data.storage import DataStore
 from rtctools.simulation.simulation_problem import SimulationProblem
 
 logger = logging.getLogger("rtctools")
@@ -15,27 +18,60 @@ class NoDataException(Exception):  ## noqa N818
     pass
 
 
-def _find_prev_value(input_data, timestep, method="PREV"):
+class NanIndex:
+    """
+    Index of the previous and next non-NaN value for each position of a timeseries.
+
+    The index is built once per timeseries, after which
+    :func:`_find_nonnan_value` takes constant time per lookup.
+    """
+
+    def __init__(self, input_data):
+        """
+        Build the index.
+
+        :param input_data: timeseries (list or array)
+        """
+        values = np.asarray(input_data, dtype=float)
+        size = len(values)
+        positions = np.arange(size)
+        is_valid = ~np.isnan(values)
+        last_valid = np.maximum.accumulate(np.where(is_valid, positions, -1))
+        first_valid = np.minimum.accumulate(np.where(is_valid, positions, size)[::-1])[::-1]
+        self.values = values
+        self.has_valid = bool(np.any(is_valid))
+        #: Position of the last non-NaN value before each position, or -1.
+        self.prev_valid = np.concatenate([[-1], last_valid[:-1]]).astype(int)
+        #: Position of the first non-NaN value after each position, or the timeseries size.
+        self.next_valid = np.concatenate([first_valid[1:], [size]]).astype(int)
+
+    def has_prev_value(self, timestep: int) -> bool:
+        """Check if there is a non-NaN value before the given timestep."""
+        return self.prev_valid[timestep] >= 0
+
+    def has_next_value(self, timestep: int) -> bool:
+        """Check if there is a non-NaN value after the given timestep."""
+        return self.next_valid[timestep] < len(self.values)
+
+
+def _find_prev_value(nan_index: NanIndex, timestep, method="PREV"):
     """Function to find the previous non-nan data point from the given timeseries
-    :param input_data: timeseries (list)
+    :param nan_index: index of non-NaN values of the timeseries (NanIndex)
     :param timestep: timestep (index) at which to start within input_data (int)
-    :param method: direction to search for the data point. If 'NEXT', we reverse the operation
+    :param method: direction to search for the data point. If 'NEXT', we search forward
 
     :return: previous non-NaN data point from the given timeseries
     """
-    if method == "NEXT":  ## Invert input_data and remap t to the mirrored end of the timeseries
-        input_data = input_data[::-1]
-        timestep = len(input_data) - 1 - timestep
-    target_value = np.nan
-    i = 0  ## Iterable that will be deducted from timestep
-    while np.isnan(target_value):
-        i += 1
-        if (timestep - i) >= 0:
-            target_value = input_data[timestep - i]
-        else:
-            error_msg = "setq: There is no valid value in the timeseries with this nan_option"
-            raise NoDataException(error_msg)
-    res = {"value": target_value, "dist": i}
+    if method == "NEXT":
+        found = nan_index.has_next_value(timestep)
+        index = int(nan_index.next_valid[timestep])
+    else:
+        found = nan_index.has_prev_value(timestep)
+        index = int(nan_index.prev_valid[timestep])
+    if not found:
+        error_msg = "setq: There is no valid value in the timeseries with this nan_option"
+        raise NoDataException(error_msg)
+    res = {"value": nan_index.values[index], "dist": abs(timestep - index)}
     return res
 
 
@@ -58,31 +94,27 @@ def _find_closest_value(back: dict, fwd: dict):
     return target_value
 
 
-def _find_back_and_fwd(input_data: list, timestep: int):
+def _find_back_and_fwd(nan_index: NanIndex, timestep: int):
     """function to catch unique case of data only available on 1 side of t, without breaking
 
-    :param input_data
+    :param nan_index
     :param timestep
     :returns:
 
     """
     ## Needs to catch unique case of data only available on 1 side of t, without breaking.
-    if not all(
-        np.isnan(input_data[timestep:])
-    ):  ## If fwd has no data, appoint bwd to the variable.
-        fwd = _find_prev_value(input_data, timestep, "NEXT")
+    if nan_index.has_next_value(timestep):  ## If fwd has no data, appoint bwd to the variable.
+        fwd = _find_prev_value(nan_index, timestep, "NEXT")
     else:
-        fwd = _find_prev_value(input_data, timestep, "PREV")
-    if not all(
-        np.isnan(input_data[:timestep])
-    ):  ## If bwd has no data, appoint fwd to the variable.
-        back = _find_prev_value(input_data, timestep, "PREV")
+        fwd = _find_prev_value(nan_index, timestep, "PREV")
+    if nan_index.has_prev_value(timestep):  ## If bwd has no data, appoint fwd to the variable.
+        back = _find_prev_value(nan_index, timestep, "PREV")
     else:
         back = fwd
     return back, fwd
 
 
-def _find_nonnan_value(input_data, timestep: int = None, method="CLOSEST"):
+def _find_nonnan_value(input_data, timestep: int = None, method="CLOSEST", nan_index=None):
     """
     Function that allows the user to find a suitable (non-NaN) value in the supplied timeseries.
 
@@ -94,15 +126,19 @@ def _find_nonnan_value(input_data, timestep: int = None, method="CLOSEST"):
             - 'NEXT': Finds the closest value that occurred after the given timestep
             - 'INTERP': Interpolates between the two closest valid timesteps. If only
               data is available to one side of 't', return closest value
+    :param nan_index: NanIndex (optional)
+        Index of non-NaN values of input_data. It is built from input_data if not given.
     :return: target_value
         This is
     """
-    if all(np.isnan(input_data)):
+    if nan_index is None:
+        nan_index = NanIndex(input_data)
+    if not nan_index.has_valid:
         raise NoDataException("Target_data is completely NaN")
     if method in ["PREV", "NEXT"]:
-        target_value = _find_prev_value(input_data, timestep, method)["value"]
+        target_value = _find_prev_value(nan_index, timestep, method)["value"]
     elif method in ["CLOSEST", "INTERP"]:
-        back, fwd = _find_back_and_fwd(input_data, timestep)
+        back, fwd = _find_back_and_fwd(nan_index, timestep)
 
         if back["value"] == fwd["value"]:
             target_value = back["value"]
@@ -118,6 +154,103 @@ def _find_nonnan_value(input_data, timestep: int = None, method="CLOSEST"):
     return target_value
 
 
+def _reduce_timeseries(input_data, apply_func: str) -> float:
+    """Reduce a timeseries to a single value, excluding nan-values."""
+    if apply_func == "MEAN":
+        return np.nanmean(input_data)
+    if apply_func == "MIN":
+        return np.nanmin(input_data)
+    if apply_func == "MAX":
+        return np.nanmax(input_data)
+    raise ValueError(f"setq: reduction {apply_func} is not supported")
+
+
+class VersionedDataStore(DataStore):
+    """
+    Data store that counts how often each timeseries has been set.
+
+    The version of a timeseries is increased by each call of
+    :py:meth:`set_timeseries` or :py:meth:`set_timeseries_sec`,
+    such that caches can detect new values without reading them.
+    """
+
+    def __init__(self, accessor):
+        super().__init__(accessor)
+        self._timeseries_versions: Dict[str, int] = {}
+
+    def timeseries_version(self, variable: str) -> int:
+        """Get the number of times that a timeseries has been set."""
+        return self._timeseries_versions.get(variable, 0)
+
+    def set_timeseries(self, variable: str, *args, **kwargs) -> None:
+        super().set_timeseries(variable, *args, **kwargs)
+        self._timeseries_versions[variable] = self.timeseries_version(variable) + 1
+
+    def set_timeseries_sec(self, variable: str, *args, **kwargs) -> None:
+        super().set_timeseries_sec(variable, *args, **kwargs)
+        self._timeseries_versions[variable] = self.timeseries_version(variable) + 1
+
+
+class SetqCache:
+    """
+    Cache for setq lookups in timeseries of a model.
+
+    The cache contains reductions (MEAN/MIN/MAX) and NaN indices of timeseries,
+    stored by timeseries name together with the version of the timeseries,
+    see :py:class:`VersionedDataStore`.
+    A lookup only compares versions and does not read the values.
+    Values that are modified in place are only detected after they are set again
+    with set_timeseries.
+
+    The number of cache hits and misses is counted, see :py:meth:`statistics`.
+    """
+
+    def __init__(self):
+        self._nan_indices: Dict[str, Tuple[int, NanIndex]] = {}
+        self._reductions: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_nan_index(self, name: str, values, version: int) -> NanIndex:
+        """
+        Get the index of non-NaN values of a timeseries.
+
+        :param name: name of the timeseries.
+        :param values: values of the timeseries, only read if the index is not cached.
+        :param version: version of the timeseries.
+        """
+        entry = self._nan_indices.get(name)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        nan_index = NanIndex(values)
+        self._nan_indices[name] = (version, nan_index)
+        return nan_index
+
+    def get_reduction(self, name: str, version: int, values, apply_func: str) -> float:
+        """
+        Get a reduction (MEAN/MIN/MAX) of a timeseries.
+
+        :param name: name of the timeseries.
+        :param version: version of the timeseries.
+        :param values: values of the timeseries, only read if the reduction is not cached.
+        :param apply_func: reduction.
+        """
+        entry = self._reductions.get((name, apply_func))
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = _reduce_timeseries(values, apply_func)
+        self._reductions[(name, apply_func)] = (version, value)
+        return value
+
+    def statistics(self) -> dict:
+        """Get the number of cache hits and misses."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
 def _getq_from_ts(
     input_data=None,
     timestep: int = None,
@@ -125,6 +258,8 @@ def _getq_from_ts(
     target_variable: str = "Q_release",
     apply_func="MEAN",
     nan_option=None,
+    nan_index: NanIndex = None,
+    reduce=_reduce_timeseries,
 ):
     if apply_func == "INST":
         target_value = input_data[timestep]
@@ -137,18 +272,14 @@ def _getq_from_ts(
                 logger.error(error_msg)
                 raise NoDataException(error_msg)
             elif nan_option in ["PREV", "NEXT", "CLOSEST", "INTERP"]:
-                target_value = _find_nonnan_value(input_data, timestep, nan_option)
+                target_value = _find_nonnan_value(input_data, timestep, nan_option, nan_index)
             elif nan_option == "MEAN":
-                target_value = np.nanmean(input_data)
+                target_value = reduce(input_data, "MEAN")
             else:
                 raise Exception("There is no suitable nan_option selected")
     ## If apply_func != INST, we can do simple operations on input_data.
-    elif apply_func == "MEAN":
-        target_value = np.nanmean(input_data)
-    elif apply_func == "MIN":
-        target_value = np.nanmin(input_data)
-    elif apply_func == "MAX":
-        target_value = np.nanmax(input_data)
+    elif apply_func in ["MEAN", "MIN", "MAX"]:
+        target_value = reduce(input_data, apply_func)
     else:
         error_msg = f'setq: selected apply_func : "{apply_func}" is not recognized'
         logger.error(error_msg)
@@ -231,6 +362,14 @@ def getq(
     """
     target_variable = target_variable.name
     target_value = np.nan  ## Set as default result
+    ## Timeseries lookups are cached if the model has a cache and the input is a timeseries name.
+    cache: SetqCache = getattr(model, "_setq_cache", None)
+    use_cache = (
+        cache is not None
+        and isinstance(model.io, VersionedDataStore)
+        and isinstance(input_data, str)
+        and input_type == "timeseries"
+    )
     ## Checks to process input_data into a consistent format (list/single value)
     input_data, input_data_name, target_value = _preprocess_input_setq(
         model, target_value, target_variable, input_type, input_data
@@ -239,8 +378,22 @@ def getq(
         ## If no t is given, default to current timestep
         timestep = int(model.get_current_time() // model.get_time_step())
     if input_type == "timeseries":
+        nan_index = None
+        reduce = _reduce_timeseries
+        if use_cache:
+            version = model.io.timeseries_version(input_data_name)
+            reduce = functools.partial(cache.get_reduction, input_data_name, version)
+            if nan_option in ["PREV", "NEXT", "CLOSEST", "INTERP"]:
+                nan_index = cache.get_nan_index(input_data_name, input_data, version)
         target_value = _getq_from_ts(
-            input_data, timestep, input_data_name, target_variable, apply_func, nan_option
+            input_data,
+            timestep,
+            input_data_name,
+            target_variable,
+            apply_func,
+            nan_option,
+            nan_index,
+            reduce,
         )
     elif input_type == "parameter":
         target_value = _setq_from_parameter(
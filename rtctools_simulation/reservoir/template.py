@@ -3,8 +3,6 @@ import logging
 from distutils.dir_util import copy_tree
 from pathlib import Path
 
-from jinja2 import Environment, FileSystemLoader
-
 logger = logging.getLogger("rtctools")
 
 SOURCE_DIR = Path(__file__).parent.resolve() / "template_data"
@@ -20,6 +18,8 @@ def convert_to_camel_case(name: str):
 
 def render_reservoir_file(template_file: Path, reservoir_name: str):
     """Render a reservoir template file."""
+    from jinja2 import Environment, FileSystemLoader
+
     template_file = Path(template_file).resolve()
     py_file = template_file.with_suffix(".py")
     environment = Environment(
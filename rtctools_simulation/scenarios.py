@@ -0,0 +1,251 @@
+"""
+Module for running multiple scenarios in parallel.
+
+Each scenario is a model configuration (:py:class:`~rtctools_simulation.model_config.ModelConfig`)
+that is simulated in a pool of worker processes.
+Results are returned as soon as a scenario has finished.
+"""
+
+import functools
+import importlib
+import importlib.util
+import logging
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import deepcopy
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Type, Union
+
+import numpy as np
+
+from rtctools_simulation.model import HeadlessModel
+from rtctools_simulation.model_config import ModelConfig
+
+logger = logging.getLogger("rtctools")
+
+
+@dataclass
+class ScenarioResult:
+    """
+    Result of a single scenario.
+
+    :param index: index of the scenario in the list of configurations.
+    :param config: configuration of the scenario.
+    :param success: True if the scenario was simulated without errors.
+    :param results: dict of output variables and their values, None if the scenario failed.
+    :param error: traceback of the error if the scenario failed, None otherwise.
+    :param worker: process id of the worker that ran the scenario.
+    :param build_time: time (s) to create the model.
+    :param simulate_time: time (s) to simulate the model.
+    :param phase_times: time (s) of each phase of the simulation,
+        see :py:func:`simulate_with_phase_times`.
+    """
+
+    index: int
+    config: ModelConfig
+    success: bool
+    results: Optional[Dict[str, np.ndarray]] = None
+    error: Optional[str] = None
+    worker: Optional[int] = None
+    build_time: float = 0.0
+    simulate_time: float = 0.0
+    phase_times: Dict[str, float] = field(default_factory=dict)
+
+
+@functools.lru_cache(maxsize=None)
+def load_model_class(class_path: str) -> Type[HeadlessModel]:
+    """
+    Load a model class from a class path.
+
+    :param class_path: either '<module>:<class>', for example 'my_package.my_module:MyModel',
+        or '<file>:<class>', for example 'path/to/model.py:MyModel'.
+
+    :returns: the model class.
+    """
+    module_path, separator, class_name = class_path.rpartition(":")
+    if not separator or not module_path or not class_name:
+        raise ValueError(f"Class path {class_path} should have the form <module>:<class>.")
+    if module_path.endswith(".py"):
+        file = Path(module_path).resolve()
+        if not file.is_file():
+            raise FileNotFoundError(f"Model file {file} not found.")
+        spec = importlib.util.spec_from_file_location(file.stem, file)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(module_path)
+    model_class = getattr(module, class_name, None)
+    if not isinstance(model_class, type) or not issubclass(model_class, HeadlessModel):
+        raise ValueError(f"{class_name} in {module_path} is not a model class.")
+    return model_class
+
+
+def simulate_with_phase_times(model: HeadlessModel) -> Dict[str, float]:
+    """
+    Simulate a model and measure the time of each phase.
+
+    The phases are the same as in :py:meth:`SimulationProblem.simulate`:
+    'pre' (reading the input), 'initialize', 'run' (all timesteps)
+    and 'post' (writing the output).
+
+    :returns: dict of phases and their times (s).
+    """
+    phase_times = {}
+    start = time.perf_counter()
+    model.pre()
+    phase_times["pre"] = time.perf_counter() - start
+    start = time.perf_counter()
+    model.initialize()
+    phase_times["initialize"] = time.perf_counter() - start
+    start = time.perf_counter()
+    while model.get_current_time() < model.get_end_time():
+        model.update(-1)
+    phase_times["run"] = time.perf_counter() - start
+    start = time.perf_counter()
+    model.post()
+    phase_times["post"] = time.perf_counter() - start
+    return phase_times
+
+
+def _warm_up_worker(
+    model_class: Union[Type[HeadlessModel], str], config: ModelConfig, kwargs: dict
+):
+    """
+    Create a model and discard it.
+
+    This loads the model class, compiles the model if it has not been compiled yet
+    and fills the lookup table caches of the worker process.
+    """
+    if isinstance(model_class, str):
+        model_class = load_model_class(model_class)
+    model_class(config=deepcopy(config), **kwargs)
+
+
+def _initialize_worker(
+    log_level: int,
+    model_class: Union[Type[HeadlessModel], str, None] = None,
+    config: Optional[ModelConfig] = None,
+    kwargs: Optional[dict] = None,
+):
+    """Set up logging and warm up the caches of a worker process."""
+    if not logger.hasHandlers():
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    logger.setLevel(log_level)
+    if model_class is None:
+        return
+    try:
+        _warm_up_worker(model_class, config, kwargs or {})
+    except Exception:
+        # The scenario with this configuration reports the error.
+        logger.debug("Warming up the worker failed.", exc_info=True)
+
+
+def _run_scenario(
+    model_class: Union[Type[HeadlessModel], str],
+    index: int,
+    config: ModelConfig,
+    kwargs: dict,
+    return_results: bool = True,
+) -> ScenarioResult:
+    """Create and simulate a model for a single scenario."""
+    result = ScenarioResult(index=index, config=config, success=False, worker=os.getpid())
+    start = time.perf_counter()
+    try:
+        if isinstance(model_class, str):
+            model_class = load_model_class(model_class)
+        model = model_class(config=config, **kwargs)
+        result.build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        result.phase_times = simulate_with_phase_times(model)
+        result.simulate_time = time.perf_counter() - start
+        if return_results:
+            output = model.extract_results()
+            result.results = {var: np.array(values) for var, values in output.items()}
+        result.success = True
+    except Exception:
+        result.error = traceback.format_exc()
+    return result
+
+
+def run_scenarios(
+    model_class: Union[Type[HeadlessModel], str],
+    configs: Iterable[ModelConfig],
+    workers: Optional[int] = None,
+    log_level: int = logging.WARNING,
+    return_results: bool = True,
+    **kwargs,
+) -> Iterator[ScenarioResult]:
+    """
+    Simulate a model for multiple configurations in parallel.
+
+    When a worker process starts, it creates a model for the first configuration
+    and discards it.
+    This compiles the model if needed and fills the lookup table caches of the worker,
+    so the lookup tables are not read again for each scenario.
+    Each scenario still creates, initializes and simulates its own model.
+
+    Scenarios are isolated: if a scenario fails, the error is stored in its result
+    and the remaining scenarios continue.
+    Scenarios should write to different output folders.
+
+    .. note:: The model class should be importable by the worker processes,
+        so it should be defined at the top level of a module.
+        Alternatively, a class path can be given, which is loaded by each worker.
+
+    :param model_class: model class, for example a subclass of
+        :py:class:`~rtctools_simulation.reservoir.model.ReservoirModel`,
+        or a class path, see :py:func:`load_model_class`.
+    :param configs: model configurations, one for each scenario.
+    :param workers: number of worker processes. Defaults to the number of processors.
+        If 0, the scenarios are run one by one in the current process.
+    :param log_level: log level of the worker processes.
+    :param return_results: if False, the results are not returned,
+        which avoids sending them from the workers when only the output files are needed.
+    :param kwargs: additional keyword arguments to create each model.
+
+    :returns: iterator of :py:class:`ScenarioResult`, in order of completion.
+    """
+    configs = list(configs)
+    if workers == 0:
+        for index, config in enumerate(configs):
+            result = _run_scenario(model_class, index, config, kwargs, return_results)
+            if not result.success:
+                logger.warning(f"Scenario {index} failed.")
+            yield result
+        return
+    if not configs:
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_initialize_worker,
+        initargs=(log_level, model_class, configs[0], kwargs),
+    ) as executor:
+        futures = {
+            executor.submit(
+                _run_scenario, model_class, index, config, kwargs, return_results
+            ): index
+            for index, config in enumerate(configs)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception:
+                # The worker itself failed, for example because it was terminated.
+                result = ScenarioResult(
+                    index=index,
+                    config=configs[index],
+                    success=False,
+                    error=traceback.format_exc(),
+                )
+            if not result.success:
+                logger.warning(f"Scenario {index} failed.")
+            yield result
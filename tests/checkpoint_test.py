@@ -0,0 +1,172 @@
+"""Module for testing checkpoints and restarts of the reservoir model."""
+import datetime
+import shutil
+from pathlib import Path
+
+import numpy as np
+import numpy.testing
+import pytest
+from rtctools.data import pi, rtc
+
+from rtctools_simulation.columnar_io import ColumnarTimeseries, read_timeseries, write_timeseries
+from rtctools_simulation.reservoir._input import Input
+from rtctools_simulation.reservoir.checkpoint import read_checkpoint
+from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
+
+BASE_DIR = Path(__file__).parent.resolve() / "basic_model"
+
+#: Number of times of the generated input.
+N_TIMES = 40
+
+#: Number of times with an observed elevation.
+N_OBSERVED = 12
+
+START = datetime.datetime(2020, 1, 1)
+
+
+class AdjustModel(ReservoirModel):
+    """Class for simulating a model that adjusts to observations and spills."""
+
+    def apply_schemes(self):
+        """Adjust to the observed elevation if available, otherwise apply the spillway."""
+        self.include_rainevap()
+        self.apply_spillway()
+        self.apply_adjust()
+
+
+class MinQModel(ReservoirModel):
+    """Class for simulating a model with a minimized outflow."""
+
+    def apply_schemes(self):
+        """Apply minq."""
+        self.apply_minq(h_target=1.0, h_min=0.5, h_max=1.5, backend="bisection")
+
+
+def create_input(base_dir: Path, n_times: int = N_TIMES):
+    """Create a base directory with a columnar input of n_times values, one per second."""
+    shutil.copytree(BASE_DIR / "lookup_tables", base_dir / "lookup_tables")
+    (base_dir / "input").mkdir()
+    shutil.copy(BASE_DIR / "input" / "rtcParameterConfig.xml", base_dir / "input")
+    times = [START + datetime.timedelta(seconds=i) for i in range(n_times)]
+    rng = np.random.default_rng(0)
+    h_observed = 1.0 + 0.05 * np.sin(np.arange(n_times) / 3)
+    h_observed[N_OBSERVED:] = np.nan
+    values = {
+        "Q_in": 0.05 + 0.05 * rng.random(n_times),
+        "Q_turbine": np.full(n_times, 0.05),
+        "H_observed": h_observed,
+        "mm_rain_per_hour": np.zeros(n_times),
+        "mm_evaporation_per_hour": np.zeros(n_times),
+    }
+    timeseries = ColumnarTimeseries(times, values, forecast_datetime=START)
+    write_timeseries(base_dir / "input" / "timeseries_import.npz", timeseries)
+
+
+def create_config(base_dir: Path, output_dir: str = "output") -> ModelConfig:
+    """Create a headless model config with columnar timeseries."""
+    (base_dir / output_dir).mkdir(exist_ok=True)
+    return ModelConfig(
+        base_dir=base_dir,
+        dirs={"output": base_dir / output_dir},
+        timeseries_format="npz",
+        plotting=False,
+    )
+
+
+@pytest.mark.parametrize("model_class", [AdjustModel, MinQModel])
+def test_restart(tmp_path, model_class):
+    """Test that a resumed run matches a full run."""
+    create_input(tmp_path)
+    checkpoint_datetime = START + datetime.timedelta(seconds=N_OBSERVED + 5)
+    checkpoint_file = tmp_path / "checkpoint.npz"
+    model = model_class(
+        create_config(tmp_path),
+        checkpoint_file=checkpoint_file,
+        checkpoint_datetime=checkpoint_datetime,
+    )
+    model.simulate()
+    full = read_timeseries(tmp_path / "output" / "timeseries_export.npz")
+    checkpoint = read_checkpoint(checkpoint_file)
+    assert checkpoint.datetime == checkpoint_datetime
+    if model_class is MinQModel:
+        assert "Q_out_minq" in checkpoint.timeseries
+
+    config = create_config(tmp_path, "output_restart")
+    model = model_class(config, restart_checkpoint=checkpoint_file)
+    model.simulate()
+    resumed = read_timeseries(tmp_path / "output_restart" / "timeseries_export.npz")
+    start_index = full.times.index(checkpoint_datetime)
+    assert resumed.times == full.times[start_index:]
+    for variable in ["Q_out", "H", "V", "Q_spill"]:
+        numpy.testing.assert_allclose(
+            resumed.get(variable), full.get(variable)[start_index:], rtol=1e-8, atol=1e-10
+        )
+
+
+def test_restart_pi(tmp_path):
+    """Test that a resumed run writes PI-XML output with NaN before the restart."""
+    shutil.copytree(Path(__file__).parent.resolve() / "adjust", tmp_path, dirs_exist_ok=True)
+    checkpoint_file = tmp_path / "checkpoint.npz"
+    checkpoint_datetime = datetime.datetime(2022, 6, 7, 0, 0, 1)
+    AdjustModel(
+        ModelConfig(base_dir=tmp_path, plotting=False),
+        checkpoint_file=checkpoint_file,
+        checkpoint_datetime=checkpoint_datetime,
+    ).simulate()
+    (tmp_path / "output_restart").mkdir()
+    config = ModelConfig(
+        base_dir=tmp_path, dirs={"output": tmp_path / "output_restart"}, plotting=False
+    )
+    AdjustModel(config, restart_checkpoint=checkpoint_file).simulate()
+    data_config = rtc.DataConfig(str(tmp_path / "input"))
+    full = pi.Timeseries(data_config, str(tmp_path / "output"), "timeseries_export", binary=False)
+    resumed = pi.Timeseries(
+        data_config, str(tmp_path / "output_restart"), "timeseries_export", binary=False
+    )
+    assert resumed.times == full.times
+    assert np.isnan(resumed.get("H")[0])
+    numpy.testing.assert_allclose(resumed.get("H")[1:], full.get("H")[1:])
+
+
+def test_checkpoint_at_end(tmp_path):
+    """Test that a checkpoint is written at the end and that a later forecast resumes from it."""
+    create_input(tmp_path, n_times=N_OBSERVED)
+    checkpoint_file = tmp_path / "checkpoint.npz"
+    model = AdjustModel(create_config(tmp_path), checkpoint_file=checkpoint_file)
+    model.simulate()
+    h_end = model.extract_results()["H"][-1]
+    checkpoint = read_checkpoint(checkpoint_file)
+    assert checkpoint.datetime == START + datetime.timedelta(seconds=N_OBSERVED - 1)
+    # The checkpoint contains the values of the variables and no temporary file is left.
+    state = dict(zip(checkpoint.variables, checkpoint.state))
+    assert state["V"] == pytest.approx(model.extract_results()["V"][-1])
+    assert list(tmp_path.glob("*.npz")) == [checkpoint_file]
+    model_input = Input()
+    model_input.load_dict(checkpoint.model_input)
+    model_input.validate()
+
+    # The next forecast contains the same history and new times.
+    shutil.rmtree(tmp_path / "input")
+    shutil.rmtree(tmp_path / "lookup_tables")
+    create_input(tmp_path)
+    config = create_config(tmp_path, "output_restart")
+    model = AdjustModel(config, restart_checkpoint=checkpoint_file)
+    model.simulate()
+    results = model.extract_results()
+    assert len(results["H"]) == N_TIMES - N_OBSERVED + 1
+    assert results["H"][0] == pytest.approx(h_end)
+
+
+def test_invalid_restart(tmp_path):
+    """Test that a checkpoint outside of the times of the model is rejected."""
+    create_input(tmp_path)
+    checkpoint_file = tmp_path / "checkpoint.npz"
+    AdjustModel(create_config(tmp_path), checkpoint_file=checkpoint_file).simulate()
+    model = AdjustModel(create_config(tmp_path), restart_checkpoint=checkpoint_file)
+    with pytest.raises(ValueError):
+        model.simulate()
+    with pytest.raises(ValueError):
+        AdjustModel(
+            ModelConfig(base_dir=tmp_path, timeseries_format="npz"),
+            restart_checkpoint=checkpoint_file,
+        )
@@ -1,10 +1,16 @@
 """Tests for the command line interface."""
+import json
 import os
 import shutil
 import subprocess
 import sys
 from pathlib import Path
 
+import pytest
+
+from rtctools_simulation.cli.reservoir import main
+from rtctools_simulation.reservoir.model import MODEL_CACHE_PREFIX
+
 
 def test_reservoir_template():
     """Test building a reservoir model template from the command line."""
@@ -30,3 +36,93 @@ def test_reservoir_template():
         check=False,
     )
     assert test_run.returncode == 0
+
+
+MODEL_FILE = """\
+from rtctools_simulation.reservoir.model import ReservoirModel
+
+
+class SpillwayModel(ReservoirModel):
+    def apply_schemes(self):
+        self.apply_spillway()
+"""
+
+
+def test_run(tmp_path):
+    """Test running a model for multiple base directories from the command line."""
+    base_dir = Path(__file__).parent.resolve() / "basic_model"
+    for name in ["reservoir_a", "reservoir_b", "reservoir_c"]:
+        shutil.copytree(base_dir, tmp_path / name, ignore=shutil.ignore_patterns("output*"))
+        (tmp_path / name / "output").mkdir()
+    # A model without input fails.
+    shutil.rmtree(tmp_path / "reservoir_c" / "input")
+    model_file = tmp_path / "model.py"
+    model_file.write_text(MODEL_FILE)
+    summary_file = tmp_path / "summary.json"
+    with pytest.raises(SystemExit) as exit_info:
+        main(
+            [
+                "run",
+                str(tmp_path / "reservoir_*"),
+                "--model",
+                f"{model_file}:SpillwayModel",
+                "--summary",
+                str(summary_file),
+            ]
+        )
+    assert exit_info.value.code == 1
+    summary = json.loads(summary_file.read_text())
+    assert summary["n_succeeded"] == 2  # noqa: PLR2004
+    assert summary["n_failed"] == 1
+    runs = {Path(run["base_dir"]).name: run for run in summary["runs"]}
+    assert sorted(runs) == ["reservoir_a", "reservoir_b", "reservoir_c"]
+    for name in ["reservoir_a", "reservoir_b"]:
+        assert runs[name]["success"]
+        assert set(runs[name]["times"]) == {"build", "pre", "initialize", "run", "post", "simulate"}
+        assert (tmp_path / name / "output" / "timeseries_export.xml").is_file()
+        assert not (tmp_path / name / "output" / "cached_results").exists()
+    assert not runs["reservoir_c"]["success"]
+    assert "Traceback" in runs["reservoir_c"]["error"]
+    # All models ran in the current process.
+    assert {run["worker"] for run in summary["runs"]} == {os.getpid()}
+
+
+def test_run_cache_dir(tmp_path):
+    """Test running models with a shared cache directory and an invalid log level."""
+    base_dir = Path(__file__).parent.resolve() / "basic_model"
+    shutil.copytree(
+        base_dir,
+        tmp_path / "reservoir",
+        ignore=shutil.ignore_patterns("output*", "generated_model"),
+    )
+    (tmp_path / "reservoir" / "output").mkdir()
+    model_file = tmp_path / "model.py"
+    model_file.write_text(MODEL_FILE)
+    cache_dir = tmp_path / "cache"
+    args = [
+        "run",
+        str(tmp_path / "reservoir"),
+        "--model",
+        f"{model_file}:SpillwayModel",
+        "--summary",
+        str(tmp_path / "summary.json"),
+    ]
+    with pytest.raises(SystemExit) as exit_info:
+        main([*args, "--cache-dir", str(cache_dir), "--log-level", "info"])
+    assert exit_info.value.code == 0
+    # The cache contains the compiled model and the lookup tables.
+    assert not (tmp_path / "reservoir" / "generated_model").exists()
+    assert any(path.is_dir() for path in cache_dir.iterdir())
+    assert list(cache_dir.glob("*.npz"))
+    with pytest.raises(SystemExit) as exit_info:
+        main([*args, "--log-level", "LOUD"])
+    assert exit_info.value.code == 2  # noqa: PLR2004
+
+
+def test_clean_cache(tmp_path, capsys):
+    """Test removing outdated compiled models from a cache directory."""
+    stale_dir = tmp_path / f"{MODEL_CACHE_PREFIX}outdated"
+    stale_dir.mkdir()
+    main(["clean-cache", str(tmp_path)])
+    assert not stale_dir.exists()
+    assert str(stale_dir) in capsys.readouterr().out
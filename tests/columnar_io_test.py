@@ -0,0 +1,162 @@
+"""Module for testing columnar timeseries files."""
+import datetime
+import shutil
+from pathlib import Path
+
+import numpy as np
+import numpy.testing
+import pytest
+from rtctools.data import pi, rtc
+
+from rtctools_simulation.columnar_io import (
+    ColumnarTimeseries,
+    TimeseriesFormat,
+    read_timeseries,
+    timeseries_file,
+    write_timeseries,
+)
+from rtctools_simulation.pi_stream import StreamingTimeseries
+from rtctools_simulation.reservoir.ensemble import run_ensemble
+from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
+
+BASE_DIR = Path(__file__).parent.resolve() / "basic_model"
+INPUT_DIR = BASE_DIR / "input"
+
+FORMAT_MODULES = {
+    TimeseriesFormat.NPZ: None,
+    TimeseriesFormat.ARROW: "pyarrow",
+    TimeseriesFormat.PARQUET: "pyarrow",
+    TimeseriesFormat.NETCDF: "netCDF4",
+}
+
+
+class SpillwayModel(ReservoirModel):
+    """Class for simulating a spillway model."""
+
+    def apply_schemes(self):
+        """Always apply spillway."""
+        self.apply_spillway()
+
+
+def create_columnar_input(input_dir: Path, timeseries_format: TimeseriesFormat):
+    """Convert the PI timeseries of the basic model to a columnar input folder."""
+    shutil.copy(INPUT_DIR / "rtcParameterConfig.xml", input_dir)
+    timeseries = StreamingTimeseries(rtc.DataConfig(INPUT_DIR), INPUT_DIR, "timeseries_import")
+    columnar = ColumnarTimeseries(
+        timeseries.times,
+        dict(timeseries.items()),
+        forecast_datetime=timeseries.forecast_datetime,
+        timezone=timeseries.timezone,
+    )
+    path = timeseries_file(input_dir, "timeseries_import", timeseries_format)
+    write_timeseries(path, columnar)
+
+
+@pytest.mark.parametrize("timeseries_format", list(FORMAT_MODULES))
+def test_write_and_read(tmp_path, timeseries_format):
+    """Test writing and reading an ensemble with a time offset."""
+    if FORMAT_MODULES[timeseries_format] is not None:
+        pytest.importorskip(FORMAT_MODULES[timeseries_format])
+    start = datetime.datetime(2020, 1, 1)
+    times = [start + datetime.timedelta(hours=i) for i in range(4)]
+    values = {
+        "Q_in": np.array([[1.0, np.nan, 3.0, 4.0], [2.0, 3.0, 4.0, 5.0]]),
+        "H": np.array([[10.0, 11.0, 12.0, 13.0], [20.0, 21.0, 22.0, 23.0]]),
+    }
+    timeseries = ColumnarTimeseries(
+        times, values, forecast_datetime=times[1], timezone=1.0, units={"Q_in": "m3/s"}
+    )
+    path = timeseries_file(tmp_path, "timeseries", timeseries_format)
+    write_timeseries(path, timeseries)
+    result = read_timeseries(path)
+    assert result.times == times
+    assert result.forecast_datetime == times[1]
+    assert result.timezone == 1.0  # noqa: PLR2004
+    assert result.units == {"Q_in": "m3/s"}
+    assert result.ensemble_size == 2  # noqa: PLR2004
+    for variable, variable_values in values.items():
+        numpy.testing.assert_array_equal(result.values[variable], variable_values)
+    member = read_timeseries(path, ensemble_member=1)
+    assert member.ensemble_size == 1
+    numpy.testing.assert_array_equal(member.get("Q_in"), values["Q_in"][1])
+
+
+def test_invalid_values():
+    """Test that values should match the times and the ensemble size."""
+    times = [datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 2)]
+    with pytest.raises(ValueError):
+        ColumnarTimeseries(times, {"Q_in": np.zeros(3)})
+    with pytest.raises(ValueError):
+        ColumnarTimeseries(times, {"Q_in": np.zeros((2, 2)), "H": np.zeros((3, 2))})
+    with pytest.raises(ValueError):
+        ColumnarTimeseries(times, {"time": np.zeros(2)})
+
+
+def test_invalid_format():
+    """Test that the model config only accepts known formats."""
+    with pytest.raises(ValueError):
+        ModelConfig(base_dir=BASE_DIR, timeseries_format="csv")
+
+
+def test_columnar_model(tmp_path):
+    """Test that a model with columnar timeseries gives the same output as with PI-XML."""
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    model = SpillwayModel(ModelConfig(base_dir=BASE_DIR, dirs={"output": output_dir}))
+    model.simulate()
+    reference = pi.Timeseries(
+        rtc.DataConfig(INPUT_DIR), output_dir, "timeseries_export", binary=False
+    )
+
+    input_dir = tmp_path / "columnar_input"
+    input_dir.mkdir()
+    create_columnar_input(input_dir, TimeseriesFormat.NPZ)
+    config = ModelConfig(
+        base_dir=BASE_DIR,
+        dirs={"input": input_dir, "output": output_dir},
+        timeseries_format="npz",
+    )
+    model = SpillwayModel(config)
+    model.simulate()
+    result = read_timeseries(output_dir / "timeseries_export.npz")
+    assert result.times == reference.times
+    assert result.forecast_datetime == reference.forecast_datetime
+    for variable, values in reference.items():
+        numpy.testing.assert_array_equal(result.get(variable), values)
+    # Variables without a PI mapping are also written.
+    assert set(model.extract_results()) <= set(result.values)
+
+
+def test_ensemble_output(tmp_path):
+    """Test that all ensemble members are written to one file."""
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    create_columnar_input(input_dir, TimeseriesFormat.NPZ)
+    config = ModelConfig(
+        base_dir=BASE_DIR,
+        dirs={"input": input_dir, "output": output_dir},
+        timeseries_format="npz",
+    )
+    q_in = read_timeseries(input_dir / "timeseries_import.npz").get("Q_in")
+    inflows = np.array([q_in, 2 * q_in])
+    results = run_ensemble(SpillwayModel, inflows, write_output=True, config=config)
+    output = read_timeseries(output_dir / "timeseries_export.npz")
+    assert output.ensemble_size == 2  # noqa: PLR2004
+    for variable, values in results.items():
+        numpy.testing.assert_array_equal(output.values[variable], values)
+
+
+def test_ensemble_output_pi(tmp_path):
+    """Test that all ensemble members are written to one PI-XML file."""
+    config = ModelConfig(base_dir=BASE_DIR, dirs={"output": tmp_path})
+    model = SpillwayModel(config)
+    model.pre()
+    q_in = model.get_timeseries("Q_in")
+    inflows = np.array([q_in, 2 * q_in])
+    results = run_ensemble(SpillwayModel, inflows, write_output=True, config=config)
+    output = pi.Timeseries(rtc.DataConfig(INPUT_DIR), tmp_path, "timeseries_export", binary=False)
+    assert output.ensemble_size == 2  # noqa: PLR2004
+    for member in range(2):
+        numpy.testing.assert_allclose(output.get("Q_out", member), results["Q_out"][member])
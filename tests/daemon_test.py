@@ -0,0 +1,153 @@
+"""Module for testing the simulation daemon."""
+import json
+import logging
+import os
+import shutil
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+from rtctools.data import pi, rtc
+
+from rtctools_simulation.daemon import LatencyStats, ModelPool, SimulationDaemon
+from rtctools_simulation.reservoir.model import ReservoirModel
+
+BASE_DIR = Path(__file__).parent.resolve() / "basic_model"
+
+
+class SpillwayModel(ReservoirModel):
+    """Class for simulating a spillway model."""
+
+    def apply_schemes(self):
+        """Always apply spillway."""
+        self.apply_spillway()
+
+
+def create_base_dir(base_dir: Path) -> Path:
+    """Copy the basic model to a new base directory."""
+    shutil.copytree(BASE_DIR, base_dir, ignore=shutil.ignore_patterns("output*"))
+    (base_dir / "output").mkdir()
+    return base_dir
+
+
+def request(url: str, content: dict = None) -> dict:
+    """Send a request to the daemon and return the response."""
+    data = None if content is None else json.dumps(content).encode()
+    with urllib.request.urlopen(url, data=data) as response:
+        return json.loads(response.read())
+
+
+@pytest.fixture
+def daemon():
+    """Run a daemon in a background thread."""
+    server = SimulationDaemon(ModelPool(SpillwayModel, max_models=1))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_daemon(tmp_path, daemon):
+    """Test that the daemon keeps models warm and reads new input for each run."""
+    url = "http://{}:{}".format(*daemon.server_address[:2])
+    base_dir = create_base_dir(tmp_path / "reservoir_a")
+    data_config = rtc.DataConfig(base_dir / "input")
+
+    result = request(f"{url}/run", {"base_dir": str(base_dir)})
+    assert result["success"]
+    assert not result["warm"]
+    assert result["build_time"] > 0
+    assert set(result["phase_times"]) == {"pre", "initialize", "run", "post"}
+    output = pi.Timeseries(data_config, base_dir / "output", "timeseries_export", binary=False)
+    q_out = output.get("Q_out")
+
+    # Double the inflow for the next forecast cycle.
+    timeseries = pi.Timeseries(data_config, base_dir / "input", "timeseries_import", binary=False)
+    timeseries.set("Q_in", 2 * timeseries.get("Q_in"))
+    timeseries.write()
+    result = request(f"{url}/run", {"base_dir": str(base_dir)})
+    assert result["success"]
+    assert result["warm"]
+    assert result["build_time"] == 0
+    output = pi.Timeseries(data_config, base_dir / "output", "timeseries_export", binary=False)
+    assert (output.get("Q_out") != q_out).any()
+
+    # The least recently used model is evicted.
+    other_base_dir = create_base_dir(tmp_path / "reservoir_b")
+    assert request(f"{url}/run", {"base_dir": str(other_base_dir)})["success"]
+    stats = request(f"{url}/stats")
+    assert stats["runs"] == 3  # noqa: PLR2004
+    assert stats["models"] == [str(other_base_dir)]
+    assert 0 < stats["latency"]["p50"] <= stats["latency"]["p99"]
+
+
+def test_daemon_errors(tmp_path, daemon):
+    """Test that failing runs and invalid requests are reported."""
+    url = "http://{}:{}".format(*daemon.server_address[:2])
+    base_dir = create_base_dir(tmp_path / "reservoir")
+    shutil.rmtree(base_dir / "input")
+    result = request(f"{url}/run", {"base_dir": str(base_dir)})
+    assert not result["success"]
+    assert "Traceback" in result["error"]
+    with pytest.raises(urllib.error.HTTPError) as error_info:
+        request(f"{url}/run", {"base_dir": str(tmp_path / "missing")})
+    assert error_info.value.code == 400  # noqa: PLR2004
+
+
+def test_idle_eviction(tmp_path):
+    """Test that idle models are evicted."""
+    now = [0.0]
+    pool = ModelPool(SpillwayModel, idle_timeout=10.0, clock=lambda: now[0])
+    base_dir = create_base_dir(tmp_path / "reservoir")
+    assert pool.run(base_dir).success
+    pool.prepare(base_dir)
+    assert pool.stats_summary()["models"] == [str(base_dir)]
+    now[0] = 20.0
+    assert pool.stats_summary()["models"] == []
+    assert not pool.run(base_dir).warm
+
+
+def test_prepare_in_background(tmp_path):
+    """Test that prepared models are built again when the lookup tables have changed."""
+    pool = ModelPool(SpillwayModel)
+    base_dir = create_base_dir(tmp_path / "reservoir")
+    assert pool.run(base_dir).success
+    future = pool.prepare(base_dir)
+    assert future is not None
+    # The model is already being prepared.
+    assert pool.prepare(base_dir) is None
+    future.result()
+    assert pool.run(base_dir).warm
+    pool.prepare(base_dir).result()
+    lookup_table = next((base_dir / "lookup_tables").glob("*.csv"))
+    stat = lookup_table.stat()
+    os.utime(lookup_table, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    result = pool.run(base_dir)
+    assert result.success
+    assert not result.warm
+    assert result.build_time > 0
+    pool.close()
+
+
+def test_daemon_host_warning(caplog):
+    """Test that a warning is logged when the daemon does not listen on a loopback address."""
+    with caplog.at_level(logging.WARNING, logger="rtctools"):
+        SimulationDaemon(ModelPool(SpillwayModel), host="localhost").server_close()
+        assert not caplog.records
+        SimulationDaemon(ModelPool(SpillwayModel), host="0.0.0.0").server_close()
+    assert "not a loopback address" in caplog.text
+
+
+def test_latency_percentiles():
+    """Test the latency percentiles."""
+    stats = LatencyStats(max_size=100)
+    assert stats.percentiles()["p50"] is None
+    for latency in range(1, 101):
+        stats.add(float(latency))
+    percentiles = stats.percentiles()
+    assert percentiles["p50"] == pytest.approx(50.5)
+    assert percentiles["p99"] == pytest.approx(99.01)
@@ -0,0 +1,98 @@
+"""Module for testing ensemble simulations of the reservoir model."""
+from pathlib import Path
+
+import numpy as np
+import numpy.testing
+import pytest
+
+from rtctools_simulation.reservoir.ensemble import run_ensemble
+from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
+
+BASE_DIR = Path(__file__).parent.resolve() / "basic_model"
+
+INFLOW_FACTORS = [1.0, 2.0, 0.5]
+
+
+class SpillwayModel(ReservoirModel):
+    """Class for simulating a spillway model."""
+
+    def __init__(self, config, inflow_factor=1.0, **kwargs):
+        super().__init__(config, **kwargs)
+        self.inflow_factor = inflow_factor
+
+    def pre(self, *args, **kwargs):
+        super().pre(*args, **kwargs)
+        self.set_timeseries("Q_in", self.get_timeseries("Q_in") * self.inflow_factor)
+
+    def apply_schemes(self):
+        """Always apply spillway."""
+        self.apply_spillway()
+
+
+class MinQModel(SpillwayModel):
+    """Class for simulating a model with a minimized outflow."""
+
+    def apply_schemes(self):
+        """Apply minq, which keeps the optimized outflow between timesteps."""
+        self.apply_minq(h_target=1.0, h_min=0.5, h_max=1.5, backend="bisection")
+
+
+class MinQNLPModel(SpillwayModel):
+    """Class for simulating a model with a minimized outflow of the nlp backend."""
+
+    def apply_schemes(self):
+        """Apply minq, which keeps the NLPs and their solutions between timesteps."""
+        self.apply_minq(
+            h_target=1.0, h_min=0.5, h_max=1.5, backend="nlp", recalculate=True, look_ahead=3
+        )
+
+
+class RunningMeanModel(SpillwayModel):
+    """Class for simulating a model with a scheme that keeps its own state."""
+
+    def __init__(self, config, inflow_factor=1.0, **kwargs):
+        super().__init__(config, inflow_factor, **kwargs)
+        self.inflow_sum = 0.0
+        self.n_inflows = 0
+
+    def apply_schemes(self):
+        """Release the mean inflow of the previous timesteps."""
+        self.inflow_sum += self.get_var("Q_in")
+        self.n_inflows += 1
+        self.set_q(input_type="parameter", input_data=self.inflow_sum / self.n_inflows)
+
+
+@pytest.mark.parametrize("model_class", [SpillwayModel, MinQModel, MinQNLPModel, RunningMeanModel])
+def test_run_ensemble(model_class):
+    """Test that each ensemble member equals a single simulation with the same inflow."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    model = model_class(config)
+    model.simulate()
+    inflows = np.array([model.get_timeseries("Q_in") * factor for factor in INFLOW_FACTORS])
+    results = run_ensemble(model_class, inflows, config=config)
+    for member, factor in enumerate(INFLOW_FACTORS):
+        model = model_class(config, inflow_factor=factor)
+        model.simulate()
+        for var, values in model.extract_results().items():
+            assert results[var].shape == inflows.shape
+            numpy.testing.assert_allclose(results[var][member], values, rtol=1e-6, atol=1e-6)
+
+
+def test_run_ensemble_wrong_shape():
+    """Test that inflows should match the model times."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    with pytest.raises(ValueError):
+        run_ensemble(SpillwayModel, np.zeros((2, 100)), config=config)
+
+
+@pytest.mark.parametrize("model_class", [MinQNLPModel, RunningMeanModel])
+def test_run_ensemble_member_order(model_class):
+    """Test that the results of a member do not depend on the order of the members."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    model = model_class(config)
+    model.simulate()
+    inflows = np.array([model.get_timeseries("Q_in") * factor for factor in INFLOW_FACTORS])
+    results = run_ensemble(model_class, inflows, config=config)
+    results_reversed = run_ensemble(model_class, inflows[::-1], config=config)
+    for var, values in results.items():
+        numpy.testing.assert_array_equal(results_reversed[var][::-1], values)
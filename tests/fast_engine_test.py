@@ -0,0 +1,136 @@
+"""Module for testing the fast engine of the reservoir model."""
+import importlib.util
+from copy import deepcopy
+from pathlib import Path
+
+import casadi as ca
+import numpy as np
+import numpy.testing
+import pytest
+
+from rtctools_simulation.reservoir.fast_engine import ReservoirEngine
+from rtctools_simulation.reservoir.model import InputVar, ModelConfig, ReservoirModel
+
+BASE_DIR = Path(__file__).parent.resolve() / "basic_model"
+EXAMPLE_DIR = Path(__file__).parent.parent.resolve() / "examples"
+
+
+class SchemeModel(ReservoirModel):
+    """Class for simulating a model with a given list of schemes."""
+
+    def __init__(self, config, schemes, **kwargs):
+        super().__init__(config, **kwargs)
+        self.schemes = schemes
+
+    def apply_schemes(self):
+        """Apply the given schemes."""
+        for scheme in self.schemes:
+            getattr(self, scheme)()
+
+
+@pytest.mark.parametrize(
+    "schemes",
+    [
+        [],
+        ["apply_spillway"],
+        ["apply_poolq"],
+        ["apply_passflow"],
+        ["include_rainevap"],
+        ["include_rainevap", "apply_spillway"],
+    ],
+)
+def test_fast_engine(schemes):
+    """Test that the fast engine gives the same results as the DAE solver."""
+    results = {}
+    for engine in ["casadi", "numpy"]:
+        config = ModelConfig(base_dir=BASE_DIR)
+        model = SchemeModel(config, schemes=schemes, engine=engine)
+        model.simulate()
+        results[engine] = model.extract_results()
+    for var, values in results["casadi"].items():
+        numpy.testing.assert_allclose(
+            np.array(results["numpy"][var]), np.array(values), rtol=1e-6, atol=1e-6
+        )
+
+
+def get_example(example: Path):
+    """Get the model class and config of an example."""
+    spec = importlib.util.spec_from_file_location(example.stem, example)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    model_classes = [
+        value
+        for value in vars(module).values()
+        if isinstance(value, type)
+        and issubclass(value, ReservoirModel)
+        and value.__module__ == module.__name__
+    ]
+    assert len(model_classes) == 1
+    return model_classes[0], module.CONFIG
+
+
+def get_example_params():
+    """Get the examples to compare the engines on."""
+    params = []
+    for example in sorted(EXAMPLE_DIR.glob("*/*.py")):
+        marks = []
+        if example.stem == "fillspill_example":
+            # Fillspill applies pass flow only if H equals the target elevation exactly.
+            # The NumPy engine keeps H exactly at the target during pass flow,
+            # while the rootfinder of the DAE solver leaves a rounding error,
+            # so the engines take different branches after the target is reached.
+            marks.append(pytest.mark.skip(reason="fillspill compares H to the target exactly"))
+        params.append(pytest.param(example, marks=marks, id=example.stem))
+    return params
+
+
+@pytest.mark.parametrize("example", get_example_params())
+def test_fast_engine_example(example, monkeypatch):
+    """Test that the fast engine gives the same results as the DAE solver for an example."""
+    # Some examples find their input files relative to sys.path[0].
+    monkeypatch.syspath_prepend(str(example.parent))
+    model_class, config = get_example(example)
+    results = {}
+    for engine in ["casadi", "numpy"]:
+        model = model_class(deepcopy(config), engine=engine)
+        model.simulate()
+        results[engine] = model.extract_results()
+    for var, values in results["casadi"].items():
+        numpy.testing.assert_allclose(
+            np.array(results["numpy"][var]), np.array(values), rtol=1e-6, atol=1e-6, err_msg=var
+        )
+
+
+def test_fast_engine_dae_residual():
+    """Test that the fast engine solves the equations of a given DAE residual."""
+    names = ["V", "der(V)", "Q_out"] + [var.value for var in InputVar]
+    symbols = {name: ca.MX.sym(name) for name in names}
+    q_in = symbols[InputVar.Q_IN.value]
+    inputs = {var.value: 0.0 for var in InputVar}
+    inputs[InputVar.Q_IN.value] = 2.0
+    residual = ca.vertcat(
+        symbols["der(V)"] - (q_in - symbols["Q_out"]),
+        symbols["Q_out"] - 0.5 * q_in,
+    )
+    dae_residual = ca.Function("dae_residual", list(symbols.values()), [residual], names, ["r"])
+    engine = ReservoirEngine({}, [], dae_residual)
+    state = engine.step(volume=[1.0, 2.0], inputs=inputs, dt=10.0)
+    numpy.testing.assert_allclose(state["Q_out"], [1.0, 1.0])
+    numpy.testing.assert_allclose(state["V"], [11.0, 12.0])
+    # Nonlinear equations are not supported.
+    residual = ca.vertcat(
+        symbols["der(V)"] - (q_in - symbols["Q_out"]),
+        symbols["Q_out"] ** 2 - q_in,
+    )
+    dae_residual = ca.Function("dae_residual", list(symbols.values()), [residual], names, ["r"])
+    with pytest.raises(ValueError):
+        ReservoirEngine({}, [], dae_residual)
+
+
+def test_fast_engine_invalid():
+    """Test that invalid engine options are rejected."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    with pytest.raises(ValueError):
+        ReservoirModel(config, engine="fortran")
+    with pytest.raises(ValueError):
+        ReservoirModel(config, use_default_model=False, engine="numpy")
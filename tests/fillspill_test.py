@@ -4,7 +4,7 @@ from pathlib import Path
 import numpy as np
 import numpy.testing
 
-from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
+from rtctools_simulation.reservoir.model import ModelConfig, OutflowType, ReservoirModel
 
 fillspill_dir = Path(__file__).parent.resolve() / "fillspill"
 
@@ -32,3 +32,24 @@ def test_fillspill():
     numpy.testing.assert_array_almost_equal(q_turbine, q_turbine_ref, decimal=3)
     numpy.testing.assert_array_almost_equal(q_spill, q_spill_ref, decimal=3)
     numpy.testing.assert_array_almost_equal(h_sim, h_ref, decimal=3)
+
+
+class FillSpillTargetModel(FillSpillModel):
+    """Class for simulating a fillspill model with a target elevation below the spillway."""
+
+    def parameters(self):
+        parameters = super().parameters()
+        parameters["Spillway_H"] = 1600.5
+        return parameters
+
+
+def test_fillspill_at_target():
+    """Test that the fillspill model applies pass flow at the target elevation."""
+    config = ModelConfig(base_dir=fillspill_dir)
+    model = FillSpillTargetModel(config)
+    model.pre()
+    model.initialize()
+    model.update(-1)
+    model.set_var("H", model.parameters()["Reservoir_Htarget"])
+    model.apply_fillspill()
+    assert model._input.outflow.outflow_type == OutflowType.PASS
@@ -1,5 +1,6 @@
 """Module for testing function to determin flood flag."""
 import logging
+from datetime import datetime
 from pathlib import Path
 
 from rtctools.util import run_simulation_problem
@@ -30,3 +31,27 @@ def test_get_flood_flag(log_level=logging.INFO):
     flood_flag = model.flood_flag
     flood_flag_ref = True
     assert flood_flag == flood_flag_ref
+
+
+class FloodTimesModel(ReservoirModel):
+    """Empty model where we get the flood times in pre."""
+
+    def pre(self, *args, **kwargs):
+        super().pre(*args, **kwargs)
+        self.flood_times = self.get_flood_times(
+            q_out_daily_average=0.0,
+            flood_elevations=[1.0, 1.2, 5.0],
+        )
+
+
+def test_get_flood_times():
+    """Test getting the first time of flooding for multiple flood elevations."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    model = FloodTimesModel(config)
+    model.simulate()
+    flood_times_ref = {
+        1.0: datetime(2020, 1, 1, 0, 0, 0),
+        1.2: datetime(2020, 1, 1, 0, 0, 2),
+        5.0: None,
+    }
+    assert model.flood_times == flood_times_ref
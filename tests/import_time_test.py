@@ -0,0 +1,74 @@
+"""Module for testing the import time of the reservoir model."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Set, Tuple
+
+#: Module that is imported for a plain simulation.
+MODULE = "rtctools_simulation.reservoir.model"
+
+#: Modules that should only be imported when they are first used.
+LAZY_MODULES = [
+    "jinja2",
+    "matplotlib",
+    "pandas",
+    "plotly",
+    "pydantic",
+    "rtctools.optimization",
+    "rtctools_interface",
+    "scipy",
+    "rtctools_simulation.optimization_problem",
+    "rtctools_simulation.reservoir.minq",
+    "rtctools_simulation.reservoir.template",
+]
+
+#: Budget (s) for importing the reservoir model, see benchmarks/import_time_benchmark.py.
+IMPORT_TIME_BUDGET = 1.0
+
+#: Number of imports, the fastest import is compared with the budget.
+REPEAT = 3
+
+
+def import_module(module: str) -> Tuple[float, Set[str]]:
+    """
+    Import a module in a new Python process.
+
+    :returns: the total import time (s) and the names of the imported modules.
+    """
+    env = dict(os.environ)
+    root = str(Path(__file__).parent.parent.resolve())
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import sys, {module}; print('\\n'.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    # Lines have the form "import time: <self [us]> | <cumulative [us]> | <module>".
+    self_times = [
+        int(line.split("|")[0].split(":")[1])
+        for line in process.stderr.splitlines()
+        if line.startswith("import time:") and "self [us]" not in line
+    ]
+    return sum(self_times) * 1e-6, set(process.stdout.split())
+
+
+def test_lazy_imports():
+    """Test that heavy dependencies are not imported for a plain simulation."""
+    _, modules = import_module(MODULE)
+    assert MODULE in modules
+    assert sorted(set(LAZY_MODULES) & modules) == []
+
+
+def test_import_time():
+    """Test that importing the reservoir model stays within the budget."""
+    import_time = min(import_module(MODULE)[0] for _ in range(REPEAT))
+    assert import_time < IMPORT_TIME_BUDGET
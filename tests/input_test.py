@@ -0,0 +1,81 @@
+"""Module for testing the reservoir model input."""
+import copy
+
+import numpy as np
+import pytest
+
+from rtctools_simulation.reservoir._input import Input, OutflowType, input_to_dict
+from rtctools_simulation.reservoir._variables import InputVar
+
+
+def test_input_validate():
+    """Test validating changed input fields."""
+    model_input = Input()
+    model_input.outflow.components.turbine = np.float64(2)
+    model_input.rain_evap.include_rain = np.bool_(True)
+    model_input.day = 3.0
+    model_input.validate()
+    assert isinstance(model_input.outflow.components.turbine, float)
+    assert model_input.rain_evap.include_rain is True
+    assert model_input.day == 3  # noqa: PLR2004
+    inputs = input_to_dict(model_input)
+    assert inputs[InputVar.Q_TURBINE] == 2  # noqa: PLR2004
+    assert inputs[InputVar.USE_COMPOSITE_Q]
+
+
+def test_input_components_reset():
+    """Test that outflow components are reset if the outflow is not composite."""
+    model_input = Input()
+    model_input.outflow.components.turbine = 2.0
+    model_input.outflow.outflow_type = OutflowType.PASS
+    model_input.validate()
+    assert model_input.outflow.components.turbine == 0
+    assert input_to_dict(model_input)[InputVar.DO_PASS]
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [
+        ("turbine", -1.0),
+        ("turbine", np.nan),
+        ("do_spill", 2),
+        ("day", 32),
+        ("day", 1.5),
+        ("outflow_type", "unknown"),
+    ],
+)
+def test_input_validate_error(field, value):
+    """Test that invalid input raises an error when validating."""
+    model_input = Input()
+    records = [model_input, model_input.outflow, model_input.outflow.components]
+    record = next(record for record in records if field in record._defaults)
+    setattr(record, field, value)
+    with pytest.raises(ValueError):
+        model_input.validate()
+
+
+def test_input_dict():
+    """Test converting the input to a dict and back."""
+    model_input = Input()
+    model_input.outflow.outflow_type = OutflowType.FROM_INPUT
+    model_input.outflow.from_input = 1.5
+    model_input.rain_evap.include_rain = True
+    model_input.day = 7
+    model_input.validate()
+    values = model_input.to_dict()
+    assert values["outflow"]["from_input"] == 1.5  # noqa: PLR2004
+    loaded_input = Input()
+    loaded_input.load_dict(values)
+    loaded_input.validate()
+    assert loaded_input == model_input
+
+
+def test_input_deepcopy():
+    """Test that a deep copy of the input is independent of the original."""
+    model_input = Input()
+    model_input.outflow.from_input = 1.5
+    copied_input = copy.deepcopy(model_input)
+    assert copied_input == model_input
+    copied_input.outflow.from_input = 2.5
+    assert model_input.outflow.from_input == 1.5  # noqa: PLR2004
+    copied_input.validate()
@@ -4,6 +4,7 @@ from pathlib import Path
 from typing import Iterable, List
 
 import casadi as ca
+import numpy as np
 import numpy.testing
 import pytest
 
@@ -50,6 +51,33 @@ def test_get_lookup_table_from_csv(file, var_in, var_out, values_in, value_out):
     numpy.testing.assert_almost_equal(lookup_table(*values_in), value_out)
 
 
+@pytest.mark.parametrize(
+    "file,var_in,var_out,values_in",
+    [
+        ("h_from_v.csv", "h", "v", [np.linspace(-1.0, 3.0, 41)]),
+        ("qout_from_day_h.csv", ["day", "h"], "qout", [1.5, np.linspace(0.0, 2.0, 21)]),
+        (
+            "qout_from_day_h.csv",
+            ["day", "h"],
+            "qout",
+            [np.array([[0.0], [1.0], [2.5]]), np.array([0.5, 1.2, 3.0])],
+        ),
+        ("qout_from_single_day_h.csv", ["day", "h"], "qout", [2, np.linspace(0.0, 2.0, 21)]),
+    ],
+)
+def test_get_numpy_lookup_table_from_csv(file, var_in, var_out, values_in):
+    """Test that NumPy lookup tables give the same values as CasADi lookup tables."""
+    kwargs = {"name": "lookup_table", "file": DATA_DIR / file, "var_in": var_in, "var_out": var_out}
+    lookup_table = lut.get_lookup_table_from_csv(**kwargs)
+    numpy_lookup_table = lut.get_numpy_lookup_table_from_csv(**kwargs)
+    values_in = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in values_in])
+    values_out = numpy_lookup_table(*values_in)
+    assert values_out.shape == values_in[0].shape
+    for index in np.ndindex(values_out.shape):
+        value_in = [float(value[index]) for value in values_in]
+        numpy.testing.assert_almost_equal(values_out[index], float(lookup_table(*value_in)))
+
+
 def test_check_input_grid():
     """Test checking the input grid for a 2D lookup table."""
     with pytest.raises(lut.GridCoordinatesNotFoundError):
@@ -72,6 +100,61 @@ def test_get_lookup_tables_from_csv():
     numpy.testing.assert_almost_equal(qout_from_day_h(2, 1.5), 0.375)
 
 
+def test_lookup_table_cache(tmp_path, monkeypatch):
+    """Test caching lookup table data in .npz files."""
+    lut._LOOKUP_TABLE_DATA_CACHE.clear()
+    lut._LOOKUP_TABLE_CACHE.clear()
+    lookup_tables_csv = DATA_DIR / "lookup_tables.csv"
+    lookup_tables = lut.get_lookup_tables_from_csv(lookup_tables_csv, cache_dir=tmp_path)
+    assert len(list(tmp_path.glob("*.npz"))) == len(lookup_tables)
+    # Lookup tables are only created once per process.
+    assert lut.get_lookup_tables_from_csv(lookup_tables_csv) == lookup_tables
+    # Read the data from the .npz files instead of the csv files.
+    data = lut._read_lookup_table_data_from_csv(
+        DATA_DIR / "qout_from_day_h.csv", ["day", "h"], "qout"
+    )
+
+    def read_csv(*args):
+        raise AssertionError("Lookup table data should be read from the cache.")
+
+    monkeypatch.setattr(lut, "_read_lookup_table_data_from_csv", read_csv)
+    lut._LOOKUP_TABLE_DATA_CACHE.clear()
+    lut._LOOKUP_TABLE_CACHE.clear()
+    cached_data = lut.get_lookup_table_data_from_csv(
+        DATA_DIR / "qout_from_day_h.csv", ["day", "h"], "qout", cache_dir=tmp_path
+    )
+    for coordinates, cached_coordinates in zip(data[0], cached_data[0]):
+        numpy.testing.assert_array_equal(coordinates, cached_coordinates)
+    numpy.testing.assert_array_equal(data[1], cached_data[1])
+    assert [list(names) for names in data[2:]] == [list(names) for names in cached_data[2:]]
+    lookup_tables = lut.get_lookup_tables_from_csv(lookup_tables_csv, cache_dir=tmp_path)
+    numpy.testing.assert_almost_equal(lookup_tables["h_from_v"](1.2), 1.1)
+    numpy.testing.assert_almost_equal(lookup_tables["qout_from_day_h"](2, 1.5), 0.375)
+
+
+def test_lookup_table_data_cache(monkeypatch):
+    """Test that the cached lookup table data is read-only and that the cache is bounded."""
+    lut._LOOKUP_TABLE_DATA_CACHE.clear()
+    data_csv = DATA_DIR / "qout_from_day_h.csv"
+    coordinates, values, vars_in, reduced_vars_in = lut.get_lookup_table_data_from_csv(
+        data_csv, ["day", "h"], "qout"
+    )
+    assert isinstance(coordinates, tuple)
+    assert isinstance(vars_in, tuple)
+    assert isinstance(reduced_vars_in, tuple)
+    for array in list(coordinates) + [values]:
+        with pytest.raises(ValueError):
+            array[0] = 0.0
+    # The least recently used data is removed first.
+    monkeypatch.setattr(lut, "LOOKUP_TABLE_CACHE_SIZE", 2)
+    lut.get_lookup_table_data_from_csv(DATA_DIR / "h_from_v.csv", "v", "h")
+    lut.get_lookup_table_data_from_csv(data_csv, ["day", "h"], "qout")
+    lut.get_lookup_table_data_from_csv(DATA_DIR / "qspill_from_h.csv", "h", "qspill")
+    cached_outputs = [key[2] for key in lut._LOOKUP_TABLE_DATA_CACHE]
+    assert cached_outputs == ["qout", "qspill"]
+    lut._LOOKUP_TABLE_DATA_CACHE.clear()
+
+
 def test_get_lookup_tables_bounds_from_csv():
     """Test getting a dict of lookup tables bounds described by a csv file."""
     bounds = lut.get_lookup_tables_bounds_from_csv(DATA_DIR / "lookup_tables.csv")
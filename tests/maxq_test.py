@@ -3,6 +3,7 @@ from pathlib import Path
 
 import numpy as np
 
+from rtctools_simulation.reservoir.maxq import MaxQCurve, TailwaterSolver
 from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
 
 maxq_dir = Path(__file__).parent.resolve() / "maxq"
@@ -47,3 +48,43 @@ def test_maxq():
     np.testing.assert_array_almost_equal(case2_outcome, sim_maxq[:, 1], decimal=3)
     np.testing.assert_array_almost_equal(case3_outcome, sim_maxq[:, 2], decimal=3)
     np.testing.assert_array_almost_equal(case4_outcome, sim_maxq[:, 3], decimal=3)
+
+
+def test_tailwater_solver():
+    """Test that the tailwater solver finds a root that does not depend on the initial guess."""
+    config = ModelConfig(base_dir=maxq_dir)
+    model = ReservoirModel(config)
+    solver = TailwaterSolver(
+        qspill_from_h=model.numpy_lookup_table("qspill_from_h"),
+        qnotspill_from_dh=model.numpy_lookup_table("qnotspill_from_dh"),
+        qtw_from_tw=model.numpy_lookup_table("qtw_from_tw"),
+    )
+    for h in np.linspace(0.2, 3.0, 15):
+        q_spill = solver._qspill_from_h(h)
+        tw, qmax = solver.solve(h, tw_guess=h)
+        assert abs(solver._residual(h, q_spill, tw)) < 1e-12  # noqa: PLR2004
+        assert qmax == solver._qtw_from_tw(tw)
+        for tw_guess in [-10.0, 0.0, tw, 10.0]:
+            assert solver.solve(h, tw_guess) == (tw, qmax)
+        assert solver._solve_scan(h, q_spill, tw_guess=h) == tw
+
+
+def test_maxq_curve():
+    """Test the precomputed maxq curve against the exact solver."""
+    config = ModelConfig(base_dir=maxq_dir)
+    model = MaxQModel(config, maxq_h_step=0.01)
+    model.simulate()
+    np.testing.assert_array_almost_equal(case3_outcome, model.maxq[:, 2], decimal=3)
+    curve = model.get_maxq_curve()
+    assert (curve.h[0], curve.h[-1]) == (0.0, 1.5)
+    # Test the error estimate on a range that includes kinks of the maxq curve.
+    solver = model._get_tailwater_solver()
+    h = np.linspace(0.0, 3.0, 3001)
+    exact = np.array([solver.solve(h_i, h_i)[1] for h_i in h])
+    errors = []
+    for h_step in [0.5, 0.1]:
+        curve = MaxQCurve(solver, h_min=0.0, h_max=3.0, h_step=h_step)
+        error = np.max(np.abs([curve(h_i) for h_i in h] - exact))
+        np.testing.assert_allclose(curve.max_error, error, rtol=0.2)
+        errors.append(curve.max_error)
+    assert errors[1] < errors[0]
@@ -1,27 +1,32 @@
 """Module for testing the qmin scheme."""
+from datetime import datetime
 from pathlib import Path
 
 import numpy as np
 import numpy.testing
 import pytest
 
+from rtctools_simulation.reservoir.minq import QMinNLP, QMinParameters, QMinProblem
 from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
 
 BASE_DIR = Path(__file__).parent.resolve() / "minq"
+EXAMPLE_DIR = Path(__file__).parent.parent.resolve() / "examples" / "minq_example"
 
 
 class TestModel(ReservoirModel):
     """Class for testing the minq scheme."""
 
-    def __init__(self, config: ModelConfig, h_target):
+    def __init__(self, config: ModelConfig, h_target, backend="goal_programming"):
         super().__init__(config=config)
         self.h_target = h_target
+        self.backend = backend
 
     def apply_schemes(self):
         """Always apply spillway."""
-        self.apply_minq(h_min=1.0, h_max=3.0, h_target=self.h_target)
+        self.apply_minq(h_min=1.0, h_max=3.0, h_target=self.h_target, backend=self.backend)
 
 
+@pytest.mark.parametrize("backend", ["goal_programming", "nlp", "bisection"])
 @pytest.mark.parametrize(
     "h_target, h_ref",
     [
@@ -30,11 +35,179 @@ class TestModel(ReservoirModel):
         ("H_target", [2.0, 1.5, 3.0, 2.7]),
     ],
 )
-def test_minq(h_target, h_ref):
+def test_minq(h_target, h_ref, backend):
     """Test the spillway model."""
     config = ModelConfig(base_dir=BASE_DIR)
-    model = TestModel(config, h_target=h_target)
+    model = TestModel(config, h_target=h_target, backend=backend)
     model.simulate()
     output = model.extract_results()
     h_model = np.array(output["H"])
     numpy.testing.assert_array_almost_equal(h_model, h_ref, decimal=3)
+
+
+class RecedingHorizonModel(ReservoirModel):
+    """Class for testing the minq scheme with a receding horizon."""
+
+    def __init__(self, config: ModelConfig, look_ahead=None, backend="goal_programming"):
+        super().__init__(config=config)
+        self.look_ahead = look_ahead
+        self.backend = backend
+        self.problems = []
+        self.nlps = []
+
+    def apply_schemes(self):
+        """Recalculate minq at each timestep."""
+        self.apply_minq(
+            h_min=1.0,
+            h_max=3.0,
+            h_target="H_target",
+            recalculate=True,
+            receding_horizon=True,
+            look_ahead=self.look_ahead,
+            backend=self.backend,
+        )
+        if self._qmin_problem is not None and self._qmin_problem not in self.problems:
+            self.problems.append(self._qmin_problem)
+        if self._qmin_nlp is not None and self._qmin_nlp not in self.nlps:
+            self.nlps.append(self._qmin_nlp)
+
+
+@pytest.mark.parametrize(
+    "look_ahead, h_ref",
+    [
+        (None, [2.0, 1.5, 3.0, 2.7]),
+        # With a single timestep, the outflow is not lowered in advance of the peak inflow.
+        (1, [2.0, 2.0, 3.0, 2.7]),
+    ],
+)
+def test_minq_receding_horizon(look_ahead, h_ref):
+    """Test the minq scheme with a receding horizon."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    model = RecedingHorizonModel(config, look_ahead=look_ahead)
+    model.simulate()
+    output = model.extract_results()
+    h_model = np.array(output["H"])
+    numpy.testing.assert_array_almost_equal(h_model, h_ref, decimal=3)
+    # Each optimization is seeded with the results of the previous optimization.
+    problems = model.problems
+    assert len(problems) == len(h_ref) - 1
+    assert problems[0]._previous_results is None
+    for previous, problem in zip(problems[:-1], problems[1:]):
+        assert problem._previous_results is previous.results_timeseries
+        assert problem.goal_programming_options()["fix_minimized_values"] is False
+
+
+def test_minq_fix_minimized_values():
+    """Test that the minimized peak outflow is only bounded for a receding horizon."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    # Creating the reservoir model sets up the model folder.
+    TestModel(config, h_target=2.0)
+    config.set_model("ReservoirMinQ")
+    datetimes = [datetime(2020, 1, 1), datetime(2020, 1, 2)]
+    params = QMinParameters(v_min=0, v_max=None, v_target=[0.0], q_flood=0)
+    for receding_horizon in [False, True]:
+        problem = QMinProblem(
+            config, datetimes, params, input_timeseries={}, receding_horizon=receding_horizon
+        )
+        options = problem.goal_programming_options()
+        assert options["fix_minimized_values"] is not receding_horizon
+
+
+@pytest.mark.parametrize("look_ahead", [None, 1])
+def test_minq_bisection_backend(look_ahead):
+    """Test that the bisection backend gives the same results as goal programming."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    results = {}
+    for backend in ["goal_programming", "bisection"]:
+        model = RecedingHorizonModel(config, look_ahead=look_ahead, backend=backend)
+        model.simulate()
+        results[backend] = model.extract_results()
+    for var in ["Q_out", "H"]:
+        numpy.testing.assert_allclose(
+            results["bisection"][var], results["goal_programming"][var], rtol=0, atol=1e-3
+        )
+
+
+class ExampleModel(ReservoirModel):
+    """Class for the minq example with a given backend."""
+
+    def __init__(self, config: ModelConfig, backend: str, **minq_options):
+        super().__init__(config=config)
+        self.backend = backend
+        self.minq_options = minq_options
+
+    def apply_schemes(self):
+        self.apply_minq(
+            h_min=0, h_max=40.0, h_target="rule_curve", backend=self.backend, **self.minq_options
+        )
+
+
+def test_minq_bisection_example():
+    """Test the bisection backend against goal programming on the minq example."""
+    config = ModelConfig(base_dir=EXAMPLE_DIR)
+    q_out_minq = {}
+    for backend in ["goal_programming", "bisection"]:
+        model = ExampleModel(config, backend=backend)
+        model.simulate()
+        q_out_minq[backend] = np.array(model.get_timeseries("Q_out_minq"))
+    # The outflow at the start time is not used and not determined by the optimization.
+    # Goal programming is accurate up to the interior point tolerance of IPOPT.
+    numpy.testing.assert_allclose(
+        q_out_minq["bisection"][1:], q_out_minq["goal_programming"][1:], rtol=0, atol=5e-3
+    )
+
+
+def test_minq_receding_horizon_example():
+    """Test goal programming with a receding horizon on the minq example."""
+    # Fixing the minimized peak outflow makes goal programming fail on this example,
+    # since the minimal peak is zero for some horizons.
+    config = ModelConfig(base_dir=EXAMPLE_DIR)
+    q_out_minq = {}
+    for backend in ["goal_programming", "bisection"]:
+        model = ExampleModel(config, backend=backend, receding_horizon=True, look_ahead=5)
+        model.simulate()
+        q_out_minq[backend] = np.array(model.get_timeseries("Q_out_minq"))
+    numpy.testing.assert_allclose(
+        q_out_minq["bisection"][1:], q_out_minq["goal_programming"][1:], rtol=0, atol=5e-3
+    )
+
+
+@pytest.mark.parametrize("look_ahead", [None, 1])
+def test_minq_nlp_backend(look_ahead):
+    """Test that the nlp backend gives the same results as goal programming."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    results = {}
+    for backend in ["goal_programming", "nlp"]:
+        model = RecedingHorizonModel(config, look_ahead=look_ahead, backend=backend)
+        model.simulate()
+        results[backend] = model.extract_results()
+    for var in ["Q_out", "H"]:
+        numpy.testing.assert_allclose(
+            results["nlp"][var], results["goal_programming"][var], rtol=0, atol=1e-3
+        )
+    # An NLP is built for each horizon length and the time of each priority is recorded.
+    # The first optimization is from the start time to the end time or the look-ahead time.
+    n_times = [4, 3, 2] if look_ahead is None else [2]
+    assert model._qmin_problem is None
+    assert [nlp.n_times for nlp in model.nlps] == n_times
+    assert model._qmin_nlps == {nlp.n_times: nlp for nlp in model.nlps}
+    assert model._qmin_nlp is model.nlps[-1]
+    nlp = model._qmin_nlp
+    assert sorted(nlp.timings) == [1, 2, 3]
+    assert all(timing > 0 for timing in nlp.timings.values())
+
+
+def test_minq_nlp_warm_start():
+    """Test that warm-starting from an NLP of another horizon gives the same results."""
+    times = np.arange(4) * 3600.0
+    q_in = np.array([50.0, 80.0, 120.0, 60.0])
+    params = QMinParameters(v_min=0.0, v_max=2e5, v_target=1e5, q_flood=0.0)
+    previous = QMinNLP(6)
+    previous.solve(np.arange(6) * 3600.0, 1.5e5, np.full(6, 70.0), params)
+    warm = QMinNLP(4).solve(times, 1.5e5, q_in, params, previous=previous)
+    cold = QMinNLP(4).solve(times, 1.5e5, q_in, params)
+    for var in ["V", "Q_out", "Q_out_max"]:
+        assert len(warm[var]) == len(times)
+        numpy.testing.assert_allclose(warm[var], cold[var], rtol=1e-6, atol=1e-4)
+    with pytest.raises(ValueError):
+        QMinNLP(3).solve(times, 1.5e5, q_in, params)
@@ -0,0 +1,60 @@
+"""Module for testing the model cache."""
+from pathlib import Path
+
+import numpy as np
+import numpy.testing
+
+from rtctools_simulation.reservoir.model import (
+    MODEL_CACHE_PREFIX,
+    ModelConfig,
+    ReservoirModel,
+    _get_model_hash,
+    clean_model_cache,
+)
+
+BASE_DIR = Path(__file__).parent.resolve() / "basic_model"
+OUTPUT_DIR = BASE_DIR / "output_passflow"
+
+
+class PassFlowModel(ReservoirModel):
+    """Class for simulating a pass flow model."""
+
+    def apply_schemes(self):
+        """Always apply pass flow."""
+        self.apply_passflow()
+
+
+def test_model_cache(tmp_path):
+    """Test simulating a model with a model cache directory."""
+    stale_dir = tmp_path / f"{MODEL_CACHE_PREFIX}outdated"
+    stale_dir.mkdir()
+    config = ModelConfig(base_dir=BASE_DIR, dirs={"output": OUTPUT_DIR, "cache": tmp_path})
+    model = PassFlowModel(config)
+    model_dir = tmp_path / f"{MODEL_CACHE_PREFIX}{_get_model_hash()}"
+    assert config.get_dir("model") == model_dir
+    assert (model_dir / "Reservoir.pymoca_cache").is_file()
+    # Outdated models may still be used by other processes.
+    assert stale_dir.is_dir()
+    # A second model loads the compiled model from the cache.
+    cache_mtime = (model_dir / "Reservoir.pymoca_cache").stat().st_mtime_ns
+    config = ModelConfig(base_dir=BASE_DIR, dirs={"output": OUTPUT_DIR, "cache": tmp_path})
+    model = PassFlowModel(config)
+    assert (model_dir / "Reservoir.pymoca_cache").stat().st_mtime_ns == cache_mtime
+    model.simulate()
+    output = model.extract_results()
+    numpy.testing.assert_array_almost_equal(
+        np.array(output["Q_out"]), np.array([0.0, 0.0, 1.0]), decimal=3
+    )
+
+
+def test_clean_model_cache(tmp_path):
+    """Test that cleaning a model cache only removes the folders of outdated models."""
+    model_dir = tmp_path / f"{MODEL_CACHE_PREFIX}{_get_model_hash()}"
+    stale_dir = tmp_path / f"{MODEL_CACHE_PREFIX}outdated"
+    other_dir = tmp_path / "lookup_tables"
+    for folder in [model_dir, stale_dir, other_dir]:
+        folder.mkdir()
+    assert clean_model_cache(tmp_path) == [stale_dir]
+    assert model_dir.is_dir()
+    assert other_dir.is_dir()
+    assert not stale_dir.exists()
@@ -0,0 +1,97 @@
+"""Module for testing streaming PI timeseries."""
+import datetime
+import shutil
+from pathlib import Path
+
+import numpy as np
+import numpy.testing
+from rtctools.data import pi, rtc
+
+from rtctools_simulation.pi_stream import StreamingTimeseries, StreamingTimeseriesWriter
+from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
+
+BASE_DIR = Path(__file__).parent.resolve() / "basic_model"
+INPUT_DIR = BASE_DIR / "input"
+
+
+class PassFlowModel(ReservoirModel):
+    """Class for simulating a pass flow model."""
+
+    def apply_schemes(self):
+        """Always apply pass flow."""
+        self.apply_passflow()
+
+
+class StreamingPassFlowModel(PassFlowModel):
+    """Pass flow model with streaming PI timeseries."""
+
+    pi_streaming = True
+
+
+def test_read():
+    """Test that the streaming reader gives the same timeseries as rtc-tools."""
+    data_config = rtc.DataConfig(INPUT_DIR)
+    reference = pi.Timeseries(data_config, INPUT_DIR, "timeseries_import", binary=False)
+    timeseries = StreamingTimeseries(data_config, INPUT_DIR, "timeseries_import")
+    assert timeseries.times == reference.times
+    assert timeseries.dt == reference.dt
+    assert timeseries.forecast_datetime == reference.forecast_datetime
+    assert timeseries.timezone == reference.timezone
+    reference_values = dict(reference.items())
+    values = dict(timeseries.items())
+    assert values.keys() == reference_values.keys()
+    for variable, value in values.items():
+        numpy.testing.assert_array_equal(value, reference_values[variable])
+        assert timeseries.get_unit(variable) == reference.get_unit(variable)
+
+
+def test_write_and_read(tmp_path):
+    """Test writing an ensemble and reading a single member."""
+    shutil.copy(INPUT_DIR / "rtcDataConfig.xml", tmp_path)
+    data_config = rtc.DataConfig(tmp_path)
+    start = datetime.datetime(2020, 1, 1)
+    dt = datetime.timedelta(hours=1)
+    times = [start + i * dt for i in range(4)]
+    unmapped = rtc.ts_ids(location_id="reservoir", parameter_id="unknown", qualifier_id=[])
+    with StreamingTimeseriesWriter(tmp_path / "timeseries_import.xml", times, dt) as writer:
+        for member in range(2):
+            values = np.array([1.0, np.nan, 3.0, 4.0]) + member
+            writer.write_series(data_config.pi_variable_ids("Q_in"), values, "m3/s", member)
+            writer.write_series(unmapped, values, ensemble_member=member)
+    timeseries = StreamingTimeseries(data_config, tmp_path, "timeseries_import", ensemble_member=1)
+    assert timeseries.contains_ensemble
+    assert timeseries.ensemble_size == 2  # noqa: PLR2004
+    assert timeseries.times == times
+    # Unmapped series are skipped.
+    assert list(dict(timeseries.items())) == ["Q_in"]
+    numpy.testing.assert_array_equal(timeseries.get("Q_in"), [2.0, np.nan, 4.0, 5.0])
+    assert timeseries.get_unit("Q_in") == "m3/s"
+    # The file can also be read by rtc-tools.
+    reference = pi.Timeseries(data_config, tmp_path, "timeseries_import", binary=False)
+    numpy.testing.assert_array_equal(reference.get("Q_in", 1), timeseries.get("Q_in"))
+
+
+def test_streaming_model(tmp_path):
+    """Test that a model with streaming PI timeseries gives the same output."""
+    output_dirs = {"default": tmp_path / "default", "streaming": tmp_path / "streaming"}
+    for model_class, output_dir in zip(
+        [PassFlowModel, StreamingPassFlowModel], output_dirs.values()
+    ):
+        output_dir.mkdir()
+        config = ModelConfig(base_dir=BASE_DIR, dirs={"output": output_dir})
+        model = model_class(config)
+        model.simulate()
+        if model.pi_streaming:
+            assert isinstance(model.timeseries_import, StreamingTimeseries)
+            assert isinstance(model.timeseries_export, StreamingTimeseries)
+    data_config = rtc.DataConfig(INPUT_DIR)
+    exports = {
+        name: pi.Timeseries(data_config, output_dir, "timeseries_export", binary=False)
+        for name, output_dir in output_dirs.items()
+    }
+    assert exports["streaming"].times == exports["default"].times
+    default_values = dict(exports["default"].items())
+    streaming_values = dict(exports["streaming"].items())
+    assert streaming_values.keys() == default_values.keys()
+    for variable, values in streaming_values.items():
+        numpy.testing.assert_array_equal(values, default_values[variable])
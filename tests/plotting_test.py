@@ -0,0 +1,131 @@
+"""Module for testing optional plotting and plotting persisted results."""
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import numpy.testing
+import pytest
+from rtctools_interface.utils.results_collection import read_cache_file_from_folder
+
+from rtctools_simulation.model import Model
+from rtctools_simulation.model_config import ModelConfig
+from rtctools_simulation.plotting import PlotMixin, plot_results
+from rtctools_simulation.reservoir.model import HeadlessReservoirModel, ReservoirModel
+
+BASE_DIR = Path(__file__).parent.resolve() / "basic_model"
+#: Plot table with variables that are written to the PI-XML output.
+PLOT_TABLE = """\
+id,y_axis_title,variables_style_1,variables_style_2,variables_with_previous_result,custom_title,specified_in
+1,Discharge (m^3/s),"Q_out, Q_in, Q_turbine, Q_spill",,,,python
+2,Elevation (m),H,,,,python
+"""
+
+
+class SpillwayModel(ReservoirModel):
+    """Class for simulating a spillway model."""
+
+    def apply_schemes(self):
+        """Always apply spillway."""
+        self.apply_spillway()
+
+
+class HeadlessSpillwayModel(HeadlessReservoirModel):
+    """Class for simulating a spillway model without plotting."""
+
+    def apply_schemes(self):
+        """Always apply spillway."""
+        self.apply_spillway()
+
+
+def create_config(output_dir: Path, plotting: bool) -> ModelConfig:
+    """Create a config of the basic model with a plot table."""
+    output_dir.mkdir()
+    plot_table_file = output_dir.parent / "plot_table.csv"
+    plot_table_file.write_text(PLOT_TABLE)
+    return ModelConfig(
+        base_dir=BASE_DIR,
+        dirs={"output": output_dir},
+        files={"plot_table.csv": plot_table_file},
+        plotting=plotting,
+    )
+
+
+def test_plotting_model(tmp_path):
+    """Test that a model plots by default and is an instance of its own class."""
+    model = SpillwayModel(create_config(tmp_path / "output", plotting=True))
+    assert isinstance(model, PlotMixin)
+    assert isinstance(model, HeadlessReservoirModel)
+    assert type(model) is SpillwayModel
+    assert model._plotting_enabled()
+    assert pickle.loads(pickle.dumps(ReservoirModel)) is ReservoirModel
+    assert ReservoirModel.__mro__[1:3] == (Model, PlotMixin)
+    output_dir = tmp_path / "output_2"
+    model = SpillwayModel(create_config(output_dir, plotting=False))
+    assert not model._plotting_enabled()
+    model.simulate()
+    assert not (output_dir / "cached_results").exists()
+
+
+def test_headless_model(tmp_path):
+    """Test that a headless model does not plot."""
+    output_dir = tmp_path / "output"
+    model = HeadlessSpillwayModel(create_config(output_dir, plotting=True))
+    assert not isinstance(model, PlotMixin)
+    model.simulate()
+    assert (output_dir / "timeseries_export.xml").is_file()
+    assert not (output_dir / "cached_results").exists()
+
+
+@pytest.mark.parametrize(
+    "model_class, plotting",
+    [("HeadlessReservoirModel", True), ("ReservoirModel", False)],
+)
+def test_headless_import(model_class, plotting):
+    """Test that a model without plotting does not import the plotting packages."""
+    code = (
+        "import sys; from pathlib import Path;"
+        f"from rtctools_simulation.reservoir.model import {model_class}, ModelConfig;"
+        f"config = ModelConfig(base_dir=Path(r'{BASE_DIR}'), plotting={plotting});"
+        f"model = {model_class}(config); model.pre(); model.initialize(); model.update(-1);"
+        "print('rtctools_interface' in sys.modules)"
+    )
+    root = str(Path(__file__).parent.parent.resolve())
+    process = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=root
+    )
+    assert process.stdout.split()[-1] == "False"
+
+
+def test_plot_results(tmp_path):
+    """Test that plotting persisted results gives the same plot data as plotting a model."""
+    output_dir = tmp_path / "output"
+    model = SpillwayModel(create_config(output_dir, plotting=True))
+    model.simulate()
+    reference = read_cache_file_from_folder(output_dir / "cached_results")
+
+    headless_output_dir = tmp_path / "headless_output"
+    config = create_config(headless_output_dir, plotting=False)
+    HeadlessSpillwayModel(config).simulate()
+    figures = plot_results(config, save_plot_to="stringio")
+    assert list(figures) == ["final_results"]
+    result = read_cache_file_from_folder(headless_output_dir / "cached_results")
+
+    reference_data = reference["prio_independent_data"]
+    result_data = result["prio_independent_data"]
+    assert result_data["io_datetimes"] == reference_data["io_datetimes"]
+    numpy.testing.assert_array_equal(result_data["times"], reference_data["times"])
+    reference_timeseries = reference["intermediate_results"][0]["timeseries_data"]
+    result_timeseries = result["intermediate_results"][0]["timeseries_data"]
+    assert set(result_timeseries) == set(reference_timeseries)
+    for variable, values in reference_timeseries.items():
+        numpy.testing.assert_allclose(result_timeseries[variable], np.array(values, dtype=float))
+
+
+def test_plot_results_without_plot_table(tmp_path):
+    """Test that no plots are created without a plot table."""
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    config = ModelConfig(base_dir=BASE_DIR, dirs={"output": output_dir}, plotting=False)
+    assert plot_results(config) == {}
@@ -96,3 +96,59 @@ def test_rule_curve_deviation_exceptions(observed_elevations, rule_curve, period
     """Test whether the ruladj functions raises exceptions when expected."""
     with pytest.raises(expected_error):
         rule_curve_deviation(observed_elevations, rule_curve, periods, np.array([0, 0, 0]))
+
+
+def test_rule_curve_deviation_methods():
+    """Test that the moving average methods give the same result for 1-D and 2-D input."""
+    rng = np.random.default_rng(0)
+    observed_elevations = 10 + rng.random((3, 200))
+    observed_elevations[rng.choice([True, False], size=(3, 200), p=[0.3, 0.7])] = np.nan
+    rule_curve = 10 + np.linspace(0, 1, 200)
+    inflows = rng.random(200)
+    kwargs = {"periods": 7, "inflows": inflows, "qin_max": 0.9, "maximum_difference": 0.8}
+    result = rule_curve_deviation(observed_elevations, rule_curve, method="cumsum", **kwargs)
+    reference = rule_curve_deviation(
+        observed_elevations, rule_curve, method="sliding_window", **kwargs
+    )
+    assert result.shape == observed_elevations.shape
+    np.testing.assert_allclose(result, reference, rtol=1e-12, atol=1e-12)
+    for member, elevations in enumerate(observed_elevations):
+        member_result = rule_curve_deviation(elevations, rule_curve, **kwargs)
+        np.testing.assert_array_equal(member_result, result[member])
+
+
+def _rule_curve_deviation_loop(observed_elevations, rule_curve, periods):
+    """Compute the average deviation with a loop over the windows, as in earlier versions."""
+    deviation_array = observed_elevations - rule_curve
+    average_deviation = np.full(len(rule_curve), np.nan)
+    for i in range(periods, len(observed_elevations) + 1):
+        if not np.sum(np.isnan(deviation_array[i - periods : i])) > (periods / 2):
+            average_deviation[i - 1] = np.nanmean(deviation_array[i - periods : i])
+        else:
+            average_deviation[i - 1] = 0
+    return average_deviation
+
+
+@pytest.mark.parametrize("periods", [1, 2, 7, 24, 100])
+def test_rule_curve_deviation_loop(periods):
+    """Test the methods against a loop over the windows."""
+    rng = np.random.default_rng(1)
+    observed_elevations = 100 + 5 * rng.normal(size=500)
+    observed_elevations[rng.random(500) < 0.2] = np.nan  # noqa: PLR2004
+    rule_curve = 100 + np.sin(np.arange(500) / 30)
+    expected = _rule_curve_deviation_loop(observed_elevations, rule_curve, periods)
+    result = rule_curve_deviation(observed_elevations, rule_curve, periods, method="sliding_window")
+    np.testing.assert_array_equal(result, expected)
+    result = rule_curve_deviation(observed_elevations, rule_curve, periods)
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-12)
+
+
+def test_rule_curve_deviation_missing_warning(caplog):
+    """Test that missing observations give a single warning."""
+    observed_elevations = np.array([10, np.nan, np.nan, np.nan, 10, 10])
+    rule_curve = np.full(6, 9.0)
+    result = rule_curve_deviation(observed_elevations, rule_curve, periods=2)
+    np.testing.assert_array_equal(result, np.array([np.nan, 1, 0, 0, 1, 1]))
+    warnings = [record for record in caplog.records if "Rule_curve_deviation" in record.message]
+    assert len(warnings) == 1
+    assert "2 moving window(s)" in warnings[0].message
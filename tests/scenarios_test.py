@@ -0,0 +1,100 @@
+"""Module for testing running scenarios in parallel."""
+import collections
+import gc
+import logging
+import os
+import weakref
+from pathlib import Path
+
+import numpy as np
+import numpy.testing
+
+import rtctools_simulation.lookup_table as lut
+from rtctools_simulation import scenarios
+from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
+from rtctools_simulation.scenarios import run_scenarios
+
+BASE_DIR = Path(__file__).parent.resolve() / "basic_model"
+LOOKUP_TABLES_DIR = Path(__file__).parent.resolve() / "lookup_tables"
+
+
+class PassFlowModel(ReservoirModel):
+    """Class for simulating a pass flow model."""
+
+    def apply_schemes(self):
+        """Always apply pass flow."""
+        self.apply_passflow()
+
+
+def test_run_scenarios():
+    """Test running scenarios, including a failing scenario."""
+    configs = [
+        ModelConfig(base_dir=BASE_DIR, dirs={"output": BASE_DIR / "output_passflow"}),
+        ModelConfig(base_dir=BASE_DIR, dirs={"output": BASE_DIR / "output_poolq"}),
+        ModelConfig(
+            base_dir=BASE_DIR,
+            dirs={"output": BASE_DIR / "output_rainevap"},
+            files={"lookup_tables.csv": LOOKUP_TABLES_DIR / "bad_input_grid.csv"},
+        ),
+    ]
+    results = list(run_scenarios(PassFlowModel, configs, workers=2))
+    assert sorted(result.index for result in results) == [0, 1, 2]
+    results = {result.index: result for result in results}
+    for index in [0, 1]:
+        result = results[index]
+        assert result.success
+        assert result.error is None
+        assert result.worker is not None
+        assert result.build_time > 0
+        assert result.simulate_time > 0
+        numpy.testing.assert_array_almost_equal(
+            result.results["Q_out"], np.array([0.0, 0.0, 1.0]), decimal=3
+        )
+    failed = results[2]
+    assert not failed.success
+    assert failed.results is None
+    assert "Traceback" in failed.error
+
+
+def test_run_scenarios_in_process():
+    """Test running scenarios in the current process with a class path."""
+    configs = [ModelConfig(base_dir=BASE_DIR, dirs={"output": BASE_DIR / "output_passflow"})]
+    results = list(
+        run_scenarios(
+            f"{Path(__file__).resolve()}:PassFlowModel", configs, workers=0, return_results=False
+        )
+    )
+    assert len(results) == 1
+    result = results[0]
+    assert result.success
+    assert result.worker == os.getpid()
+    assert result.results is None
+    assert list(result.phase_times) == ["pre", "initialize", "run", "post"]
+    assert sum(result.phase_times.values()) <= result.simulate_time
+
+
+class TrackedModel(PassFlowModel):
+    """Class for tracking which models are alive."""
+
+    instances = weakref.WeakSet()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instances.add(self)
+
+
+def test_warm_up_worker(monkeypatch):
+    """Test that warming up a worker fills the lookup table cache without keeping a model."""
+    monkeypatch.setattr(lut, "_LOOKUP_TABLE_CACHE", collections.OrderedDict())
+    config = ModelConfig(base_dir=BASE_DIR, dirs={"output": BASE_DIR / "output_passflow"})
+    scenarios._initialize_worker(logging.WARNING, TrackedModel, config, {})
+    assert lut._LOOKUP_TABLE_CACHE
+    gc.collect()
+    assert not TrackedModel.instances
+    # A failing configuration is reported by its scenario, not by the worker.
+    bad_config = ModelConfig(
+        base_dir=BASE_DIR, files={"lookup_tables.csv": LOOKUP_TABLES_DIR / "bad_input_grid.csv"}
+    )
+    scenarios._initialize_worker(logging.WARNING, TrackedModel, bad_config, {})
+    gc.collect()
+    assert not TrackedModel.instances
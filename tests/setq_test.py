@@ -6,7 +6,11 @@ import pytest
 
 from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
 from rtctools_simulation.reservoir.setq_help_functions import (
+    NanIndex,
     NoDataException,
+    SetqCache,
+    VersionedDataStore,
+    _find_nonnan_value,
 )
 
 logger = logging.getLogger("rtctools")
@@ -102,3 +106,115 @@ def test_set_q(target_variable, apply_func, input_data, input_type, timestep, na
         assert q_result == expected
         return
     np.testing.assert_array_almost_equal(q_result, expected, decimal=3)
+
+
+def _find_nonnan_value_reference(input_data, timestep, method):
+    """Find a non-NaN value by searching the timeseries element by element."""
+    valid = [i for i, value in enumerate(input_data) if not np.isnan(value)]
+    prev = max((i for i in valid if i < timestep), default=None)
+    fwd = min((i for i in valid if i > timestep), default=None)
+    if method in ["PREV", "NEXT"]:
+        index = prev if method == "PREV" else fwd
+        return NoDataException if index is None else input_data[index]
+    if prev is None or fwd is None:
+        # Only data on one side of the timestep: return the closest value.
+        index = prev if fwd is None else fwd
+        return NoDataException if index is None else input_data[index]
+    back_dist, fwd_dist = timestep - prev, fwd - timestep
+    if method == "CLOSEST" and back_dist != fwd_dist:
+        return input_data[prev] if back_dist < fwd_dist else input_data[fwd]
+    # Interpolate, which is the average for equal distances.
+    diff = input_data[fwd] - input_data[prev]
+    return input_data[prev] + back_dist / (back_dist + fwd_dist) * diff
+
+
+@pytest.mark.parametrize("method", ["PREV", "NEXT", "CLOSEST", "INTERP"])
+def test_nan_index(method):
+    """Test finding non-NaN values with a precomputed index."""
+    rng = np.random.default_rng(1)
+    input_data = rng.random(50)
+    input_data[rng.choice([True, False], size=50, p=[0.6, 0.4])] = np.nan
+    nan_index = NanIndex(input_data)
+    for timestep in np.flatnonzero(np.isnan(input_data)):
+        expected = _find_nonnan_value_reference(input_data, timestep, method)
+        try:
+            result = _find_nonnan_value(input_data, timestep, method, nan_index)
+        except NoDataException:
+            result = NoDataException
+        if expected is NoDataException:
+            assert result is NoDataException
+        else:
+            np.testing.assert_almost_equal(result, expected)
+
+
+def test_setq_cache():
+    """Test that cached NaN indices are invalidated when a timeseries is set again."""
+    cache = SetqCache()
+    values = np.array([1.0, np.nan, 3.0])
+    nan_index = cache.get_nan_index("Q_in", values, version=1)
+    assert cache.get_nan_index("Q_in", values, version=1) is nan_index
+    new_values = np.array([np.nan, np.nan, 3.0])
+    new_nan_index = cache.get_nan_index("Q_in", new_values, version=2)
+    assert new_nan_index is not nan_index
+    assert not new_nan_index.has_prev_value(1)
+
+
+def test_setq_cache_reductions():
+    """Test that reductions are cached and counted for each timeseries version."""
+    cache = SetqCache()
+    values = np.array([1.0, np.nan, 3.0])
+    np.testing.assert_equal(cache.get_reduction("Q_in", 1, values, "MEAN"), 2.0)
+    np.testing.assert_equal(cache.get_reduction("Q_in", 1, values, "MEAN"), 2.0)
+    np.testing.assert_equal(cache.get_reduction("Q_in", 1, values, "MAX"), 3.0)
+    assert cache.statistics() == {"hits": 1, "misses": 2}
+    np.testing.assert_equal(cache.get_reduction("Q_in", 2, np.array([1.0, 5.0, 3.0]), "MAX"), 5.0)
+    assert cache.statistics() == {"hits": 1, "misses": 3}
+
+
+def test_setq_cache_versions():
+    """Test that the data store of a reservoir model counts the versions of timeseries."""
+    setq_dir = Path(__file__).parent.resolve() / "set_q"
+    model = ReservoirModel(ModelConfig(base_dir=setq_dir))
+    model.pre()
+    assert isinstance(model.io, VersionedDataStore)
+    version = model.io.timeseries_version("Q_in")
+    assert version > 0
+    values = model.get_timeseries("Q_in")
+    model.set_timeseries("Q_in", values)
+    assert model.io.timeseries_version("Q_in") == version + 1
+    assert model.io.timeseries_version("unknown") == 0
+
+
+def test_setq_in_place_edit():
+    """Test set_q after a scheme modifies the input timeseries in place."""
+    setq_dir = Path(__file__).parent.resolve() / "set_q"
+    results = []
+
+    class SingleReservoir(ReservoirModel):
+        def apply_schemes(self):
+            self.set_q(target_variable="Q_turbine", input_data="Q_in", apply_func="MAX")
+            results.append(self._input.outflow.components.turbine)
+            values = self.get_timeseries("Q_in")
+            values[0] = 1000.0
+            self.set_timeseries("Q_in", values)
+            self.set_q(target_variable="Q_turbine", input_data="Q_in", apply_func="MAX")
+            results.append(self._input.outflow.components.turbine)
+
+    model = SingleReservoir(ModelConfig(base_dir=setq_dir))
+    model.simulate()
+    assert results[0] < 1000.0  # noqa: PLR2004
+    assert results[1] == 1000.0  # noqa: PLR2004
+
+
+def test_setq_cache_statistics():
+    """Test the cache statistics of a model that applies set_q at each timestep."""
+    setq_dir = Path(__file__).parent.resolve() / "set_q"
+
+    class SingleReservoir(ReservoirModel):
+        def apply_schemes(self):
+            self.set_q(target_variable="Q_turbine", input_data="Q_in", apply_func="MEAN")
+
+    model = SingleReservoir(ModelConfig(base_dir=setq_dir))
+    model.simulate()
+    n_times = len(model.times())
+    assert model.get_setq_cache_statistics() == {"hits": n_times - 1, "misses": 1}
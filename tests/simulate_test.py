@@ -4,6 +4,7 @@ from pathlib import Path
 
 import numpy as np
 import numpy.testing
+import pytest
 from rtctools.util import run_simulation_problem
 
 from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
@@ -19,6 +20,50 @@ class SpillwayModel(ReservoirModel):
         self.apply_spillway()
 
 
+class CountingModel(SpillwayModel):
+    """Spillway model that records the times at which the schemes are applied."""
+
+    def __init__(self, *args, **kwargs):
+        self.scheme_times = []
+        super().__init__(*args, **kwargs)
+
+    def apply_schemes(self):
+        self.scheme_times.append(self.get_current_time())
+        super().apply_schemes()
+
+
+class PreUpdateModel(SpillwayModel):
+    """Spillway model that records the calls of pre_update and _update_state."""
+
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+        super().__init__(*args, **kwargs)
+
+    def pre_update(self, t_new):
+        self.calls.append(("pre_update", t_new))
+        super().pre_update(t_new)
+
+    def _update_state(self, dt):
+        self.calls.append(("update_state", self.get_current_time() + dt))
+        super()._update_state(dt)
+
+
+class OverrideModel(SpillwayModel):
+    """Spillway model that applies pass flow in the first step, as decided in pre_update."""
+
+    passflow = False
+
+    def pre_update(self, t_new):
+        self.passflow = t_new == self.times()[1]
+        super().pre_update(t_new)
+
+    def apply_schemes(self):
+        if self.passflow:
+            self.apply_passflow()
+        else:
+            super().apply_schemes()
+
+
 def test_simulate(log_level=logging.INFO):
     """Test the simulate function."""
     config = ModelConfig(base_dir=BASE_DIR)
@@ -30,5 +75,39 @@ def test_simulate(log_level=logging.INFO):
     numpy.testing.assert_array_almost_equal(v, v_ref, decimal=3)
 
 
+def test_apply_schemes_once_per_timestep():
+    """Test that the schemes are applied exactly once at each time."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    model = CountingModel(config)
+    model.simulate()
+    numpy.testing.assert_array_equal(model.scheme_times, model.times())
+
+
+def test_pre_update_before_update_state():
+    """Test that pre_update is called with the new time before the state is computed."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    model = PreUpdateModel(config)
+    model.simulate()
+    expected_calls = []
+    for t_new in model.times()[1:]:
+        expected_calls += [("pre_update", t_new), ("update_state", t_new)]
+    assert model.calls == expected_calls
+
+
+def test_pre_update_override():
+    """Test that input set in pre_update is used for computing the next state."""
+    config = ModelConfig(base_dir=BASE_DIR)
+    model = SpillwayModel(config)
+    model.simulate()
+    reference = model.extract_results()
+    model = OverrideModel(config)
+    model.simulate()
+    output = model.extract_results()
+    # Pass flow keeps the volume of the first step, the spillway lowers it.
+    assert output["V"][0] == reference["V"][0]
+    assert output["V"][1] == pytest.approx(output["V"][0])
+    assert output["V"][1] != pytest.approx(reference["V"][1])
+
+
 if __name__ == "__main__":
     test_simulate(log_level=logging.DEBUG)
@@ -0,0 +1,103 @@
+"""Module for testing getting and setting multiple variables at once."""
+from pathlib import Path
+
+import numpy as np
+import numpy.testing
+import pytest
+
+import rtctools_simulation.model
+from rtctools_simulation.reservoir.model import ModelConfig, ReservoirModel
+
+BASE_DIR = Path(__file__).parent.resolve() / "basic_model"
+OUTPUT_DIR = BASE_DIR / "output_passflow"
+
+VARS = ["Q_in", "Q_out", "V", "H", "Q_turbine", "do_pass"]
+
+
+class VarsModel(ReservoirModel):
+    """Class for reading variables in a scheme."""
+
+    def __init__(self, *args, **kwargs):
+        self.scheme_values = []
+        super().__init__(*args, **kwargs)
+
+    def apply_schemes(self):
+        """Apply pass flow and store the variables read by get_vars."""
+        values = self.get_vars(VARS)
+        numpy.testing.assert_array_equal(values, [self.get_var(var) for var in VARS])
+        self.scheme_values.append(values)
+        self.apply_passflow()
+
+
+def create_model() -> VarsModel:
+    """Create an initialized model."""
+    config = ModelConfig(base_dir=BASE_DIR, dirs={"output": OUTPUT_DIR})
+    model = VarsModel(config)
+    model.pre()
+    model.initialize()
+    return model
+
+
+def test_get_vars():
+    """Test getting variables in a scheme."""
+    config = ModelConfig(base_dir=BASE_DIR, dirs={"output": OUTPUT_DIR})
+    model = VarsModel(config)
+    model.simulate()
+    output = model.extract_results()
+    numpy.testing.assert_array_almost_equal(
+        [values[VARS.index("Q_in")] for values in model.scheme_values], output["Q_in"]
+    )
+
+
+def test_set_vars():
+    """Test that set_vars is equivalent to set_var."""
+    model = create_model()
+    values = {"Q_in": 2.5, "V": 1.1, "Q_turbine": 0.3, "do_pass": 1.0}
+    model.set_vars(values)
+    for var, value in values.items():
+        assert model.get_var(var) == pytest.approx(value)
+    numpy.testing.assert_array_almost_equal(model.get_vars(values), list(values.values()))
+
+
+def test_set_vars_errors():
+    """Test setting variables that are not allowed to be set."""
+    model = create_model()
+    with pytest.raises(KeyError, match="Variable unknown_var not found"):
+        model.get_vars(["Q_in", "unknown_var"])
+    with pytest.raises(Exception, match="Cannot set parameters"):
+        model.set_vars({"Q_in": 1.0, "max_reservoir_area": 1.0})
+    model._allow_set_var = False
+    with pytest.raises(ValueError, match="Do not set variables directly"):
+        model.set_vars({"Q_in": 1.0})
+    assert np.isfinite(model.get_vars(["max_reservoir_area"])).all()
+
+
+def test_get_state_vector_names():
+    """Test that the state vector names can be used to get and restore the state."""
+    model = create_model()
+    names = model.get_state_vector_names()
+    assert "V" in names
+    assert "max_reservoir_area" not in names
+    state = model.get_vars(names)
+    model.set_vars({"V": 2.0})
+    model.set_vars(dict(zip(names, state)))
+    numpy.testing.assert_array_equal(model.get_vars(names), state)
+
+
+def test_vars_without_private_attributes(monkeypatch):
+    """Test that the public rtc-tools methods are used if the state vector is not accessible."""
+    monkeypatch.setattr(
+        rtctools_simulation.model, "_STATE_VECTOR_ATTRIBUTES", ("missing_attribute",)
+    )
+    model = create_model()
+    assert model._var_indices is None
+    names = model.get_state_vector_names()
+    assert "V" in names
+    assert "max_reservoir_area" not in names
+    state = model.get_vars(names)
+    model.set_vars({"V": 2.0})
+    assert model.get_var("V") == pytest.approx(2.0)
+    model.set_vars(dict(zip(names, state)))
+    numpy.testing.assert_array_equal(model.get_vars(names), state)
+    with pytest.raises(NotImplementedError, match="DAE residual"):
+        model.get_dae_residual_function()